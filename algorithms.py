@@ -1,7 +1,10 @@
 import re
 import networkx as nx
+import numpy as np
 import pandas as pd
 
+from instrumentation import instrumented
+
 # ---------------------------------------------------------------------------
 # 自然順ソート（数字部分を数値として比較: N2 < N10）
 # ---------------------------------------------------------------------------
@@ -13,6 +16,7 @@ def _natural_key(s: str) -> list:
 # ---------------------------------------------------------------------------
 # アルゴリズム: 安定SCCマップ生成
 # ---------------------------------------------------------------------------
+@instrumented()
 def build_stable_scc_map(G: nx.DiGraph) -> tuple:
     """
     強連結成分のインデックスを「最小ノード名の昇順」で安定化させる。
@@ -41,53 +45,374 @@ def build_stable_scc_map(G: nx.DiGraph) -> tuple:
 
 
 # ---------------------------------------------------------------------------
-# アルゴリズム: 強橋検出 O(E × (V+E))
+# 内部: 支配木（Lengauer–Tarjan）
+# ---------------------------------------------------------------------------
+def _dominator_tree(succ: list, pred: list, root: int) -> list:
+    """
+    整数IDで表したフローグラフの直接支配ノード（idom）を求める。
+    Lengauer–Tarjan の単純版（経路圧縮のみ）で計算量は O(E log V)。
+
+    Args:
+      succ, pred : 隣接リスト（succ[u] = u の後続、pred[v] = v の先行）
+      root       : フローグラフの始点
+
+    Returns:
+      idom : idom[v] = v の直接支配ノード。root は root 自身、到達不能は -1
+    """
+    n = len(succ)
+    dfn = [-1] * n
+    order: list = []
+    parent: list = []
+
+    # 再帰を使わない DFS（大規模グラフでの再帰上限を回避）
+    dfn[root] = 0
+    order.append(root)
+    parent.append(-1)
+    stack = [(root, iter(succ[root]))]
+    while stack:
+        v, it = stack[-1]
+        for w in it:
+            if dfn[w] == -1:
+                dfn[w] = len(order)
+                order.append(w)
+                parent.append(dfn[v])
+                stack.append((w, iter(succ[w])))
+                break
+        else:
+            stack.pop()
+
+    # 以降は DFS 番号の空間で計算する
+    m        = len(order)
+    semi     = list(range(m))
+    label    = list(range(m))
+    ancestor = [-1] * m
+    idom_d   = [0] * m
+    bucket: list = [[] for _ in range(m)]
+
+    def _eval(v: int) -> int:
+        if ancestor[v] == -1:
+            return v
+        path, x = [], v
+        while ancestor[ancestor[x]] != -1:
+            path.append(x)
+            x = ancestor[x]
+        for x in reversed(path):
+            a = ancestor[x]
+            if semi[label[a]] < semi[label[x]]:
+                label[x] = label[a]
+            ancestor[x] = ancestor[a]
+        return label[v]
+
+    for w in range(m - 1, 0, -1):
+        for u in pred[order[w]]:
+            d = dfn[u]
+            if d == -1:
+                continue
+            s = semi[_eval(d)]
+            if s < semi[w]:
+                semi[w] = s
+        bucket[semi[w]].append(w)
+        p = parent[w]
+        ancestor[w] = p
+        for v in bucket[p]:
+            u = _eval(v)
+            idom_d[v] = u if semi[u] < semi[v] else p
+        bucket[p] = []
+
+    for w in range(1, m):
+        if idom_d[w] != semi[w]:
+            idom_d[w] = idom_d[idom_d[w]]
+
+    idom = [-1] * n
+    for w in range(m):
+        idom[order[w]] = order[idom_d[w]]
+    return idom
+
+
+def _dominator_intervals(idom: list, root: int) -> tuple:
+    """
+    支配木の行きがけ・帰りがけ番号を返す。
+    d が v を支配する ⇔ pre[d] <= pre[v] かつ post[v] <= post[d]（O(1)で判定可能）。
+    """
+    n = len(idom)
+    children: list = [[] for _ in range(n)]
+    for v, d in enumerate(idom):
+        if d != -1 and v != root:
+            children[d].append(v)
+
+    pre, post = [-1] * n, [-1] * n
+    counter = 0
+    stack = [(root, iter(children[root]))]
+    pre[root] = counter
+    counter += 1
+    while stack:
+        v, it = stack[-1]
+        for w in it:
+            pre[w] = counter
+            counter += 1
+            stack.append((w, iter(children[w])))
+            break
+        else:
+            post[v] = counter
+            counter += 1
+            stack.pop()
+    return pre, post
+
+
+def _flow_graph_bridges(succ: list, pred: list, root: int) -> list:
+    """
+    フローグラフ G(root) の橋（root から終点へのすべての経路が通る辺）を列挙する。
+
+    辺(u,v)が橋 ⇔ u = idom(v) かつ v の他の先行ノードがすべて v に支配される。
+    """
+    idom = _dominator_tree(succ, pred, root)
+    pre, post = _dominator_intervals(idom, root)
+    return _bridges_from_dominators(pred, idom, pre, post, root)
+
+
+def _bridges_from_dominators(pred: list, idom: list, pre: list, post: list, root: int) -> list:
+    """計算済みの支配木（idom と行きがけ・帰りがけ番号）からフローグラフの橋を列挙する。"""
+    found = []
+    for v, u in enumerate(idom):
+        if v == root or u == -1:
+            continue
+        has_edge = False
+        for w in pred[v]:
+            if w == u:
+                has_edge = True
+            elif idom[w] != -1 and not (pre[v] <= pre[w] and post[w] <= post[v]):
+                break
+        else:
+            if has_edge:
+                found.append((u, v))
+    return found
+
+
+def _scc_local_adjacency(G: nx.DiGraph, comp) -> tuple:
+    """SCC内部の辺だけを整数IDの隣接リストに変換する（自己ループは除外）。"""
+    nodes = list(comp)
+    index = {n: i for i, n in enumerate(nodes)}
+    succ: list = [[] for _ in nodes]
+    pred: list = [[] for _ in nodes]
+    for i, u in enumerate(nodes):
+        for v in G.successors(u):
+            j = index.get(v)
+            if j is not None and j != i:
+                succ[i].append(j)
+                pred[j].append(i)
+    return nodes, succ, pred
+
+
+# ---------------------------------------------------------------------------
+# アルゴリズム: 強橋検出 O(E log V)
 # ---------------------------------------------------------------------------
-def find_strong_bridges(G: nx.DiGraph) -> list:
+@instrumented()
+def find_strong_bridges(G: nx.DiGraph, verify: bool = False) -> list:
     """
     有向グラフの強橋を検出する。
 
     強橋の定義: 辺(u,v)を除去すると u→v の到達可能性が失われる辺。
-    計算量: O(E × (V+E))
+    計算量: O(E log V)
+
+    Italiano–Laura–Santaroni の手法に基づき、SCCごとに任意の根 r を取り、
+    G(r) と逆グラフ G^R(r) の支配木から求めた「フローグラフの橋」の和集合を強橋とする。
+    G は一切変更しない。返り値の並びは G.edges() の順序に従う。
+
+    Args:
+      verify : True のとき従来の総当たり版と結果を突き合わせ、不一致なら RuntimeError
+    """
+    if len(G) <= 1:
+        return []
+
+    bridge_set: set = set()
+    for comp in nx.strongly_connected_components(G):
+        if len(comp) < 2:
+            continue
+        nodes, succ, pred = _scc_local_adjacency(G, comp)
+        for u, v in _flow_graph_bridges(succ, pred, 0):
+            bridge_set.add((nodes[u], nodes[v]))
+        # 逆グラフ上の橋 (v,u) は元グラフの辺 (u,v) に対応する
+        for v, u in _flow_graph_bridges(pred, succ, 0):
+            bridge_set.add((nodes[u], nodes[v]))
+
+    bridges = [e for e in G.edges() if e in bridge_set]
+
+    if verify:
+        expected = _find_strong_bridges_bruteforce(G)
+        if bridges != expected:
+            missing = [e for e in expected if e not in bridge_set]
+            extra   = [e for e in bridges if e not in set(expected)]
+            raise RuntimeError(
+                f"強橋の検証に失敗しました: 不足 {missing[:10]} / 過剰 {extra[:10]}"
+            )
+    return bridges
+
 
-    実装上の注意:
-      list(G.edges()) でスナップショットを取ってからループする。
-      ループ中に G.remove_edge/add_edge を呼ぶため、スナップショットなしでは
-      RuntimeError: dictionary changed size during iteration が発生する。
+def _find_strong_bridges_bruteforce(G: nx.DiGraph) -> list:
+    """
+    従来の総当たり版（検証用）。計算量: O(E × (V+E))
+
+    辺の除去・復元はコピー上で行うため、呼び出し元の G は変更しない。
     """
     if len(G) <= 1:
         return []
 
+    H = G.copy()
     bridges: list = []
-    sccs = list(nx.strongly_connected_components(G))
     node_to_scc: dict = {}
-    for i, comp in enumerate(sccs):
+    for i, comp in enumerate(nx.strongly_connected_components(H)):
         for n in comp:
             node_to_scc[n] = i
 
-    for u, v in list(G.edges()):
+    for u, v in list(H.edges()):
         if node_to_scc[u] != node_to_scc[v]:
             continue
-        G.remove_edge(u, v)
-        if not nx.has_path(G, u, v):
+        attrs = H[u][v]
+        H.remove_edge(u, v)
+        if not nx.has_path(H, u, v):
             bridges.append((u, v))
-        G.add_edge(u, v)
+        H.add_edge(u, v, **attrs)
 
     return bridges
 
 
+# ---------------------------------------------------------------------------
+# アルゴリズム: 強連結切断点検出 O(E log V)
+# ---------------------------------------------------------------------------
+@instrumented()
+def find_strong_articulation_points(G: nx.DiGraph, verify: bool = False) -> list:
+    """
+    有向グラフの強連結切断点（停止すると循環配送が分裂する拠点）を検出する。
+
+    定義: 除去すると所属する強連結成分が複数に分裂する頂点。
+    計算量: O(E log V)
+
+    強橋と同じく SCC ごとに根 r を取り、G(r) と G^R(r) の支配木で
+    「自明でない支配ノード」となる頂点を集める。r 自身は r を除いた残りが
+    強連結かどうかを1回の探索で確認する。返り値の並びは G.nodes() の順序に従う。
+
+    Args:
+      verify : True のとき総当たり版と結果を突き合わせ、不一致なら RuntimeError
+    """
+    points: set = set()
+    for comp in nx.strongly_connected_components(G):
+        if len(comp) < 3:
+            continue
+        nodes, succ, pred = _scc_local_adjacency(G, comp)
+        for adj, radj in ((succ, pred), (pred, succ)):
+            idom = _dominator_tree(adj, radj, 0)
+            for v, d in enumerate(idom):
+                if d not in (-1, v, 0):
+                    points.add(nodes[d])
+        if not (_reaches_all(succ, 1, skip=0) and _reaches_all(pred, 1, skip=0)):
+            points.add(nodes[0])
+
+    result = [n for n in G.nodes() if n in points]
+
+    if verify:
+        expected = _find_strong_articulation_points_bruteforce(G)
+        if result != expected:
+            raise RuntimeError(
+                f"強連結切断点の検証に失敗しました: 期待 {expected[:10]} / 結果 {result[:10]}"
+            )
+    return result
+
+
+def _reaches_all(adj: list, start: int, skip: int) -> bool:
+    """skip を通らずに start から全頂点（skip を除く）へ到達できるか。"""
+    seen = [False] * len(adj)
+    seen[skip] = seen[start] = True
+    stack, count = [start], 1
+    while stack:
+        for w in adj[stack.pop()]:
+            if not seen[w]:
+                seen[w] = True
+                count += 1
+                stack.append(w)
+    return count == len(adj) - 1
+
+
+def _find_strong_articulation_points_bruteforce(G: nx.DiGraph) -> list:
+    """総当たり版（検証用）。計算量: O(V × (V+E))"""
+    points: set = set()
+    for comp in nx.strongly_connected_components(G):
+        if len(comp) < 3:
+            continue
+        for n in comp:
+            rest = G.subgraph(comp - {n})
+            if not nx.is_strongly_connected(rest):
+                points.add(n)
+    return [n for n in G.nodes() if n in points]
+
+
 # ---------------------------------------------------------------------------
 # アルゴリズム: カスケード故障検出
 # ---------------------------------------------------------------------------
-def find_cascade_failures(G_after: nx.DiGraph, direct_isolated: set) -> set:
+@instrumented()
+def find_cascade_failures(
+    G_after: nx.DiGraph,
+    direct_isolated: set,
+    return_causes: bool = False,
+):
     """
     直接孤立ノードの影響が伝播して実質到達不能になるノードを検出する。
 
     単純な入次数0判定では見逃す「連鎖的な補給不能」を捕捉する。
     例: A→B→C で A が孤立すると B は入次数>0でも補給不能になる。
 
-    計算量: O(V × (V+E))
+    判定: 祖先が1つ以上あり、祖先がすべて直接孤立ノードであるノード。
+    孤立していない各ノードを補給元として多始点探索を行い、各ノードに届いた
+    補給元を最大2つまで記録する（自分自身を含む閉路があっても他の補給元を
+    見落とさないため）。自分以外の補給元が届かず入次数>0のノードがカスケード故障。
+    各ノードは高々2回しか展開されないので計算量: O(V+E)
+
+    Args:
+      return_causes : True のとき (victims, causes) を返す。
+                      causes = {victim: [原因となった上流の孤立ノード]}
+                      （祖先がすべて孤立ノードなので、直前の先行ノードが原因そのもの）
     """
+    direct_isolated = set(direct_isolated)
+
+    # 生存している補給元からの到達範囲（孤立ノードを経由する経路も含む）
+    sources: dict = {}
+    stack: list = []
+
+    def _reach(w, origin) -> None:
+        got = sources.setdefault(w, [])
+        if len(got) < 2 and origin not in got:
+            got.append(origin)
+            stack.append((w, origin))
+
+    for u in G_after.nodes():
+        if u not in direct_isolated:
+            for w in G_after.successors(u):
+                _reach(w, u)
+    while stack:
+        v, origin = stack.pop()
+        for w in G_after.successors(v):
+            _reach(w, origin)
+
+    cascade_victims: set = set()
+    causes: dict = {}
+    for node in G_after.nodes():
+        if node in direct_isolated:
+            continue
+        if any(o != node for o in sources.get(node, ())):
+            continue
+        upstream = [p for p in G_after.predecessors(node) if p != node]
+        if not upstream:
+            continue
+        cascade_victims.add(node)
+        if return_causes:
+            causes[node] = upstream
+
+    if return_causes:
+        return cascade_victims, causes
+    return cascade_victims
+
+
+def _find_cascade_failures_bruteforce(G_after: nx.DiGraph, direct_isolated: set) -> set:
+    """従来の祖先列挙版（検証用）。計算量: O(V × (V+E))"""
     cascade_victims: set = set()
     direct_isolated = set(direct_isolated)
 
@@ -106,25 +431,37 @@ def find_cascade_failures(G_after: nx.DiGraph, direct_isolated: set) -> set:
 # ---------------------------------------------------------------------------
 # アルゴリズム: 迂回コスト分析
 # ---------------------------------------------------------------------------
+@instrumented()
 def analyze_rerouting_cost(
     G: nx.DiGraph,
     G_after: nx.DiGraph,
     failed_edges: list,
+    distance_index=None,
 ) -> pd.DataFrame:
     """
     障害前後の最短経路コスト変化を計算する。
     weight 属性がない辺はすべて 1.0 として扱う。
+
+    distance_index（G から作った distance_index.DistanceIndex）を渡すと、Dijkstra の代わりに
+    インデックスへ問い合わせる。障害後は G_after にない拠点と failed_edges を停止として扱う。
     """
+    if distance_index is not None:
+        failed_nodes = [n for n in G if n not in G_after]
+        costs_before = distance_index.distances(failed_edges)
+        costs_after  = distance_index.distances(failed_edges, failed_nodes, failed_edges)
     results = []
-    for u, v in failed_edges:
-        try:
-            cost_before = nx.shortest_path_length(G, u, v, weight="weight")
-        except (nx.NetworkXNoPath, nx.NodeNotFound):
-            cost_before = float("inf")
-        try:
-            cost_after = nx.shortest_path_length(G_after, u, v, weight="weight")
-        except (nx.NetworkXNoPath, nx.NodeNotFound):
-            cost_after = float("inf")
+    for i, (u, v) in enumerate(failed_edges):
+        if distance_index is not None:
+            cost_before, cost_after = costs_before[i], costs_after[i]
+        else:
+            try:
+                cost_before = nx.shortest_path_length(G, u, v, weight="weight")
+            except (nx.NetworkXNoPath, nx.NodeNotFound):
+                cost_before = float("inf")
+            try:
+                cost_after = nx.shortest_path_length(G_after, u, v, weight="weight")
+            except (nx.NetworkXNoPath, nx.NodeNotFound):
+                cost_after = float("inf")
 
         if cost_after == float("inf"):
             status, delta = "到達不能（迂回なし）", "—"
@@ -142,28 +479,157 @@ def analyze_rerouting_cost(
     return pd.DataFrame(results) if results else pd.DataFrame()
 
 
+# ---------------------------------------------------------------------------
+# アルゴリズム: ネットワーク全体の迂回影響（全起点一括）
+# ---------------------------------------------------------------------------
+@instrumented()
+def analyze_rerouting_impact(
+    G: nx.DiGraph,
+    failed_nodes: list | None = None,
+    failed_edges: list | None = None,
+    origins: list | None = None,
+    max_rows: int | None = None,
+) -> tuple:
+    """
+    障害前後の起点×終点コスト行列を一括計算し、コストが変化した全ODペアを求める。
+    analyze_rerouting_cost（停止ルートの両端のみ）と違い、ネットワーク全体の影響を測る。
+
+    G の重み付き隣接行列（CSR）を1回作り、障害後は停止した辺を除いた行列を作る。
+    障害前の距離行列で「停止した辺が最短経路木に含まれる（d(o,u)+w == d(o,v)）」起点だけを
+    障害後に再計算するので、影響のない起点には Dijkstra を走らせない。
+    停止拠点を起点・終点とするペアは評価対象外。
+
+    Args:
+      origins  : 評価する起点（None で全拠点）。大規模グラフでは部分集合を渡す
+      max_rows : 返す表の最大行数（増分の大きい順）
+
+    Returns:
+      df_pairs : 起点・終点・障害前/後コスト・増分（新規到達不能は増分 inf）
+      summary  : {"評価起点数", "コスト増加ペア数", "新規到達不能ペア数", "総追加コスト"}
+    """
+    from scipy.sparse import csr_array
+    from scipy.sparse.csgraph import dijkstra
+
+    failed_nodes = {n for n in (failed_nodes or []) if n in G}
+    failed_edges = {tuple(e) for e in (failed_edges or []) if G.has_edge(*e)}
+
+    nodes = list(G.nodes())
+    index = {n: i for i, n in enumerate(nodes)}
+    A = nx.to_scipy_sparse_array(G, nodelist=nodes, weight="weight", format="coo")
+    rows, cols, data = A.row, A.col, A.data
+
+    node_mask = np.zeros(len(nodes), dtype=bool)
+    node_mask[[index[n] for n in failed_nodes]] = True
+    edge_mask = node_mask[rows] | node_mask[cols]
+    if failed_edges:
+        failed_ids = {(index[u], index[v]) for u, v in failed_edges}
+        edge_mask |= np.fromiter(
+            ((r, c) in failed_ids for r, c in zip(rows.tolist(), cols.tolist())),
+            dtype=bool, count=len(rows),
+        )
+
+    if origins is None:
+        origin_ids = np.flatnonzero(~node_mask)
+    else:
+        origin_ids = np.array(
+            [index[o] for o in origins if o in index and o not in failed_nodes], dtype=np.int64
+        )
+
+    summary = {"評価起点数": len(origin_ids), "コスト増加ペア数": 0,
+               "新規到達不能ペア数": 0, "総追加コスト": 0.0}
+    columns = ["起点", "終点", "障害前コスト", "障害後コスト", "増分"]
+    if len(origin_ids) == 0 or not edge_mask.any():
+        return pd.DataFrame(columns=columns), summary
+
+    A_before = csr_array((data, (rows, cols)), shape=(len(nodes), len(nodes)))
+    D_before = dijkstra(A_before, directed=True, indices=origin_ids)
+
+    # 停止した辺が最短経路木に含まれる起点だけが影響を受ける
+    ru, rv, rw = rows[edge_mask], cols[edge_mask], data[edge_mask]
+    tight = np.isfinite(D_before[:, rv]) & np.isclose(D_before[:, ru] + rw, D_before[:, rv])
+    affected = np.flatnonzero(tight.any(axis=1))
+    if len(affected) == 0:
+        return pd.DataFrame(columns=columns), summary
+
+    keep = ~edge_mask
+    A_after = csr_array((data[keep], (rows[keep], cols[keep])), shape=(len(nodes), len(nodes)))
+    D_after = dijkstra(A_after, directed=True, indices=origin_ids[affected])
+    D_prev  = D_before[affected]
+
+    valid = np.isfinite(D_prev)
+    valid[:, node_mask] = False
+    increased   = valid & (D_after > D_prev) & ~np.isclose(D_after, D_prev)
+    unreachable = increased & ~np.isfinite(D_after)
+
+    oi, di = np.nonzero(increased)
+    before = D_prev[oi, di]
+    after  = D_after[oi, di]
+    delta  = after - before
+
+    finite = np.isfinite(delta)
+    summary["コスト増加ペア数"]   = int(finite.sum())
+    summary["新規到達不能ペア数"] = int(unreachable.sum())
+    summary["総追加コスト"]       = float(delta[finite].sum())
+
+    order = np.argsort(-delta, kind="stable")
+    if max_rows is not None:
+        order = order[:max_rows]
+    df_pairs = pd.DataFrame({
+        "起点":         [nodes[origin_ids[affected[i]]] for i in oi[order]],
+        "終点":         [nodes[j] for j in di[order]],
+        "障害前コスト": before[order],
+        "障害後コスト": after[order],
+        "増分":         delta[order],
+    })
+    df_pairs.index += 1
+    return df_pairs, summary
+
+
 # ---------------------------------------------------------------------------
 # アルゴリズム: 障害シミュレーション
 # ---------------------------------------------------------------------------
+def failure_view(
+    G: nx.DiGraph,
+    failed_nodes: list | None = None,
+    failed_edges: list | None = None,
+) -> nx.DiGraph:
+    """停止拠点・停止ルートを隠した G の読み取り専用ビュー（G はコピーしない）。"""
+    failed_node_set = {n for n in (failed_nodes or []) if n in G}
+    failed_edge_set = {tuple(e) for e in (failed_edges or []) if G.has_edge(*e)}
+    return nx.restricted_view(G, failed_node_set, failed_edge_set)
+
+
+@instrumented()
 def simulate_failure(
     G: nx.DiGraph,
     failed_nodes: list | None = None,
     failed_edges: list | None = None,
+    scc_index: tuple | None = None,
 ) -> tuple:
+    """
+    拠点・ルート停止後のネットワークと影響範囲を求める。
+
+    G_after は G をコピーせず、停止した拠点・ルートだけを隠した読み取り専用ビュー
+    （nx.restricted_view）。記憶域は G と共有し、シナリオごとの追加メモリは障害の規模に比例する。
+
+    SCCの分裂判定は「拠点→SCC」索引を使い、停止拠点・停止ルートを含むSCCだけを
+    障害後に再分解する（除去で SCC が合流することはなく、無関係な SCC は変化しない）。
+
+    Args:
+      scc_index : build_stable_scc_map(G) の返り値。同じ G で何度も呼ぶ場合に渡すと再計算を省ける
+
+    cascade_failures は {カスケード故障ノード: [原因となった上流の孤立ノード]} の辞書。
+    キーの集合がカスケード故障ノードなので、集合と同じように len()/sorted()/list() で扱える。
+    """
     failed_nodes = failed_nodes or []
     failed_edges = failed_edges or []
 
-    scc_before = {
-        frozenset(s): i
-        for i, s in enumerate(nx.strongly_connected_components(G))
-        if len(s) > 1
-    }
+    scc_map, large_sccs = scc_index if scc_index is not None else build_stable_scc_map(G)
+    scc_before = {frozenset(s): i for i, s in enumerate(large_sccs)}
 
-    G_after = G.copy()
-    G_after.remove_nodes_from(failed_nodes)
-    G_after.remove_edges_from(
-        [e for e in failed_edges if G_after.has_edge(*e)]
-    )
+    failed_node_set = {n for n in failed_nodes if n in G}
+    failed_edge_set = {tuple(e) for e in failed_edges if G.has_edge(*e)}
+    G_after = nx.restricted_view(G, failed_node_set, failed_edge_set)
 
     isolated_complete, isolated_no_input, isolated_no_output = [], [], []
     for n in G_after.nodes():
@@ -172,30 +638,130 @@ def simulate_failure(
         elif in_deg == 0:                  isolated_no_input.append(n)
         elif out_deg == 0:                 isolated_no_output.append(n)
 
-    isolated_all     = isolated_complete + isolated_no_input + isolated_no_output
-    cascade_failures = find_cascade_failures(G_after, set(isolated_all)) - set(isolated_all)
+    isolated_all = isolated_complete + isolated_no_input + isolated_no_output
+    _, cascade_failures = find_cascade_failures(
+        G_after, set(isolated_all), return_causes=True
+    )
 
-    scc_after_list = list(nx.strongly_connected_components(G_after))
-    scc_after = {frozenset(s): i for i, s in enumerate(scc_after_list) if len(s) > 1}
+    # 障害の影響を受けたSCCだけを特定する
+    touched: set = {scc_map[n] for n in failed_node_set if scc_map[n] != -1}
+    for u, v in failed_edge_set:
+        if scc_map[u] != -1 and scc_map[u] == scc_map[v]:
+            touched.add(scc_map[u])
 
+    scc_after = {
+        frozenset(s): i for i, s in enumerate(large_sccs) if i not in touched
+    }
     broken_sccs = []
-    for old_scc in scc_before:
-        surviving = old_scc - set(failed_nodes)
+    for i in sorted(touched):
+        old_scc   = large_sccs[i]
+        surviving = old_scc - failed_node_set
         if len(surviving) < 2:
             continue
-        after_groups: dict = {}
-        for n in surviving:
-            for s in scc_after_list:
-                if n in s:
-                    after_groups.setdefault(frozenset(s), set()).add(n)
-                    break
-            else:
-                after_groups.setdefault(frozenset({n}), set()).add(n)
+        after_groups = [
+            frozenset(s)
+            for s in nx.strongly_connected_components(G_after.subgraph(surviving))
+        ]
+        for s in after_groups:
+            if len(s) > 1:
+                scc_after[s] = len(scc_after)
         if len(after_groups) > 1:
-            broken_sccs.append({"original": old_scc, "after": list(after_groups.keys())})
+            broken_sccs.append({"original": frozenset(old_scc), "after": after_groups})
 
     return (
         G_after, isolated_all, isolated_complete,
         isolated_no_input, isolated_no_output,
         cascade_failures, scc_before, scc_after, broken_sccs,
     )
+
+
+# ---------------------------------------------------------------------------
+# アルゴリズム: 強連結成分の縮約（大規模ネットワークの集約表示）
+# ---------------------------------------------------------------------------
+CONDENSED_NODE_LIMIT = 150   # 縮約グラフの最大ノード数（超えた分は「その他」にまとめる）
+
+
+@instrumented()
+def condense_network(
+    G: nx.DiGraph,
+    scc_index: tuple,
+    bridges: list | None = None,
+    failed_nodes: list | None = None,
+    failed_edges: list | None = None,
+    affected_nodes: list | None = None,
+    max_nodes: int = CONDENSED_NODE_LIMIT,
+) -> tuple:
+    """
+    強連結成分（build_stable_scc_map の結果）を1つの集約ノードに縮約したグラフを作る。
+
+    集約ノードは サイズ2以上の強連結成分 → サイズ1の拠点（次数の大きい順）の順に並べ、
+    max_nodes を超えた分は1つの「その他」ノードにまとめるため、描画コストは成分数で頭打ちになる。
+    強橋は定義上すべて強連結成分の内部にあるので集約ノード側で数え、
+    成分間の辺はルート数・停止ルート数を集計した1本の辺にする。計算量 O(V + E)。
+
+    Returns:
+      C       : 縮約グラフ。ノード属性 label / 種別 / 拠点数 / 強橋数 / 停止拠点数 / 停止ルート数 / 影響拠点数、
+                辺属性 ルート数 / 停止ルート数
+      members : {集約ノードID: 所属拠点のリスト}
+    """
+    scc_map, large_sccs = scc_index
+    nodes = list(G.nodes())
+    index = {n: i for i, n in enumerate(nodes)}
+    comp  = np.array([scc_map.get(n, -1) for n in nodes], dtype=np.int64)
+
+    # サイズ1の拠点には次数の大きい順に large_sccs の後ろの番号を振る
+    singles = np.flatnonzero(comp == -1)
+    if len(singles):
+        degree = np.array([G.degree(nodes[i]) for i in singles])
+        order  = singles[np.argsort(-degree, kind="stable")]
+        comp[order] = np.arange(len(large_sccs), len(large_sccs) + len(order))
+
+    n_groups = len(large_sccs) + len(singles)
+    other    = None
+    if n_groups > max_nodes:
+        other = max_nodes - 1
+        comp[comp >= other] = other
+        n_groups = max_nodes
+
+    members: dict = {g: [] for g in range(n_groups)}
+    for n, g in zip(nodes, comp.tolist()):
+        members[g].append(n)
+
+    def _count(items) -> np.ndarray:
+        ids = [comp[index[n]] for n in (items or []) if n in index]
+        return np.bincount(np.asarray(ids, dtype=np.int64), minlength=n_groups)
+
+    bridge_set = set(map(tuple, bridges or []))
+    failed_set = set(map(tuple, failed_edges or []))
+    edge_list  = list(G.edges())
+    eu = comp[np.fromiter((index[u] for u, _ in edge_list), dtype=np.int64, count=len(edge_list))]
+    ev = comp[np.fromiter((index[v] for _, v in edge_list), dtype=np.int64, count=len(edge_list))]
+    is_bridge = np.fromiter((e in bridge_set for e in edge_list), dtype=bool, count=len(edge_list))
+    is_failed = np.fromiter((e in failed_set for e in edge_list), dtype=bool, count=len(edge_list))
+    inner = eu == ev
+
+    n_bridges      = np.bincount(eu[inner & is_bridge], minlength=n_groups)
+    n_inner_failed = np.bincount(eu[inner & is_failed], minlength=n_groups)
+    n_failed_nodes = _count(failed_nodes)
+    n_affected     = _count(affected_nodes)
+
+    C = nx.DiGraph()
+    for g in range(n_groups):
+        if g == other:
+            label, kind = f"その他\n{len(members[g])}拠点", "その他"
+        elif g < len(large_sccs):
+            label, kind = f"循環 {g + 1}\n{len(members[g])}拠点", "強連結成分"
+        else:
+            label, kind = str(members[g][0]), "単独拠点"
+        C.add_node(
+            g, label=label, 種別=kind, 拠点数=len(members[g]),
+            強橋数=int(n_bridges[g]), 停止拠点数=int(n_failed_nodes[g]),
+            停止ルート数=int(n_inner_failed[g]), 影響拠点数=int(n_affected[g]),
+        )
+
+    outer = pd.DataFrame({"gu": eu[~inner], "gv": ev[~inner], "failed": is_failed[~inner]})
+    agg = outer.groupby(["gu", "gv"]).agg(ルート数=("failed", "size"), 停止ルート数=("failed", "sum"))
+    for (gu, gv), n_routes, n_failed in zip(agg.index, agg["ルート数"], agg["停止ルート数"]):
+        C.add_edge(int(gu), int(gv), ルート数=int(n_routes), 停止ルート数=int(n_failed))
+
+    return C, members
@@ -0,0 +1,280 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy.sparse.csgraph import dijkstra
+
+from algorithms import (
+    build_stable_scc_map,
+    find_strong_articulation_points,
+    find_strong_bridges,
+)
+from compact_graph import CompactGraph
+from demand import DemandImpact
+from distance_index import DistanceIndex
+
+# ---------------------------------------------------------------------------
+# 設定（環境変数で上書き可能）
+# ---------------------------------------------------------------------------
+CACHE_DIR         = os.environ.get(
+    "LOGISTICS_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "logistics_network"),
+)
+CACHE_MAX_BYTES   = int(os.environ.get("LOGISTICS_CACHE_MAX_BYTES", 512 * 1024 ** 2))
+CACHE_MAX_ENTRIES = int(os.environ.get("LOGISTICS_CACHE_MAX_ENTRIES", 64))
+CACHE_VERSION     = "1"   # 結果の形式を変えたら上げる（古いディスクキャッシュを無効化）
+
+
+# ---------------------------------------------------------------------------
+# グラフの内容ハッシュ
+# ---------------------------------------------------------------------------
+_fingerprints: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def graph_fingerprint(G: nx.DiGraph, weight: str = "weight", default: float = 1.0) -> str:
+    """
+    拠点・ルート・重みだけから決まるグラフの正規化ハッシュ（SHA-256）。
+    weight に "capacity" などを渡すと、その属性（ない場合は default）で同じハッシュを作る。
+
+    行ごとのハッシュを pd.util.hash_pandas_object で一括計算し、並べ替えてから連結するため
+    拠点・ルートの追加順序に依存しない。同じグラフオブジェクトの2回目以降は記憶した値を返すので、
+    キャッシュに登録したグラフは以後変更しないこと。
+    """
+    memo = _fingerprints.setdefault(G, {})
+    size = (G.number_of_nodes(), G.number_of_edges())
+    saved = memo.get((weight, default))
+    if saved is not None and saved[0] == size:
+        return saved[1]
+
+    nodes = pd.Series(list(G.nodes()), dtype=object)
+    edges = pd.DataFrame(list(G.edges(data=weight, default=default)), columns=["u", "v", "w"])
+    h = hashlib.sha256()
+    h.update(b"nodes")
+    h.update(np.sort(pd.util.hash_pandas_object(nodes, index=False).to_numpy()).tobytes())
+    h.update(b"edges")
+    h.update(np.sort(pd.util.hash_pandas_object(edges, index=False).to_numpy()).tobytes())
+    digest = h.hexdigest()
+
+    memo[(weight, default)] = (size, digest)
+    return digest
+
+
+def cache_key(kind: str, G: nx.DiGraph, params=None) -> str:
+    """分析の種類・グラフのハッシュ・パラメータから決まるキャッシュキー。"""
+    h = hashlib.sha256()
+    for part in (CACHE_VERSION, kind, graph_fingerprint(G), repr(params)):
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# 2層キャッシュ（メモリ LRU + ディスク LRU）
+# ---------------------------------------------------------------------------
+class AnalysisCache:
+    """
+    分析結果をメモリとディスクに保存するLRUキャッシュ。
+
+    メモリ層は件数で、ディスク層は合計バイト数で上限を設け、超えたら最も古く使われたものから捨てる。
+    ディスク層は1件1ファイル（pickle）で、読み出し時に更新時刻を更新してLRU順を保つ。
+    Streamlit はセッションごとにスレッドを使うため、メモリ層はロックで保護する。
+    返り値は呼び出し元どうしで共有されるので、変更せずに使うこと。
+    """
+
+    def __init__(
+        self,
+        directory: str | None = CACHE_DIR,
+        max_bytes: int = CACHE_MAX_BYTES,
+        max_entries: int = CACHE_MAX_ENTRIES,
+    ):
+        self.directory   = directory
+        self.max_bytes   = max_bytes
+        self.max_entries = max_entries
+        self.hits        = 0
+        self.misses      = 0
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key: str) -> tuple:
+        """(見つかったか, 値) を返す。"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return True, self._memory[key]
+
+        if self.directory:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    value = pickle.load(f)
+                os.utime(path)
+            except (OSError, pickle.UnpicklingError, EOFError):
+                pass
+            else:
+                self._remember(key, value)
+                with self._lock:
+                    self.hits += 1
+                return True, value
+
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def put(self, key: str, value) -> None:
+        self._remember(key, value)
+        if not self.directory:
+            return
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except OSError:
+            return
+        self._evict_disk()
+
+    def get_or_compute(self, key: str, compute):
+        found, value = self.get(key)
+        if not found:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith(".pkl"):
+                    os.remove(os.path.join(self.directory, name))
+
+    def _remember(self, key: str, value) -> None:
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _evict_disk(self) -> None:
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pkl"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+
+
+_default_cache: AnalysisCache | None = None
+
+
+def get_cache() -> AnalysisCache:
+    """プロセス共通のキャッシュ（ディスクが使えない環境ではメモリのみ）。"""
+    global _default_cache
+    if _default_cache is None:
+        try:
+            _default_cache = AnalysisCache()
+        except OSError:
+            _default_cache = AnalysisCache(directory=None)
+    return _default_cache
+
+
+# ---------------------------------------------------------------------------
+# キャッシュ付き分析
+# ---------------------------------------------------------------------------
+def cached_strong_bridges(G: nx.DiGraph) -> list:
+    return get_cache().get_or_compute(
+        cache_key("strong_bridges", G), lambda: find_strong_bridges(G)
+    )
+
+
+def cached_articulation_points(G: nx.DiGraph) -> list:
+    return get_cache().get_or_compute(
+        cache_key("strong_articulation_points", G), lambda: find_strong_articulation_points(G)
+    )
+
+
+def cached_scc_map(G: nx.DiGraph) -> tuple:
+    return get_cache().get_or_compute(
+        cache_key("scc_map", G), lambda: build_stable_scc_map(G)
+    )
+
+
+def cached_distance_index(G: nx.DiGraph) -> DistanceIndex | None:
+    """
+    距離インデックスのキャッシュ版（ディスクにも保存されるので、同じグラフなら再起動後も作り直さない）。
+    ショートカットが多すぎて作れないネットワークでは None（呼び出し側は Dijkstra で計算する）。
+    """
+    def _compute():
+        try:
+            return DistanceIndex(G)
+        except ValueError:
+            return None
+
+    return get_cache().get_or_compute(cache_key("distance_index", G), _compute)
+
+
+def cached_reachable(G: nx.DiGraph, source) -> tuple:
+    """
+    source から到達できる拠点（source を除く）と、そのうち最短距離が最も遠い拠点（なければ None）。
+    画面の再実行ごとに全体の最短距離を計算し直さないよう、グラフと source の組ごとにキャッシュする。
+    """
+    def _compute():
+        cg = CompactGraph.from_networkx(G)
+        s = cg.index[source]
+        dist = dijkstra(cg.to_csr(), indices=s)
+        dist[s] = np.inf
+        reach = np.flatnonzero(np.isfinite(dist))
+        if not len(reach):
+            return [], None
+        return [cg.nodes[i] for i in reach.tolist()], cg.nodes[int(reach[np.argmax(dist[reach])])]
+
+    return get_cache().get_or_compute(cache_key("reachable", G, source), _compute)
+
+
+def demand_fingerprint(demand: pd.DataFrame) -> str:
+    """需要表（origin / destination / volume）の行順に依存しないハッシュ。"""
+    h = hashlib.sha256()
+    h.update(np.sort(pd.util.hash_pandas_object(demand, index=False).to_numpy()).tobytes())
+    return h.hexdigest()
+
+
+def cached_demand_impact(
+    G: nx.DiGraph,
+    demand: pd.DataFrame,
+    max_workers: int | None = None,
+    fingerprint: str | None = None,
+) -> DemandImpact:
+    """
+    DemandImpact のキャッシュ版（グラフと需要表の組ごとに平常時の最短経路木を1回だけ作る）。
+    fingerprint に計算済みの demand_fingerprint(demand) を渡すと需要表のハッシュを省く。
+    """
+    return get_cache().get_or_compute(
+        cache_key("demand_impact", G, fingerprint or demand_fingerprint(demand)),
+        lambda: DemandImpact(G, demand, max_workers=max_workers),
+    )
+
@@ -0,0 +1,592 @@
+"""
+主要アルゴリズムの計測（実行時間・ピークメモリ）と、計測結果どうしの比較。
+
+  python benchmark.py run -o base.json
+  python benchmark.py run --sizes 1000,1000000 --topologies gnp,grid -o big.json
+  python benchmark.py compare base.json new.json --threshold 0.2
+  python benchmark.py self-check
+
+run はシード固定の合成ネットワーク（ルート数 100 〜 1,000,000）を生成し、
+処理ごとに実行時間（最小値・中央値）と tracemalloc によるピークメモリを JSON に書く。
+compare は同じトポロジー・規模・処理の組を突き合わせ、悪化があれば終了コード 1 を返す。
+"""
+import argparse
+import gc
+import io
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+# ---------------------------------------------------------------------------
+# 設定
+# ---------------------------------------------------------------------------
+BENCH_SIZES        = (100, 1_000, 10_000, 100_000)       # 既定の目標ルート数（--sizes で 1,000,000 まで）
+BENCH_TOPOLOGIES   = ("gnp", "hub", "grid", "kanto")
+BENCH_REPEAT       = 3
+BENCH_REPEAT_LIMIT = 2.0      # 1回の実行がこの秒数を超えたら繰り返さない
+BENCH_MAX_FAILURES = 100      # 障害シナリオで停止させる拠点・ルート数の上限（拠点数の1%）
+BENCH_REROUTE_EDGES = 5       # 迂回コスト分析で評価する停止ルート数
+BENCH_QUERIES      = 200      # 距離インデックスの問い合わせ計測で使う拠点ペア数
+BENCH_DEMAND_ROWS  = 1_000_000  # 需要表の行数の上限（ルート数の10倍、出発拠点は BENCH_DEMAND_ORIGINS 件）
+BENCH_DEMAND_ORIGINS = 50
+REGRESSION_THRESHOLD = 0.20   # compare: 20% 以上の増加を悪化とみなす
+REGRESSION_MIN_SECONDS = 0.005  # compare: これより小さい時間差は誤差として無視する
+REGRESSION_MIN_MIB     = 1.0    # compare: これより小さいメモリ差は誤差として無視する
+
+
+# ---------------------------------------------------------------------------
+# 合成ネットワーク
+# ---------------------------------------------------------------------------
+def _to_graph(names: list, tails: np.ndarray, heads: np.ndarray, weights: np.ndarray) -> nx.DiGraph:
+    G = nx.DiGraph()
+    G.add_nodes_from(names)
+    keep = tails != heads
+    G.add_weighted_edges_from(zip(
+        (names[i] for i in tails[keep].tolist()),
+        (names[i] for i in heads[keep].tolist()),
+        weights[keep].tolist(),
+    ))
+    return G
+
+
+def gnp_network(n_edges: int, seed: int = 0) -> nx.DiGraph:
+    """一様ランダムの fast_gnp_random_graph（平均出次数 4、コストは 1〜5 の整数）。"""
+    n = max(n_edges // 4, 10)
+    raw = nx.fast_gnp_random_graph(n, min(n_edges / (n * (n - 1)), 1.0), seed=seed, directed=True)
+    rng = np.random.default_rng(seed)
+    names = [f"N{i}" for i in range(n)]
+    edges = np.array(list(raw.edges()), dtype=np.int64).reshape(-1, 2)
+    return _to_graph(names, edges[:, 0], edges[:, 1], rng.integers(1, 6, len(edges)).astype(float))
+
+
+def hub_network(n_edges: int, seed: int = 0) -> nx.DiGraph:
+    """
+    ハブ＆スポーク型。ハブどうしは双方向の環状線＋ランダムな双方向の幹線、
+    各スポークは担当ハブと双方向に1本ずつ（末端依存の強橋になる）、1割は別のハブへ片道の補助ルートを持つ。
+    """
+    rng = np.random.default_rng(seed)
+    n_hubs = max(3, round(math.sqrt(n_edges) / 2))
+    ring = np.arange(n_hubs)
+    chord_u = rng.integers(0, n_hubs, n_hubs)
+    chord_v = rng.integers(0, n_hubs, n_hubs)
+    hub_u = np.concatenate([ring, (ring + 1) % n_hubs, chord_u, chord_v])
+    hub_v = np.concatenate([(ring + 1) % n_hubs, ring, chord_v, chord_u])
+
+    n_spokes = max(int((n_edges - len(hub_u)) / 2.1), 1)
+    spokes = n_hubs + np.arange(n_spokes)
+    home = rng.integers(0, n_hubs, n_spokes)
+    extra = rng.random(n_spokes) < 0.1
+    other = rng.integers(0, n_hubs, int(extra.sum()))
+    spoke_w = rng.integers(5, 61, n_spokes)
+
+    tails = np.concatenate([hub_u, home, spokes, spokes[extra]])
+    heads = np.concatenate([hub_v, spokes, home, other])
+    weights = np.concatenate([
+        rng.integers(50, 301, len(hub_u)),
+        spoke_w, spoke_w,
+        rng.integers(20, 121, len(other)),
+    ]).astype(float)
+    names = [f"H{i}" for i in range(n_hubs)] + [f"S{i}" for i in range(n_spokes)]
+    return _to_graph(names, tails, heads, weights)
+
+
+def grid_network(n_edges: int, seed: int = 0) -> nx.DiGraph:
+    """道路網に近い格子。隣接マスを双方向で結び、1割を一方通行、3%を通行止めにする。"""
+    rng = np.random.default_rng(seed)
+    side = max(int(math.ceil(math.sqrt(n_edges / 4))), 2)
+    cell = np.arange(side * side).reshape(side, side)
+    pu = np.concatenate([cell[:, :-1].ravel(), cell[:-1, :].ravel()])
+    pv = np.concatenate([cell[:, 1:].ravel(), cell[1:, :].ravel()])
+    kind = rng.random(len(pu))
+    length = rng.integers(1, 11, len(pu)).astype(float)
+    one_way = (kind >= 0.03) & (kind < 0.13)
+    both = kind >= 0.13
+    flip = rng.random(len(pu)) < 0.5
+    tails = np.concatenate([pu[both], pv[both], np.where(flip, pv, pu)[one_way]])
+    heads = np.concatenate([pv[both], pu[both], np.where(flip, pu, pv)[one_way]])
+    weights = np.concatenate([length[both], length[both], length[one_way]])
+    names = [f"G{r}_{c}" for r in range(side) for c in range(side)]
+    return _to_graph(names, tails, heads, weights)
+
+
+def kanto_network(n_edges: int, seed: int = 0) -> nx.DiGraph:
+    """
+    KANTO_BASE_EDGES を地域ごとに複製して拡大したネットワーク。
+    地域 i の拠点名は「東京3」のように番号を付け、東京・横浜どうしを隣の地域と双方向で結ぶ。
+    """
+    from scenarios import KANTO_BASE_EDGES
+
+    rng = np.random.default_rng(seed)
+    base = pd.DataFrame(KANTO_BASE_EDGES, columns=["from", "to", "cost"])
+    base_names = list(dict.fromkeys(base["from"].tolist() + base["to"].tolist()))
+    local = {n: i for i, n in enumerate(base_names)}
+    bu = base["from"].map(local).to_numpy()
+    bv = base["to"].map(local).to_numpy()
+    k = len(base_names)
+
+    copies = max(1, round(n_edges / (len(base) + 4)))
+    offset = (np.arange(copies) * k)[:, None]
+    tails = [(bu + offset).ravel()]
+    heads = [(bv + offset).ravel()]
+    weights = [np.tile(base["cost"].to_numpy(dtype=float), copies)]
+    if copies > 1:
+        region = np.arange(copies)
+        nxt = (region + 1) % copies
+        for hub in ("東京", "横浜"):
+            a, b = region * k + local[hub], nxt * k + local[hub]
+            tails += [a, b]
+            heads += [b, a]
+            w = rng.integers(150, 401, copies).astype(float)
+            weights += [w, w]
+    names = [f"{n}{i}" for i in range(copies) for n in base_names]
+    return _to_graph(names, np.concatenate(tails), np.concatenate(heads), np.concatenate(weights))
+
+
+def knn_network(n_edges: int, seed: int = 0) -> nx.DiGraph:
+    """synthetic.geographic_knn（座標の近い拠点どうしを結ぶ道路網、コストは距離 km）。"""
+    from synthetic import generate_network, nodes_for_edges
+
+    return generate_network("knn", nodes_for_edges("knn", n_edges), seed=seed).to_networkx()
+
+
+def corridor_network(n_edges: int, seed: int = 0) -> nx.DiGraph:
+    """synthetic.corridor（都市圏を結ぶ幹線回廊と支線、コストは距離 km）。"""
+    from synthetic import generate_network, nodes_for_edges
+
+    return generate_network("corridor", nodes_for_edges("corridor", n_edges), seed=seed).to_networkx()
+
+
+GENERATORS = {
+    "gnp":      gnp_network,
+    "hub":      hub_network,
+    "grid":     grid_network,
+    "kanto":    kanto_network,
+    "knn":      knn_network,
+    "corridor": corridor_network,
+}
+
+
+# ---------------------------------------------------------------------------
+# 計測対象の処理
+# ---------------------------------------------------------------------------
+def _failure_scenario(G: nx.DiGraph, seed: int) -> tuple:
+    """拠点数の1%（上限 BENCH_MAX_FAILURES）の拠点とルートを無作為に停止させるシナリオ。"""
+    rng = np.random.default_rng(seed)
+    nodes = list(G.nodes())
+    edges = list(G.edges())
+    k = max(1, min(BENCH_MAX_FAILURES, len(nodes) // 100))
+    failed_nodes = [nodes[i] for i in rng.choice(len(nodes), min(k, len(nodes)), replace=False)]
+    failed_edges = [edges[i] for i in rng.choice(len(edges), min(k, len(edges)), replace=False)]
+    return failed_nodes, failed_edges
+
+
+def _prepare(G: nx.DiGraph, seed: int) -> dict:
+    """計測に含めない準備（障害シナリオ・障害後のグラフ・CSV バイト列）。"""
+    from algorithms import simulate_failure
+
+    failed_nodes, failed_edges = _failure_scenario(G, seed)
+    G_after, isolated, *_ = simulate_failure(G, failed_nodes=failed_nodes, failed_edges=failed_edges)
+    buf = io.StringIO()
+    pd.DataFrame(
+        [(u, v, d.get("weight", 1.0)) for u, v, d in G.edges(data=True)], columns=["from", "to", "cost"]
+    ).to_csv(buf, index=False)
+    return {
+        "failed_nodes": failed_nodes,
+        "failed_edges": failed_edges,
+        "G_after":      G_after,
+        "isolated":     isolated,
+        "csv":          buf.getvalue().encode("utf-8"),
+    }
+
+
+def _task_strong_bridges(G, ctx):
+    from algorithms import find_strong_bridges
+    return lambda: find_strong_bridges(G)
+
+
+def _task_cascade(G, ctx):
+    from algorithms import find_cascade_failures
+    return lambda: find_cascade_failures(ctx["G_after"], ctx["isolated"])
+
+
+def _task_simulate(G, ctx):
+    from algorithms import simulate_failure
+    return lambda: simulate_failure(G, failed_nodes=ctx["failed_nodes"], failed_edges=ctx["failed_edges"])
+
+
+def _task_rerouting(G, ctx):
+    from algorithms import analyze_rerouting_cost
+    failed = ctx["failed_edges"][:BENCH_REROUTE_EDGES]
+    return lambda: analyze_rerouting_cost(G, ctx["G_after"], failed)
+
+
+def _task_load_csv(G, ctx):
+    from scenarios import load_graph_from_file
+    return lambda: load_graph_from_file(io.BytesIO(ctx["csv"]), fmt="csv")
+
+
+def _distance_index(G, ctx):
+    """問い合わせ系の計測で共有する距離インデックス（作れないネットワークでは None）。"""
+    from distance_index import DistanceIndex
+
+    if "distance_index" not in ctx:
+        try:
+            ctx["distance_index"] = DistanceIndex(G)
+        except ValueError as e:
+            ctx["distance_index"], ctx["distance_index_error"] = None, str(e)
+    return ctx["distance_index"]
+
+
+def _skipped(ctx):
+    fn = lambda: None
+    fn.report = lambda: {"備考": ctx.get("distance_index_error")}
+    return fn
+
+
+def _task_build_distance_index(G, ctx):
+    """距離インデックスの構築。インデックスのサイズ・ショートカット数を結果に添える。"""
+    from distance_index import DistanceIndex
+
+    built: dict = {}
+
+    def fn():
+        try:
+            built["index"] = DistanceIndex(G)
+        except ValueError as e:
+            built["error"] = str(e)
+
+    def report():
+        if "index" not in built:
+            return {"備考": built.get("error")}
+        stats = built["index"].stats
+        return {"インデックスMiB": stats["サイズMiB"], "ショートカット数": stats["ショートカット数"]}
+
+    fn.report = report
+    return fn
+
+
+def _task_distance_query(G, ctx):
+    index = _distance_index(G, ctx)
+    if index is None:
+        return _skipped(ctx)
+    rng = np.random.default_rng(0)
+    nodes = list(G.nodes())
+    pairs = [(nodes[i], nodes[j]) for i, j in rng.integers(len(nodes), size=(BENCH_QUERIES, 2)).tolist()]
+    return lambda: index.distances(pairs)
+
+
+def _task_rerouting_indexed(G, ctx):
+    from algorithms import analyze_rerouting_cost
+    index = _distance_index(G, ctx)
+    if index is None:
+        return _skipped(ctx)
+    failed = ctx["failed_edges"][:BENCH_REROUTE_EDGES]
+    return lambda: analyze_rerouting_cost(G, ctx["G_after"], failed, distance_index=index)
+
+
+def _demand_csv(G, ctx) -> bytes:
+    """需要加重の計測で共有する需要表（CSV のバイト列）。"""
+    if "demand_csv" not in ctx:
+        rng = np.random.default_rng(0)
+        nodes = np.array(list(G.nodes()), dtype=object)
+        rows = min(BENCH_DEMAND_ROWS, 10 * G.number_of_edges())
+        origins = nodes[rng.choice(len(nodes), min(BENCH_DEMAND_ORIGINS, len(nodes)), replace=False)]
+        df = pd.DataFrame({"origin": origins[rng.integers(len(origins), size=rows)],
+                           "destination": nodes[rng.integers(len(nodes), size=rows)],
+                           "volume": rng.integers(1, 1000, size=rows)})
+        ctx["demand_csv"] = df.to_csv(index=False).encode("utf-8")
+    return ctx["demand_csv"]
+
+
+def _task_load_demand(G, ctx):
+    from demand import load_demand_from_file
+    data = _demand_csv(G, ctx)
+    return lambda: load_demand_from_file(io.BytesIO(data), fmt="csv")
+
+
+def _demand_impact(G, ctx):
+    """需要加重の計測で共有する DemandImpact（逐次実行で構築）。"""
+    from demand import DemandImpact, load_demand_from_file
+
+    if "demand_impact" not in ctx:
+        demand, _, _ = load_demand_from_file(io.BytesIO(_demand_csv(G, ctx)), fmt="csv")
+        ctx["demand_table"] = demand
+        ctx["demand_impact"] = DemandImpact(G, demand, max_workers=1)
+    return ctx["demand_impact"]
+
+
+def _task_build_demand_impact(G, ctx):
+    """需要ペアの平常時の最短経路木（逐次実行）。需要ペア数・索引のサイズを結果に添える。"""
+    from demand import DemandImpact
+
+    impact = _demand_impact(G, ctx)
+    fn = lambda: DemandImpact(G, ctx["demand_table"], max_workers=1)
+    fn.report = lambda: {"ODペア数": len(impact.base), "インデックスMiB": impact.nbytes() / 2**20}
+    return fn
+
+
+def _task_demand_evaluate(G, ctx):
+    """停止ルート BENCH_REROUTE_EDGES 本をそれぞれ単独で止めたときの需要加重スコア（N-1 の一部）。"""
+    impact = _demand_impact(G, ctx)
+    failed = ctx["failed_edges"][:BENCH_REROUTE_EDGES]
+    return lambda: [impact.evaluate(None, [e]) for e in failed]
+
+
+TASKS = {
+    "find_strong_bridges":    _task_strong_bridges,
+    "find_cascade_failures":  _task_cascade,
+    "simulate_failure":       _task_simulate,
+    "analyze_rerouting_cost": _task_rerouting,
+    "load_graph_from_csv":    _task_load_csv,
+    "build_distance_index":   _task_build_distance_index,
+    "distance_query":         _task_distance_query,
+    "analyze_rerouting_cost_indexed": _task_rerouting_indexed,
+    "load_demand_from_csv":   _task_load_demand,
+    "build_demand_impact":    _task_build_demand_impact,
+    "demand_evaluate":        _task_demand_evaluate,
+}
+
+
+# ---------------------------------------------------------------------------
+# 計測
+# ---------------------------------------------------------------------------
+def measure(fn, repeat: int = BENCH_REPEAT, memory: bool = True) -> dict:
+    """
+    fn を最大 repeat 回実行して実行時間を測り、別に1回 tracemalloc 下で実行してピークメモリを測る。
+    1回が BENCH_REPEAT_LIMIT 秒を超えたら繰り返さない。
+    """
+    times = []
+    for _ in range(max(repeat, 1)):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+        if times[-1] > BENCH_REPEAT_LIMIT:
+            break
+
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            base = tracemalloc.get_traced_memory()[0]
+            fn()
+            peak = (tracemalloc.get_traced_memory()[1] - base) / 2**20
+        finally:
+            tracemalloc.stop()
+    return {"最小秒": min(times), "中央値秒": statistics.median(times),
+            "試行回数": len(times), "ピークMiB": peak}
+
+
+def _environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "日時":      time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "コミット":  commit or None,
+        "Python":    platform.python_version(),
+        "OS":        platform.platform(),
+        "CPU数":     os.cpu_count(),
+        "networkx":  nx.__version__,
+        "numpy":     np.__version__,
+        "pandas":    pd.__version__,
+    }
+
+
+def run_benchmarks(
+    sizes=BENCH_SIZES,
+    topologies=BENCH_TOPOLOGIES,
+    tasks=None,
+    repeat: int = BENCH_REPEAT,
+    memory: bool = True,
+    seed: int = 0,
+):
+    """トポロジー × 規模 × 処理 の計測結果を1件ずつ返すジェネレータ。"""
+    tasks = list(tasks or TASKS)
+    for topology in topologies:
+        for size in sizes:
+            start = time.perf_counter()
+            G = GENERATORS[topology](int(size), seed=seed)
+            generated = time.perf_counter() - start
+            ctx = _prepare(G, seed)
+            for name in tasks:
+                fn = TASKS[name](G, ctx)
+                row = {
+                    "トポロジー":  topology,
+                    "目標ルート数": int(size),
+                    "拠点数":      G.number_of_nodes(),
+                    "ルート数":    G.number_of_edges(),
+                    "処理":        name,
+                    "生成秒":      generated,
+                    **measure(fn, repeat=repeat, memory=memory),
+                }
+                report = getattr(fn, "report", None)     # 処理ごとの付帯情報（インデックスのサイズなど）
+                if report is not None:
+                    row.update(report())
+                yield row
+            del G, ctx
+
+
+# ---------------------------------------------------------------------------
+# 比較
+# ---------------------------------------------------------------------------
+def compare_results(
+    base: list,
+    new: list,
+    threshold: float = REGRESSION_THRESHOLD,
+    min_seconds: float = REGRESSION_MIN_SECONDS,
+    min_mib: float = REGRESSION_MIN_MIB,
+) -> pd.DataFrame:
+    """
+    2回分の計測結果を (トポロジー, 目標ルート数, 処理) で突き合わせる。
+    時間は揺らぎの小さい最小秒で比べ、比率が 1 + threshold を超え、かつ差が min_seconds 以上なら「悪化」。
+    ピークメモリも同様（差が min_mib MiB 以上）。片方にしかない組は「比較対象なし」。
+    """
+    keys = ["トポロジー", "目標ルート数", "処理"]
+
+    def _frame(records: list) -> pd.DataFrame:
+        # --no-memory の計測はピークMiB が None なので、数値（欠損は NaN）にそろえてから突き合わせる
+        df = pd.DataFrame(records)[keys + ["最小秒", "ピークMiB"]]
+        return df.assign(ピークMiB=pd.to_numeric(df["ピークMiB"], errors="coerce"))
+
+    df = _frame(base).merge(_frame(new), on=keys, how="outer", suffixes=("（基準）", "（今回）"))
+    df["時間比"] = df["最小秒（今回）"] / df["最小秒（基準）"]
+    df["メモリ比"] = df["ピークMiB（今回）"] / df["ピークMiB（基準）"]
+
+    def _verdict(row) -> str:
+        if pd.isna(row["最小秒（基準）"]) or pd.isna(row["最小秒（今回）"]):
+            return "比較対象なし"
+        dt = row["最小秒（今回）"] - row["最小秒（基準）"]
+        dm = row["ピークMiB（今回）"] - row["ピークMiB（基準）"]
+        slower = row["時間比"] > 1 + threshold and dt >= min_seconds
+        bigger = pd.notna(dm) and row["メモリ比"] > 1 + threshold and dm >= min_mib
+        if slower or bigger:
+            return "悪化（" + "・".join(k for k, f in (("時間", slower), ("メモリ", bigger)) if f) + "）"
+        if row["時間比"] < 1 / (1 + threshold) and -dt >= min_seconds:
+            return "改善"
+        return "変化なし"
+
+    df["判定"] = df.apply(_verdict, axis=1)
+    return df.sort_values(keys).reset_index(drop=True)
+
+
+def self_check() -> None:
+    """compare の判定を固定の計測結果で確かめる（ピークメモリを測らなかった回を含む）。不一致なら AssertionError。"""
+    def rec(task, seconds, mib):
+        return {"トポロジー": "gnp", "目標ルート数": 100, "処理": task, "最小秒": seconds, "ピークMiB": mib}
+
+    base = [rec("遅くなる", 1.0, 10.0), rec("速くなる", 1.0, 10.0), rec("メモリ増", 1.0, 10.0),
+            rec("片方だけメモリ", 1.0, 10.0), rec("両方メモリなし", 1.0, None), rec("基準のみ", 1.0, None)]
+    new = [rec("遅くなる", 2.0, 10.0), rec("速くなる", 0.5, 10.0), rec("メモリ増", 1.0, 20.0),
+           rec("片方だけメモリ", 1.0, None), rec("両方メモリなし", 2.0, None)]
+    expected = {
+        "遅くなる":       "悪化（時間）",
+        "速くなる":       "改善",
+        "メモリ増":       "悪化（メモリ）",
+        "片方だけメモリ": "変化なし",
+        "両方メモリなし": "悪化（時間）",
+        "基準のみ":       "比較対象なし",
+    }
+    got = dict(zip(*compare_results(base, new)[["処理", "判定"]].to_numpy().T))
+    assert got == expected, f"compare の判定が想定と異なります: {got}"
+
+
+# ---------------------------------------------------------------------------
+# コマンドライン
+# ---------------------------------------------------------------------------
+def _int_list(text: str) -> list:
+    return [int(float(t)) for t in text.split(",") if t.strip()]
+
+
+def _name_list(choices):
+    def parse(text: str) -> list:
+        names = [t.strip() for t in text.split(",") if t.strip()]
+        unknown = [t for t in names if t not in choices]
+        if unknown:
+            raise argparse.ArgumentTypeError(f"不明な指定: {', '.join(unknown)}（選択肢: {', '.join(choices)}）")
+        return names
+    return parse
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="benchmark.py", description="主要アルゴリズムの計測と比較")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="合成ネットワークで計測して JSON に書く")
+    p.add_argument("-o", "--output", help="出力先の JSON（省略時は標準出力）")
+    p.add_argument("--sizes", type=_int_list, default=list(BENCH_SIZES), help="目標ルート数（カンマ区切り）")
+    p.add_argument("--topologies", type=_name_list(list(GENERATORS)), default=list(BENCH_TOPOLOGIES),
+                   help="トポロジー（カンマ区切り）: " + ", ".join(GENERATORS))
+    p.add_argument("--tasks", type=_name_list(list(TASKS)), default=list(TASKS),
+                   help="処理（カンマ区切り）: " + ", ".join(TASKS))
+    p.add_argument("--repeat", type=int, default=BENCH_REPEAT, help="繰り返し回数")
+    p.add_argument("--no-memory", action="store_true", help="ピークメモリを測らない（tracemalloc の実行を省く）")
+    p.add_argument("--seed", type=int, default=0, help="生成・障害シナリオの乱数シード")
+
+    p = sub.add_parser("compare", help="2回分の計測結果を比べ、悪化があれば終了コード 1")
+    p.add_argument("base", help="基準の JSON")
+    p.add_argument("new", help="今回の JSON")
+    p.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="悪化とみなす増加率")
+    p.add_argument("--min-seconds", type=float, default=REGRESSION_MIN_SECONDS,
+                   help="これより小さい時間差は無視する")
+
+    sub.add_parser("self-check", help="compare の判定を固定の計測結果で確かめる")
+    return parser
+
+
+def main(argv: list | None = None) -> int:
+    args = build_parser().parse_args(argv)
+
+    if args.command == "run":
+        results = []
+        for r in run_benchmarks(args.sizes, args.topologies, args.tasks,
+                                repeat=args.repeat, memory=not args.no_memory, seed=args.seed):
+            peak = "" if r["ピークMiB"] is None else f" / {r['ピークMiB']:.1f} MiB"
+            if "インデックスMiB" in r:
+                peak += f"（インデックス {r['インデックスMiB']:.1f} MiB）"
+            elif r.get("備考"):
+                peak += f"（{r['備考']}）"
+            print(f"{r['トポロジー']:>5} {r['ルート数']:>9,} ルート  {r['処理']:<24} "
+                  f"{r['最小秒']:.4f} 秒{peak}", file=sys.stderr)
+            results.append(r)
+        text = json.dumps({"環境": _environment(), "結果": results}, ensure_ascii=False, indent=2)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+        else:
+            print(text)
+        return 0
+
+    if args.command == "self-check":
+        self_check()
+        print("compare の判定: OK", file=sys.stderr)
+        return 0
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    df = compare_results(base["結果"], new["結果"], threshold=args.threshold, min_seconds=args.min_seconds)
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(df.to_string(index=False, float_format=lambda x: f"{x:.4g}"))
+    regressions = df["判定"].str.startswith("悪化")
+    print(f"\n悪化: {int(regressions.sum())} 件 / 改善: {int((df['判定'] == '改善').sum())} 件",
+          file=sys.stderr)
+    return 1 if regressions.any() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
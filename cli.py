@@ -0,0 +1,457 @@
+"""
+物流ネットワーク分析のコマンドライン版（Streamlit・Matplotlib なしで実行できる）。
+
+  python cli.py bridges   routes.csv -o bridges.json
+  python cli.py failure   routes.parquet --node 御殿場 --edge 東京,横浜 -o status.parquet
+  python cli.py rerouting routes.csv --edge 東京,横浜 --origins 1000 -o pairs.parquet
+  python cli.py montecarlo routes.csv --node-prob 0.01 --edge-prob 0.02 -o risk.parquet
+  python cli.py stream routes.csv --events outages.jsonl --follow
+  python cli.py maxflow routes.csv --source 東京 --sink 長野 --sink 静岡 --sweep -o losses.parquet
+  python cli.py plan routes.csv --candidates new_routes.csv --budget 500 -o plan.parquet
+  python cli.py depend routes.csv --hub 東京 --hub 名古屋 --node 長野 --node 御殿場 -o ranking.parquet
+  python cli.py profile routes.csv --source 東京 --target 横浜 -o profile.parquet
+  python cli.py distance routes.csv --pair 東京,長野 --pair 横浜,静岡 --edge 東京,横浜
+  python cli.py demand routes.csv --demand od.csv --edge 東京,横浜 --sweep -o ranking.parquet
+
+入力は from / to / cost（/ capacity）列の CSV または Parquet（"-" で標準入力の CSV）。
+出力先の拡張子が .parquet なら表を Parquet で、それ以外は JSON で書く（-o 省略時は標準出力に JSON）。
+networkx・pandas・分析本体はサブコマンドの実行時に読み込むため、--help や引数エラーは即座に返る。
+環境変数 LOGISTICS_SPAN_LOG にファイル名を指定すると、処理区間ごとの時間を JSON Lines で追記する。
+"""
+import argparse
+import json
+import math
+import sys
+
+
+# ---------------------------------------------------------------------------
+# 入出力
+# ---------------------------------------------------------------------------
+def _load(path: str, fmt: str | None, chunksize: int):
+    from scenarios import load_graph_from_file
+
+    source = sys.stdin.buffer if path == "-" else path
+    G, err, report = load_graph_from_file(source, fmt=fmt or (None if path != "-" else "csv"),
+                                          chunksize=chunksize)
+    if err:
+        sys.exit(f"エラー: {err}")
+    if report["拠点名欠損で除外"] or report["コスト不正（1.0で補完）"] or report["容量不正（1.0で補完）"]:
+        print(
+            f"警告: {report['総行数']}行中 拠点名欠損で除外: {report['拠点名欠損で除外']}行 / "
+            f"コスト不正（1.0で補完）: {report['コスト不正（1.0で補完）']}行 / "
+            f"容量不正（1.0で補完）: {report['容量不正（1.0で補完）']}行",
+            file=sys.stderr,
+        )
+    return G
+
+
+def _parse_edge(text: str) -> tuple:
+    for sep in ("→", "->", ","):
+        if sep in text:
+            u, v = text.split(sep, 1)
+            return u.strip(), v.strip()
+    raise argparse.ArgumentTypeError(f"ルートは 'from,to' の形式で指定してください: {text}")
+
+
+def _jsonable(value):
+    """JSON に書ける値へ変換する（∞・NaN は null、集合・タプルはリスト）。"""
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = sorted(value, key=str) if isinstance(value, (set, frozenset)) else value
+        return [_jsonable(v) for v in items]
+    if hasattr(value, "item"):          # NumPy のスカラー
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _records(df) -> list:
+    return json.loads(df.to_json(orient="records", force_ascii=False))
+
+
+def _write(payload: dict, table, out: str | None) -> None:
+    if out and out.lower().endswith((".parquet", ".pq")):
+        table.to_parquet(out, index=False)
+        return
+    text = json.dumps(_jsonable(payload), ensure_ascii=False, indent=2)
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+# ---------------------------------------------------------------------------
+# サブコマンド
+# ---------------------------------------------------------------------------
+def run_bridges(G, args) -> tuple:
+    import pandas as pd
+    from algorithms import find_strong_articulation_points, find_strong_bridges
+
+    bridges = find_strong_bridges(G)
+    table   = pd.DataFrame(bridges, columns=["出発拠点", "到着拠点"])
+    payload = {
+        "拠点数":   G.number_of_nodes(),
+        "ルート数": G.number_of_edges(),
+        "強橋":     _records(table),
+    }
+    if args.articulation:
+        payload["強連結切断点"] = sorted(find_strong_articulation_points(G), key=str)
+    return payload, table
+
+
+def run_failure(G, args) -> tuple:
+    import pandas as pd
+    from algorithms import simulate_failure
+
+    (_, isolated_all, isolated_complete, isolated_no_input, isolated_no_output,
+     cascade_failures, _, _, broken_sccs) = simulate_failure(
+        G, failed_nodes=args.node, failed_edges=args.edge,
+    )
+
+    status = {n: "停止" for n in args.node if n in G}
+    status.update({n: "完全孤立" for n in isolated_complete})
+    status.update({n: "補給不能" for n in isolated_no_input})
+    status.update({n: "配送不能" for n in isolated_no_output})
+    status.update({n: "カスケード故障" for n in cascade_failures})
+    table = pd.DataFrame(
+        [
+            {"拠点": n, "状態": s, "原因となった孤立拠点": "、".join(map(str, cascade_failures.get(n, [])))}
+            for n, s in status.items()
+        ],
+        columns=["拠点", "状態", "原因となった孤立拠点"],
+    )
+    payload = {
+        "停止拠点":         args.node,
+        "停止ルート":       args.edge,
+        "直接孤立拠点数":   len(isolated_all),
+        "完全孤立拠点":     isolated_complete,
+        "補給不能拠点":     isolated_no_input,
+        "配送不能拠点":     isolated_no_output,
+        "カスケード故障":   cascade_failures,
+        "分裂した循環ルート": [
+            {"元の拠点": item["original"], "分裂後": item["after"]} for item in broken_sccs
+        ],
+    }
+    return payload, table
+
+
+def run_rerouting(G, args) -> tuple:
+    import random
+
+    from algorithms import analyze_rerouting_cost, analyze_rerouting_impact, failure_view
+    from analysis_cache import cached_distance_index
+    from distance_index import INDEX_MIN_NODES
+
+    origins = None
+    if args.origins and G.number_of_nodes() > args.origins:
+        origins = random.Random(args.seed).sample(list(G.nodes()), args.origins)
+    df_pairs, summary = analyze_rerouting_impact(
+        G, failed_nodes=args.node, failed_edges=args.edge,
+        origins=origins, max_rows=args.max_rows,
+    )
+    G_after = failure_view(G, args.node, args.edge)
+    distance_index = None
+    if G.number_of_nodes() >= INDEX_MIN_NODES:
+        distance_index = cached_distance_index(G)
+    df_cost = analyze_rerouting_cost(G, G_after, args.edge, distance_index=distance_index)
+    payload = {
+        "集計":             summary,
+        "停止ルートの迂回": _records(df_cost) if not df_cost.empty else [],
+        "コストが変化した拠点ペア": _records(df_pairs),
+    }
+    return payload, df_pairs
+
+
+def run_montecarlo(G, args) -> tuple:
+    from compact_graph import CompactGraph
+    from montecarlo import failure_probability_arrays, iter_monte_carlo, summarize_monte_carlo
+
+    cg = CompactGraph.from_networkx(G)
+    p_node, p_edge = failure_probability_arrays(cg, args.node_prob, args.edge_prob)
+    state = None
+    for state in iter_monte_carlo(cg, p_node, p_edge, max_trials=args.trials, tol=args.tol,
+                                  max_workers=args.workers, seed=args.seed):
+        pass
+    df_nodes, df_broken, summary = summarize_monte_carlo(cg, state)
+    payload = {
+        "集計":         summary,
+        "拠点別":       _records(df_nodes),
+        "分裂数の分布": _records(df_broken),
+    }
+    return payload, df_nodes
+
+
+def run_maxflow(G, args) -> tuple:
+    from contingency import contingency_scenarios
+    from maxflow import FlowNetwork, iter_capacity_sweep, rank_capacity_losses
+
+    try:
+        net = FlowNetwork(G, args.source, args.sink)
+    except ValueError as e:
+        sys.exit(f"エラー: {e}")
+    table = net.edge_flows()
+    payload = {
+        "出発拠点":     net.sources,
+        "到着拠点":     net.sinks,
+        "最大流量":     net.value,
+        "最小カット":   _records(net.min_cut()),
+        "ルート別流量": _records(table),
+    }
+    if args.node or args.edge:
+        scenario = net.evaluate(args.node, args.edge, with_cut=True)
+        payload["停止拠点"]         = args.node
+        payload["停止ルート"]       = args.edge
+        payload["停止後の最大流量"] = scenario["value"]
+        payload["停止後の最小カット"] = [
+            {"出発拠点": u, "到着拠点": v, "容量": c} for u, v, c in scenario["cut"]
+        ]
+    if args.sweep:
+        records = []
+        for batch, _, _ in iter_capacity_sweep(G, net.sources, net.sinks, contingency_scenarios(G),
+                                               max_workers=args.workers):
+            records.extend(batch)
+        table = rank_capacity_losses(records)
+        payload["N-1 減少ランキング"] = _records(table)
+    return payload, table
+
+
+def run_plan(G, args) -> tuple:
+    from redundancy import candidates_from_graph, distance_candidates, plan_redundancy
+
+    if args.candidates:
+        C = _load(args.candidates, None, args.chunksize)
+        candidates = candidates_from_graph(C)
+    else:
+        candidates = distance_candidates(G, k=args.neighbors, cost_per_unit=args.cost_per_unit)
+    table, summary = plan_redundancy(G, candidates, budget=args.budget, max_additions=args.max_additions)
+    payload = {**summary, "追加ルート": _records(table)}
+    return payload, table
+
+
+def run_depend(G, args) -> tuple:
+    from supply_index import SupplyDependencyIndex
+
+    try:
+        index = SupplyDependencyIndex(G, args.hub)
+    except ValueError as e:
+        sys.exit(f"エラー: {e}")
+    table = index.ranking()
+    payload = {
+        "供給拠点":           index.hubs,
+        "供給される拠点数":   len(index.supplied),
+        "供給されない拠点":   index.unsupplied(),
+        "途絶ランキング":     _records(table),
+    }
+    if args.node:
+        payload["拠点別の依存先"] = {
+            n: {"依存する上流拠点": index.dependencies(n),
+                "代替のないルート": index.critical_routes(n),
+                "停止で途絶える拠点数": index.dependent_count(n)}
+            for n in args.node
+        }
+    return payload, table
+
+
+def run_profile(G, args) -> tuple:
+    from route_profile import route_vulnerability_profile
+
+    try:
+        table, summary = route_vulnerability_profile(G, args.source, args.target)
+    except ValueError as e:
+        sys.exit(f"エラー: {e}")
+    payload = {**summary, "区間別の迂回": _records(table)}
+    return payload, table
+
+
+def run_distance(G, args) -> tuple:
+    import pandas as pd
+    from analysis_cache import cached_distance_index
+
+    index = cached_distance_index(G)
+    if index is None:
+        sys.exit("エラー: このネットワークでは距離インデックスを作れません（ショートカットが多すぎます）。")
+    before = index.distances(args.pair)
+    after  = index.distances(args.pair, args.node, args.edge)
+    table = pd.DataFrame(
+        [(s, t, b, a, a - b) for (s, t), b, a in zip(args.pair, before, after)],
+        columns=["起点", "終点", "障害前コスト", "障害後コスト", "増分"],
+    )
+    payload = {"インデックス": index.stats, "拠点ペア": _records(table)}
+    return payload, table
+
+
+def run_demand(G, args) -> tuple:
+    from contingency import contingency_scenarios, iter_contingency_sweep, rank_contingencies
+    from demand import DemandImpact, load_demand_from_file
+
+    demand, err, report = load_demand_from_file(args.demand, chunksize=args.chunksize)
+    if err:
+        sys.exit(f"エラー: {err}")
+    if report["拠点名欠損で除外"] or report["同一拠点で除外"] or report["数量不正で除外"]:
+        print(
+            f"警告: 需要表 {report['総行数']}行中 拠点名欠損で除外: {report['拠点名欠損で除外']}行 / "
+            f"同一拠点で除外: {report['同一拠点で除外']}行 / 数量不正で除外: {report['数量不正で除外']}行",
+            file=sys.stderr,
+        )
+    impact = DemandImpact(G, demand, max_workers=args.workers)
+    payload = {"需要表": impact.summary()}
+    table = None
+    if args.node or args.edge:
+        table, score = impact.impact(args.node, args.edge, max_rows=args.max_rows)
+        payload["停止拠点"]         = args.node
+        payload["停止ルート"]       = args.edge
+        payload["需要への影響"]     = score
+        payload["影響を受けた需要"] = _records(table)
+    if args.sweep:
+        records = []
+        for batch, _, _ in iter_contingency_sweep(G, contingency_scenarios(G), max_workers=args.workers,
+                                                  demand_impact=impact):
+            records.extend(batch)
+        table = rank_contingencies(records, by_demand=True)
+        payload["N-1 需要加重ランキング"] = _records(table.head(args.max_rows))
+    return payload, table
+
+
+def run_stream(G, args) -> tuple:
+    """停止・復旧イベントを逐次反映し、状態の変化を1行1件の JSON で書き出す（表は返さない）。"""
+    from outage_stream import OutageStreamProcessor, event_format, read_events, tail_lines
+
+    processor = OutageStreamProcessor(G)
+    errors: dict = {}
+    fmt = args.event_format or event_format(args.events)
+    events = read_events(tail_lines(args.events, follow=args.follow, poll_interval=args.poll),
+                         fmt=fmt, errors=errors)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for event in events:
+            notices = processor.apply(event)
+            for notice in notices:
+                out.write(json.dumps(_jsonable(notice), ensure_ascii=False) + "\n")
+            if notices:
+                out.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    summary = {**processor.summary(), **errors}
+    print(json.dumps(_jsonable(summary), ensure_ascii=False), file=sys.stderr)
+    return None, None
+
+
+COMMANDS = {
+    "bridges":    (run_bridges,    "強橋（単一障害点となるルート）の検出"),
+    "failure":    (run_failure,    "拠点・ルート停止時の孤立・カスケード故障・循環ルート分裂"),
+    "rerouting":  (run_rerouting,  "停止時の全拠点間の迂回コスト増加"),
+    "montecarlo": (run_montecarlo, "停止確率に基づく拠点ごとの孤立・カスケード故障確率の推定"),
+    "stream":     (run_stream,     "停止・復旧イベント（JSONL / CSV）を逐次反映し影響の変化を通知"),
+    "maxflow":    (run_maxflow,    "出発拠点から到着拠点への最大流量・最小カットと停止時の減少量"),
+    "plan":       (run_plan,       "強橋の解消・循環ルートの統合に効く追加ルートをコストあたりの効果順に提案"),
+    "depend":     (run_depend,     "供給拠点からの供給が必ず通る上流の拠点・ルート（単一障害点）の特定"),
+    "profile":    (run_profile,    "最短経路上の各ルートが1本止まったときの迂回コスト（ルート脆弱性プロファイル）"),
+    "distance":   (run_distance,   "距離インデックス（保存して再利用）による拠点間コストの問い合わせ"),
+    "demand":     (run_demand,     "需要表（OD表）に対する停止時の未達需要量・需要加重追加コストと N-1 ランキング"),
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="cli.py", description="物流ネットワーク障害分析（コマンドライン版）"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        p = sub.add_parser(name, help=help_text, description=help_text)
+        p.add_argument("input", help="ルート表（CSV / Parquet、'-' で標準入力の CSV）")
+        p.add_argument("-o", "--output", help="出力先（.parquet なら表を Parquet、それ以外は JSON）")
+        p.add_argument("--format", choices=["csv", "parquet"], help="入力形式（省略時は拡張子から判定）")
+        p.add_argument("--chunksize", type=int, default=500_000, help="読み込みのチャンク行数")
+        if name == "bridges":
+            p.add_argument("--articulation", action="store_true", help="強連結切断点も出力する")
+        if name == "montecarlo":
+            p.add_argument("--node-prob", type=float, default=0.01, help="拠点の停止確率（一律）")
+            p.add_argument("--edge-prob", type=float, default=0.02, help="ルートの停止確率（一律）")
+            p.add_argument("--trials", type=int, default=20_000, help="最大試行回数")
+            p.add_argument("--tol", type=float, default=0.01,
+                           help="打ち切り判定（95%%信頼区間の半幅）")
+            p.add_argument("--workers", type=int, default=None, help="並列プロセス数（省略時は全コア）")
+            p.add_argument("--seed", type=int, default=0, help="乱数シード")
+        if name == "stream":
+            p.add_argument("--events", required=True, help="イベントのファイル（'-' で標準入力）")
+            p.add_argument("--event-format", choices=["jsonl", "csv"],
+                           help="イベントの形式（省略時は拡張子から判定、標準入力は JSONL）")
+            p.add_argument("--follow", action="store_true", help="末尾に達しても終了せず追記を待つ")
+            p.add_argument("--poll", type=float, default=0.2, help="追記を確認する間隔（秒）")
+        if name == "maxflow":
+            p.add_argument("--source", action="append", required=True, help="出発拠点（複数回指定可）")
+            p.add_argument("--sink", action="append", required=True, help="到着拠点（複数回指定可）")
+            p.add_argument("--sweep", action="store_true",
+                           help="全拠点・全ルートの単一停止（N-1）による減少量を評価する")
+            p.add_argument("--workers", type=int, default=None, help="並列プロセス数（省略時は全コア）")
+        if name == "plan":
+            p.add_argument("--candidates",
+                           help="追加ルート候補の表（from / to / cost、省略時は距離ルールで作る）")
+            p.add_argument("--neighbors", type=int, default=5,
+                           help="距離ルールで候補にする近傍拠点数（拠点ごと）")
+            p.add_argument("--cost-per-unit", type=float, default=1.0,
+                           help="距離ルールのコスト（距離あたり）")
+            p.add_argument("--budget", type=float, default=None, help="追加コストの上限")
+            p.add_argument("--max-additions", type=int, default=None, help="追加するルート数の上限")
+        if name == "depend":
+            p.add_argument("--hub", action="append", required=True, help="供給拠点（複数回指定可）")
+            p.add_argument("--node", action="append", default=[], help="依存先を確認する拠点（複数回指定可）")
+        if name == "profile":
+            p.add_argument("--source", required=True, help="出発拠点")
+            p.add_argument("--target", required=True, help="到着拠点")
+        if name == "distance":
+            p.add_argument("--pair", action="append", required=True, type=_parse_edge,
+                           help="問い合わせる拠点ペア 'from,to'（複数回指定可）")
+        if name == "demand":
+            p.add_argument("--demand", required=True,
+                           help="需要表（origin / destination / volume の CSV / Parquet）")
+            p.add_argument("--sweep", action="store_true",
+                           help="全拠点・全ルートの単一停止（N-1）を需要加重で順位付けする")
+            p.add_argument("--workers", type=int, default=None, help="並列プロセス数（省略時は全コア）")
+            p.add_argument("--max-rows", type=int, default=1000, help="出力する行数の上限")
+        if name in ("failure", "rerouting", "maxflow", "distance", "demand"):
+            p.add_argument("--node", action="append", default=[], help="停止する拠点（複数回指定可）")
+            p.add_argument("--edge", action="append", default=[], type=_parse_edge,
+                           help="停止するルート 'from,to'（複数回指定可）")
+        if name == "rerouting":
+            p.add_argument("--origins", type=int, default=1000,
+                           help="評価する起点数の上限（超えたら無作為抽出、0 で全起点）")
+            p.add_argument("--seed", type=int, default=0, help="起点抽出の乱数シード")
+            p.add_argument("--max-rows", type=int, default=1000, help="出力する拠点ペアの上限")
+    return parser
+
+
+def main(argv: list | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command in ("failure", "rerouting") and not args.node and not args.edge:
+        sys.exit("エラー: --node または --edge で停止対象を1つ以上指定してください。")
+    if args.command == "demand" and not args.node and not args.edge and not args.sweep:
+        sys.exit("エラー: --node / --edge で停止対象を指定するか、--sweep を指定してください。")
+    if args.command == "stream" and args.input == "-" and args.events == "-":
+        sys.exit("エラー: ルート表とイベントの両方を標準入力から読むことはできません。")
+
+    from instrumentation import SPAN_LOG_PATH, finish_run, span, start_run
+
+    # 環境変数 LOGISTICS_SPAN_LOG があれば処理区間を JSON Lines で追記する
+    if SPAN_LOG_PATH:
+        start_run(log_path=SPAN_LOG_PATH)
+    try:
+        G = _load(args.input, args.format, args.chunksize)
+        run, _ = COMMANDS[args.command]
+        with span(f"cli.{args.command}"):
+            payload, table = run(G, args)
+        if payload is not None:
+            _write(payload, table, args.output)
+    finally:
+        finish_run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
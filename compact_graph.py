@@ -0,0 +1,330 @@
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from instrumentation import instrumented
+
+# ---------------------------------------------------------------------------
+# 配列ベースの有向グラフ（百万ルート規模向け）
+# ---------------------------------------------------------------------------
+class CompactGraph:
+    """
+    拠点名を整数IDに変換し、隣接関係を NumPy の CSR / CSC 配列で保持する有向グラフ。
+
+    nx.DiGraph は辺ごとに数百バイトの辞書を持つが、本クラスは辺あたり約24バイト
+    （順方向の行き先・重み・始点、逆方向の始点・辺ID）で済む。
+
+    属性:
+      nodes    : ID → 拠点名のリスト
+      index    : 拠点名 → ID
+      indptr   : 順方向CSRの行ポインタ（長さ V+1）
+      indices  : 順方向CSRの行き先ID（辺ID順、長さ E）
+      weights  : 辺の重み（float64、長さ E）
+      tails    : 辺の始点ID（長さ E）
+      rindptr  : 逆方向（CSC）の行ポインタ
+      rindices : 逆方向の始点ID
+      redges   : 逆方向の並び → 順方向の辺ID（重み・辺マスクを共有するため）
+    """
+
+    def __init__(self, nodes: list, tails: np.ndarray, heads: np.ndarray, weights: np.ndarray):
+        n = len(nodes)
+        id_dtype = np.int32 if n < 2 ** 31 else np.int64
+
+        # (始点, 終点) 順に並べ、重複辺は nx.DiGraph と同じく最後の重みを残す
+        # （重複を含む CSR は scipy.sparse.csgraph の SCC 計算が終わらないことがある）
+        tails   = np.asarray(tails, dtype=id_dtype)
+        heads   = np.asarray(heads, dtype=id_dtype)
+        order   = np.lexsort((np.arange(len(tails)), heads, tails))
+        tails, heads = tails[order], heads[order]
+        last = np.ones(len(tails), dtype=bool)
+        last[:-1] = (tails[1:] != tails[:-1]) | (heads[1:] != heads[:-1])
+        tails, heads = tails[last], heads[last]
+        weights = np.asarray(weights, dtype=np.float64)[order[last]]
+
+        self.nodes   = list(nodes)
+        self.index   = {name: i for i, name in enumerate(self.nodes)}
+        self.tails   = tails
+        self.indices = heads
+        self.weights = weights
+        self.indptr  = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tails, minlength=n), out=self.indptr[1:])
+
+        rorder        = np.argsort(heads, kind="stable")
+        self.redges   = rorder.astype(id_dtype if len(heads) < 2 ** 31 else np.int64)
+        self.rindices = tails[rorder]
+        self.rindptr  = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(heads, minlength=n), out=self.rindptr[1:])
+
+    # -----------------------------------------------------------------------
+    # 変換
+    # -----------------------------------------------------------------------
+    @classmethod
+    def from_edge_arrays(cls, tails, heads, weights=None, nodes=None) -> "CompactGraph":
+        """
+        始点・終点（拠点名の配列）と重みから構築する。
+
+        拠点IDは pd.factorize で一括採番し、辺を (始点, 終点) の順に並べたときの
+        初出順になる（nx.DiGraph.add_edge を順に呼んだ場合と同じ順序）。
+        同じ (始点, 終点) の辺が複数ある場合は nx.DiGraph と同じく最後の重みを採用する。
+        nodes を渡すと辺を持たない拠点もその順序で先に登録する。
+        """
+        tails = np.asarray(tails, dtype=object)
+        heads = np.asarray(heads, dtype=object)
+        weights = (np.ones(len(tails)) if weights is None
+                   else np.asarray(weights, dtype=np.float64))
+
+        interleaved = np.empty(2 * len(tails), dtype=object)
+        interleaved[0::2], interleaved[1::2] = tails, heads
+        if nodes is not None:
+            interleaved = np.concatenate([np.asarray(list(nodes), dtype=object), interleaved])
+        codes, uniques = pd.factorize(interleaved)
+        offset = len(interleaved) - 2 * len(tails)
+        return cls(list(uniques), codes[offset::2], codes[offset + 1::2], weights)
+
+    @classmethod
+    def from_networkx(cls, G: nx.DiGraph, weight: str = "weight", default: float = 1.0) -> "CompactGraph":
+        nodes = list(G.nodes())
+        index = {n: i for i, n in enumerate(nodes)}
+        m = G.number_of_edges()
+        tails   = np.fromiter((index[u] for u, _ in G.edges()), dtype=np.int64, count=m)
+        heads   = np.fromiter((index[v] for _, v in G.edges()), dtype=np.int64, count=m)
+        weights = np.fromiter((d.get(weight, default) for _, _, d in G.edges(data=True)),
+                              dtype=np.float64, count=m)
+        return cls(nodes, tails, heads, weights)
+
+    def to_networkx(self, weight: str = "weight") -> nx.DiGraph:
+        G = nx.DiGraph()
+        G.add_nodes_from(self.nodes)
+        names = self.nodes
+        G.add_weighted_edges_from(
+            ((names[u], names[v], w)
+             for u, v, w in zip(self.tails.tolist(), self.indices.tolist(), self.weights.tolist())),
+            weight=weight,
+        )
+        return G
+
+    def to_csr(self, edge_alive: np.ndarray | None = None):
+        """生存している辺だけの重み付き隣接行列（scipy.sparse.csr_array）を返す。"""
+        from scipy.sparse import csr_array
+
+        n = self.number_of_nodes()
+        if edge_alive is None:
+            return csr_array((self.weights, self.indices, self.indptr), shape=(n, n))
+        # 辺は始点順に並んでいるので、マスク後もそのまま CSR になる（COO 経由の並べ替えを省く）
+        keep   = np.flatnonzero(edge_alive)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.tails[keep], minlength=n), out=indptr[1:])
+        return csr_array((self.weights[keep], self.indices[keep], indptr), shape=(n, n))
+
+    # -----------------------------------------------------------------------
+    # 基本情報
+    # -----------------------------------------------------------------------
+    def number_of_nodes(self) -> int:
+        return len(self.nodes)
+
+    def number_of_edges(self) -> int:
+        return len(self.indices)
+
+    def ids(self, names) -> np.ndarray:
+        """拠点名の列をID配列に変換する（存在しない拠点は無視）。"""
+        return np.array([self.index[n] for n in names if n in self.index], dtype=np.int64)
+
+    def edge_ids(self, edges) -> np.ndarray:
+        """(始点, 終点) の列を辺IDの配列に変換する（存在しない辺は無視）。"""
+        found = []
+        for u, v in edges:
+            if u not in self.index or v not in self.index:
+                continue
+            s, e = self.indptr[self.index[u]], self.indptr[self.index[u] + 1]
+            pos = s + np.searchsorted(self.indices[s:e], self.index[v])
+            if pos < e and self.indices[pos] == self.index[v]:
+                found.append(pos)
+        return np.array(found, dtype=np.int64)
+
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.indptr, self.indices, self.weights, self.tails,
+                                      self.rindptr, self.rindices, self.redges))
+
+
+# ---------------------------------------------------------------------------
+# 障害マスク
+# ---------------------------------------------------------------------------
+def failure_masks(cg: CompactGraph, failed_nodes=None, failed_edges=None) -> tuple:
+    """
+    停止拠点・停止ルートから (node_alive, edge_alive) の真偽配列を作る。
+    停止拠点に接続する辺も edge_alive で False になる。
+    """
+    node_alive = np.ones(cg.number_of_nodes(), dtype=bool)
+    node_alive[cg.ids(failed_nodes or [])] = False
+    edge_alive = node_alive[cg.tails] & node_alive[cg.indices]
+    edge_alive[cg.edge_ids(failed_edges or [])] = False
+    return node_alive, edge_alive
+
+
+def _neighbors(indptr, targets, frontier, edge_ids=None, edge_alive=None) -> np.ndarray:
+    """frontier の全隣接先を一括取得する（生存辺のみ）。"""
+    starts = indptr[frontier]
+    counts = indptr[frontier + 1] - starts
+    total  = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=targets.dtype)
+    pos = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+    if edge_alive is not None:
+        eid = pos if edge_ids is None else edge_ids[pos]
+        pos = pos[edge_alive[eid]]
+    return targets[pos]
+
+
+# ---------------------------------------------------------------------------
+# 配列上のアルゴリズム
+# ---------------------------------------------------------------------------
+def reachable(
+    cg: CompactGraph,
+    sources: np.ndarray,
+    edge_alive: np.ndarray | None = None,
+    reverse: bool = False,
+    include_sources: bool = True,
+) -> np.ndarray:
+    """
+    sources から（reverse=True なら sources へ）到達可能な拠点の真偽配列。
+    フロンティア単位でまとめて展開する幅優先探索。計算量: O(V+E)
+
+    include_sources=False のときは1歩以上で到達できる拠点だけを True にする。
+    """
+    if reverse:
+        indptr, targets, edge_ids = cg.rindptr, cg.rindices, cg.redges
+    else:
+        indptr, targets, edge_ids = cg.indptr, cg.indices, None
+
+    seen = np.zeros(cg.number_of_nodes(), dtype=bool)
+    frontier = np.unique(np.asarray(sources, dtype=np.int64))
+    if include_sources:
+        seen[frontier] = True
+    else:
+        frontier = np.unique(_neighbors(indptr, targets, frontier, edge_ids, edge_alive))
+        seen[frontier] = True
+    while len(frontier):
+        nxt = _neighbors(indptr, targets, frontier, edge_ids, edge_alive)
+        nxt = np.unique(nxt[~seen[nxt]])
+        seen[nxt] = True
+        frontier = nxt
+    return seen
+
+
+def scc_labels(cg: CompactGraph, edge_alive: np.ndarray | None = None) -> np.ndarray:
+    """強連結成分のラベル配列（scipy.sparse.csgraph、計算量 O(V+E)）。"""
+    from scipy.sparse.csgraph import connected_components
+
+    _, labels = connected_components(cg.to_csr(edge_alive), directed=True, connection="strong")
+    return labels
+
+
+def shortest_path_lengths(
+    cg: CompactGraph,
+    sources: np.ndarray,
+    edge_alive: np.ndarray | None = None,
+) -> np.ndarray:
+    """sources 各拠点からの最短経路コスト行列（到達不能は inf）。"""
+    from scipy.sparse.csgraph import dijkstra
+
+    return dijkstra(cg.to_csr(edge_alive), directed=True, indices=np.asarray(sources))
+
+
+def _n_labels(labels: np.ndarray) -> int:
+    return int(labels.max()) + 1 if len(labels) else 0
+
+
+def isolation_masks(cg: CompactGraph, node_alive: np.ndarray, edge_alive: np.ndarray) -> tuple:
+    """(完全孤立, 補給不能, 配送不能) の真偽配列。simulate_failure の分類と同じ。"""
+    n = cg.number_of_nodes()
+    out_deg = np.bincount(cg.tails[edge_alive], minlength=n)
+    in_deg  = np.bincount(cg.indices[edge_alive], minlength=n)
+    complete  = node_alive & (in_deg == 0) & (out_deg == 0)
+    no_input  = node_alive & (in_deg == 0) & (out_deg > 0)
+    no_output = node_alive & (in_deg > 0) & (out_deg == 0)
+    return complete, no_input, no_output
+
+
+def cascade_failures(
+    cg: CompactGraph,
+    isolated: np.ndarray,
+    node_alive: np.ndarray,
+    edge_alive: np.ndarray,
+    labels: np.ndarray | None = None,
+) -> np.ndarray:
+    """
+    algorithms.find_cascade_failures と同じ判定（祖先が1つ以上あり、すべて孤立）を配列で行う。
+
+    生存かつ非孤立の拠点集合 N から1歩以上で届く集合 R を一括探索で求め、
+    各拠点の SCC について「N の拠点が2つ以上ある」または「SCC の外の N∪R から辺が入る」
+    なら補給あり、とする（自分自身だけを経由する閉路を補給元と数えないため）。
+    計算量: O(V+E)
+    """
+    if labels is None:
+        labels = scc_labels(cg, edge_alive)
+    n_comp = _n_labels(labels)
+
+    live     = node_alive & ~isolated
+    supplied = reachable(cg, np.flatnonzero(live), edge_alive, include_sources=False)
+    good     = live | supplied
+
+    t, h  = cg.tails[edge_alive], cg.indices[edge_alive]
+    cross = labels[t] != labels[h]
+    comp_fed   = np.zeros(n_comp, dtype=bool)
+    comp_fed[labels[h[cross & good[t]]]] = True
+    comp_inbound = np.zeros(n_comp, dtype=bool)
+    comp_inbound[labels[h[cross]]] = True
+
+    live_per_comp = np.bincount(labels[live], minlength=n_comp)
+    comp_size     = np.bincount(labels[node_alive], minlength=n_comp)
+
+    lab = labels
+    safe      = (live_per_comp[lab] >= 2) | comp_fed[lab]
+    has_anc   = (comp_size[lab] >= 2) | comp_inbound[lab]
+    return live & ~safe & has_anc
+
+
+@instrumented()
+def simulate_failure_compact(
+    cg: CompactGraph,
+    node_alive: np.ndarray,
+    edge_alive: np.ndarray,
+    labels_before: np.ndarray | None = None,
+) -> dict:
+    """
+    simulate_failure の配列版。拠点名のリストではなく真偽配列と件数を返す。
+
+    Returns:
+      {"isolated_complete", "isolated_no_input", "isolated_no_output",
+       "isolated", "cascade"} : 長さ V の真偽配列
+      "labels_after" : 障害後の SCC ラベル
+      "broken_sccs"  : 分裂した（生存2拠点以上の）元SCCの数
+    """
+    if labels_before is None:
+        labels_before = scc_labels(cg)
+    labels_after = scc_labels(cg, edge_alive)
+
+    complete, no_input, no_output = isolation_masks(cg, node_alive, edge_alive)
+    isolated = complete | no_input | no_output
+    cascade  = cascade_failures(cg, isolated, node_alive, edge_alive, labels_after)
+
+    # 元SCCごとに生存拠点が何種類の障害後SCCに分かれたか
+    before   = labels_before[node_alive]
+    after    = labels_after[node_alive]
+    n_before = _n_labels(labels_before)
+    n_after  = _n_labels(labels_after)
+    size_before = np.bincount(labels_before, minlength=n_before)
+    alive_per   = np.bincount(before, minlength=n_before)
+    pairs  = np.unique(before.astype(np.int64) * n_after + after)
+    groups = np.bincount(pairs // max(n_after, 1), minlength=n_before)
+    broken = int(((size_before >= 2) & (alive_per >= 2) & (groups >= 2)).sum())
+
+    return {
+        "isolated_complete":  complete,
+        "isolated_no_input":  no_input,
+        "isolated_no_output": no_output,
+        "isolated":           isolated,
+        "cascade":            cascade,
+        "labels_after":       labels_after,
+        "broken_sccs":        broken,
+    }
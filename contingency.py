@@ -0,0 +1,222 @@
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import networkx as nx
+import pandas as pd
+
+from algorithms import build_stable_scc_map, simulate_failure
+
+# ---------------------------------------------------------------------------
+# 定数: ランキング表の列
+# ---------------------------------------------------------------------------
+RANKING_COLUMNS = [
+    "障害対象", "種別", "孤立拠点数", "カスケード故障数",
+    "分裂した循環ルート数", "追加迂回コスト", "迂回不能ルート数",
+]
+DEMAND_RANKING_COLUMNS = ["影響需要量", "未達需要量", "需要加重追加コスト"]
+
+
+# ---------------------------------------------------------------------------
+# シナリオ生成: N-1 / N-2
+# ---------------------------------------------------------------------------
+def contingency_scenarios(
+    G: nx.DiGraph,
+    include_nodes: bool = True,
+    include_edges: bool = True,
+    order: int = 1,
+    sample: int | None = None,
+    seed: int = 0,
+) -> list:
+    """
+    一括障害評価の対象シナリオを列挙する。
+
+    各シナリオは (停止拠点のタプル, 停止ルートのタプル)。
+    order=1 で単一要素の停止（N-1）、order=2 で2要素の同時停止（N-2）。
+    N-2 で sample を指定すると全組合せを展開せずに重複なしで無作為抽出する。
+    """
+    elements = []
+    if include_nodes:
+        elements += [("node", n) for n in G.nodes()]
+    if include_edges:
+        elements += [("edge", e) for e in G.edges()]
+
+    if order == 1:
+        combos = [(el,) for el in elements]
+    elif sample is None:
+        combos = list(itertools.combinations(elements, 2))
+    else:
+        k     = len(elements)
+        total = k * (k - 1) // 2
+        rng   = random.Random(seed)
+        picked: set = set()
+        while len(picked) < min(sample, total):
+            i, j = rng.randrange(k), rng.randrange(k)
+            if i != j:
+                picked.add((min(i, j), max(i, j)))
+        combos = [(elements[i], elements[j]) for i, j in sorted(picked)]
+
+    return [
+        (
+            tuple(x for kind, x in combo if kind == "node"),
+            tuple(x for kind, x in combo if kind == "edge"),
+        )
+        for combo in combos
+    ]
+
+
+# ---------------------------------------------------------------------------
+# ワーカー: グラフは初期化時に1回だけ受け取る
+# ---------------------------------------------------------------------------
+_WORKER_STATE: dict = {}
+
+
+def _init_worker(G: nx.DiGraph, scc_index: tuple, baseline: tuple, distance_index=None,
+                 demand_impact=None) -> None:
+    """
+    プロセスプールの初期化関数。
+
+    fork 起動では initargs は pickle されずに親プロセスのメモリをそのまま共有し、
+    spawn 起動でもワーカーごとに1回だけ転送される（タスクごとには送らない）。
+    """
+    _WORKER_STATE["G"]         = G
+    _WORKER_STATE["scc_index"] = scc_index
+    _WORKER_STATE["baseline"]  = baseline
+    _WORKER_STATE["distance_index"] = distance_index
+    _WORKER_STATE["demand_impact"]  = demand_impact
+
+
+def _scenario_label(failed_nodes: tuple, failed_edges: tuple) -> tuple:
+    parts = [str(n) for n in failed_nodes] + [f"{u} → {v}" for u, v in failed_edges]
+    if failed_nodes and failed_edges:
+        kind = "拠点+ルート"
+    elif failed_nodes:
+        kind = "拠点"
+    else:
+        kind = "ルート"
+    return " ＋ ".join(parts), kind
+
+
+def _rerouting_delta(G: nx.DiGraph, G_after, failed_nodes: tuple, failed_edges: tuple,
+                     distance_index=None) -> tuple:
+    """停止ルートの両端が生存している場合の最短経路コスト増分（合計, 迂回不能数）。"""
+    total, unreachable = 0.0, 0
+    pairs = [(u, v) for u, v in failed_edges if u in G_after and v in G_after]
+    if distance_index is not None and pairs:
+        befores = distance_index.distances(pairs)
+        afters  = distance_index.distances(pairs, failed_nodes, failed_edges)
+        for before, after in zip(befores, afters):
+            if after == float("inf"):
+                unreachable += 1
+            else:
+                total += after - before
+        return total, unreachable
+    for u, v in pairs:
+        before = nx.shortest_path_length(G, u, v, weight="weight")
+        try:
+            after = nx.shortest_path_length(G_after, u, v, weight="weight")
+        except nx.NetworkXNoPath:
+            unreachable += 1
+            continue
+        total += after - before
+    return total, unreachable
+
+
+def _evaluate_chunk(scenarios: list) -> list:
+    G          = _WORKER_STATE["G"]
+    scc_index  = _WORKER_STATE["scc_index"]
+    base_isolated, base_cascade = _WORKER_STATE["baseline"]
+    demand_impact = _WORKER_STATE.get("demand_impact")
+
+    records = []
+    for failed_nodes, failed_edges in scenarios:
+        (G_after, isolated_all, _, _, _,
+         cascade_failures, _, _, broken_sccs) = simulate_failure(
+            G, failed_nodes=list(failed_nodes), failed_edges=list(failed_edges),
+            scc_index=scc_index,
+        )
+        delta, unreachable = _rerouting_delta(G, G_after, failed_nodes, failed_edges,
+                                              _WORKER_STATE.get("distance_index"))
+        label, kind = _scenario_label(failed_nodes, failed_edges)
+        record = {
+            "障害対象":            label,
+            "種別":                kind,
+            "孤立拠点数":          len(set(isolated_all) - base_isolated),
+            "カスケード故障数":    len(set(cascade_failures) - base_cascade),
+            "分裂した循環ルート数": len(broken_sccs),
+            "追加迂回コスト":      delta if failed_edges else float("nan"),
+            "迂回不能ルート数":    unreachable,
+        }
+        if demand_impact is not None:
+            score = demand_impact.evaluate(failed_nodes, failed_edges)
+            record.update({k: score[k] for k in DEMAND_RANKING_COLUMNS})
+        records.append(record)
+    return records
+
+
+# ---------------------------------------------------------------------------
+# 一括障害評価（並列・逐次出力）
+# ---------------------------------------------------------------------------
+def iter_contingency_sweep(
+    G: nx.DiGraph,
+    scenarios: list,
+    max_workers: int | None = None,
+    chunksize: int = 32,
+    distance_index=None,
+    demand_impact=None,
+):
+    """
+    シナリオ群を評価し、完了したチャンクごとに (records, 完了数, 経過秒) を返すジェネレータ。
+
+    孤立拠点数・カスケード故障数は障害なしの状態との差分（新たに発生した分）を数える。
+    max_workers=None で全コアを使用。1 のときはプロセスを起動せずに逐次実行する。
+    distance_index（G の DistanceIndex）を渡すと、追加迂回コストをインデックスへの問い合わせで求める。
+    demand_impact（G の DemandImpact）を渡すと、需要加重の列（DEMAND_RANKING_COLUMNS）も評価する。
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    scc_index   = build_stable_scc_map(G)
+    _, base_isolated, _, _, _, base_cascade, _, _, _ = simulate_failure(G, scc_index=scc_index)
+    baseline = (set(base_isolated), set(base_cascade))
+
+    chunks = [scenarios[i:i + chunksize] for i in range(0, len(scenarios), chunksize)]
+    start, done = time.perf_counter(), 0
+
+    if max_workers == 1 or len(chunks) <= 1:
+        _init_worker(G, scc_index, baseline, distance_index, demand_impact)
+        for chunk in chunks:
+            records = _evaluate_chunk(chunk)
+            done   += len(chunk)
+            yield records, done, time.perf_counter() - start
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(G, scc_index, baseline, distance_index, demand_impact),
+    ) as pool:
+        futures = {pool.submit(_evaluate_chunk, chunk): len(chunk) for chunk in chunks}
+        for fut in as_completed(futures):
+            done += futures[fut]
+            yield fut.result(), done, time.perf_counter() - start
+
+
+def rank_contingencies(records: list, by_demand: bool = False) -> pd.DataFrame:
+    """
+    評価結果を影響の大きい順（孤立+カスケード → 分裂 → 追加迂回コスト）に並べる。
+    by_demand=True のときは需要加重の列（未達需要量 → 需要加重追加コスト）を優先する。
+    """
+    columns = RANKING_COLUMNS + (DEMAND_RANKING_COLUMNS if records and "未達需要量" in records[0] else [])
+    if not records:
+        return pd.DataFrame(columns=columns)
+    df = pd.DataFrame(records, columns=columns)
+    df["_impact"] = df["孤立拠点数"] + df["カスケード故障数"]
+    keys = ["_impact", "分裂した循環ルート数", "迂回不能ルート数", "追加迂回コスト"]
+    if by_demand and "未達需要量" in df.columns:
+        keys = ["未達需要量", "需要加重追加コスト"] + keys
+    df = df.sort_values(
+        keys + ["障害対象"], ascending=[False] * len(keys) + [True], na_position="last", kind="stable",
+    ).drop(columns="_impact").reset_index(drop=True)
+    df.index += 1
+    return df
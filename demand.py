@@ -0,0 +1,326 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy.sparse.csgraph import dijkstra
+
+from compact_graph import CompactGraph, failure_masks
+from instrumentation import instrumented
+from scenarios import INGEST_CHUNKSIZE, _detect_format, iter_edge_chunks
+
+# ---------------------------------------------------------------------------
+# 設定
+# ---------------------------------------------------------------------------
+DEMAND_COLUMNS = ("origin", "destination", "volume")
+DEMAND_BATCH   = 64         # 1回の Dijkstra でまとめて処理する出発拠点数（距離行列 = 件数 × 拠点数）
+IMPACT_COLUMNS = ["出発拠点", "到着拠点", "需要量", "平常時コスト", "障害後コスト",
+                  "追加コスト", "需要加重追加コスト"]
+SCORE_KEYS     = ("影響OD数", "影響需要量", "未達需要量", "需要加重追加コスト")
+
+
+# ---------------------------------------------------------------------------
+# 需要表（OD表）の取り込み
+# ---------------------------------------------------------------------------
+def ingest_demand_chunks(chunks) -> tuple:
+    """
+    origin / destination / volume 列のチャンク列から、OD ペアごとに需要量を合計した表を作る。
+
+    拠点名はチャンクごとの一意値だけ前後の空白を除去して整数IDに採番し、volume は列ごとに
+    float64 へ変換する（変換できない値を含むチャンクだけ pd.to_numeric で不正値を欠損にする）。
+    拠点名の欠損、出発と到着が同じ拠点、数量の不正（空欄・数値でない・有限でない・負）の行は
+    取り込まずに件数を報告する。チャンクごとに整数IDの組で groupby して集約してから最後に
+    もう一度集約するので、数百万行でも保持するのは OD ペアの数だけになる。
+
+    Returns:
+      (demand, err, report)
+        demand : origin / destination / volume 列の DataFrame（OD ペアごとに1行）
+        report : {"総行数", "取り込み行数", "拠点名欠損で除外", "同一拠点で除外",
+                  "数量不正で除外", "不正行の例"}
+    """
+    report = {"総行数": 0, "取り込み行数": 0, "拠点名欠損で除外": 0, "同一拠点で除外": 0,
+              "数量不正で除外": 0, "不正行の例": []}
+    index: dict = {}
+    parts = []
+    offset = 0
+
+    def _encode(column: pd.Series) -> np.ndarray:
+        codes, uniques = pd.factorize(column)               # 欠損は -1
+        ids = np.fromiter((index.setdefault(s, len(index)) if s else -1
+                           for s in (str(u).strip() for u in uniques)),
+                          dtype=np.int64, count=len(uniques))
+        return np.append(ids, -1)[codes]
+
+    for df in chunks:
+        if any(c not in df.columns for c in DEMAND_COLUMNS):
+            return None, "'origin'・'destination'・'volume' 列が必要です。", None
+        n_rows = len(df)
+        row_no = np.arange(offset, offset + n_rows) + 2   # ヘッダー行を1行目とした行番号
+        offset += n_rows
+        report["総行数"] += n_rows
+
+        src, dst = _encode(df["origin"]), _encode(df["destination"])
+        missing = (src < 0) | (dst < 0)
+        same    = ~missing & (src == dst)
+        try:
+            volume = df["volume"].to_numpy(dtype=np.float64, na_value=np.nan)
+        except (TypeError, ValueError):
+            volume = pd.to_numeric(df["volume"], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        invalid = ~missing & ~same & ~(np.isfinite(volume) & (np.nan_to_num(volume, nan=-1.0) >= 0))
+
+        report["拠点名欠損で除外"] += int(missing.sum())
+        report["同一拠点で除外"]   += int(same.sum())
+        report["数量不正で除外"]   += int(invalid.sum())
+        if len(report["不正行の例"]) < 10:
+            bad_rows = row_no[missing | invalid]
+            report["不正行の例"] += bad_rows[:10 - len(report["不正行の例"])].tolist()
+
+        keep = ~(missing | same | invalid)
+        report["取り込み行数"] += int(keep.sum())
+        part = pd.DataFrame({"origin": src[keep], "destination": dst[keep], "volume": volume[keep]})
+        parts.append(part.groupby(["origin", "destination"], sort=False, as_index=False)["volume"].sum())
+
+    if report["取り込み行数"] == 0:
+        return None, "有効な需要が1行もありません。", report
+    demand = pd.concat(parts, ignore_index=True)
+    if len(parts) > 1:
+        demand = demand.groupby(["origin", "destination"], sort=False, as_index=False)["volume"].sum()
+    names = np.array(list(index), dtype=object)
+    demand["origin"]      = names[demand["origin"].to_numpy()]
+    demand["destination"] = names[demand["destination"].to_numpy()]
+    return demand, None, report
+
+
+@instrumented()
+def load_demand_from_file(source, fmt: str | None = None, chunksize: int = INGEST_CHUNKSIZE) -> tuple:
+    """
+    需要表（CSV / Parquet、パスまたはファイルオブジェクト）をチャンク単位で読み込む。
+    fmt を省略するとパスの拡張子から判定する。返り値は ingest_demand_chunks と同じ。
+    """
+    fmt = fmt or _detect_format(getattr(source, "name", source))
+    label = "Parquet" if fmt == "parquet" else "CSV"
+    try:
+        return ingest_demand_chunks(iter_edge_chunks(source, fmt, chunksize, columns=DEMAND_COLUMNS))
+    except ImportError as e:
+        return None, f"{label}読み込みエラー: pyarrow が必要です（{e}）", None
+    except Exception as e:
+        return None, f"{label}読み込みエラー: {e}", None
+
+
+# ---------------------------------------------------------------------------
+# ワーカー: 平常時の最短経路（出発拠点のまとまりごと）
+# ---------------------------------------------------------------------------
+_WORKER_STATE: dict = {}
+
+
+def _init_worker(csr, origins: np.ndarray, group_ptr: np.ndarray, dests: np.ndarray) -> None:
+    _WORKER_STATE["csr"]       = csr
+    _WORKER_STATE["origins"]   = origins
+    _WORKER_STATE["group_ptr"] = group_ptr
+    _WORKER_STATE["dests"]     = dests
+
+
+def _baseline_batch(bounds: tuple) -> tuple:
+    """
+    出発拠点 g0..g1-1 から1回の Dijkstra（複数起点）で全拠点への最短経路木を作り、
+    需要ペアの平常時コストと、需要のある到着拠点へ向かう木の部分（拠点・親拠点）を返す。
+    """
+    g0, g1 = bounds
+    origins, ptr, dests = _WORKER_STATE["origins"], _WORKER_STATE["group_ptr"], _WORKER_STATE["dests"]
+    dist, pred = dijkstra(_WORKER_STATE["csr"], directed=True, indices=origins[g0:g1],
+                          return_predecessors=True)
+    n = dist.shape[1]
+    rows = np.repeat(np.arange(g1 - g0), np.diff(ptr[g0:g1 + 1]))
+    d = dests[ptr[g0]:ptr[g1]]
+    base = dist[rows, d]
+
+    # 到着拠点から親をたどって印を付ける（全起点まとめて、木の深さの回数だけ繰り返す）
+    pred = pred.ravel()
+    used = np.zeros(pred.size, dtype=bool)
+    flat = rows[np.isfinite(base)] * n + d[np.isfinite(base)]
+    while len(flat):
+        flat = np.unique(flat[~used[flat]])
+        used[flat] = True
+        parent = pred[flat]
+        flat = (flat - flat % n + parent)[parent >= 0]
+    entries = np.flatnonzero(used)
+    return base, g0 + entries // n, entries % n, np.maximum(pred[entries], -1)
+
+
+# ---------------------------------------------------------------------------
+# 需要加重の障害影響
+# ---------------------------------------------------------------------------
+class DemandImpact:
+    """
+    OD 需要表に対する障害の影響（届かなくなる需要量・需要量で重み付けした追加コスト）を評価する。
+
+    需要を出発拠点ごとにまとめ、平常時の最短経路木を出発拠点 DEMAND_BATCH 件ごとに1回の
+    Dijkstra（scipy、複数起点）で作る。まとまりはプロセスプールで並列に処理する。
+    各出発拠点の木のうち需要のある到着拠点へ向かう部分だけを「拠点 → (出発拠点, 親拠点)」の
+    転置索引にしておくと、障害シナリオで経路が変わりうる出発拠点は
+      - 停止拠点 x: x を木の部分に含む出発拠点
+      - 停止ルート (u, v): v の親が u である出発拠点
+    に限られる（他の出発拠点の最短経路はすべて残るのでコストは変わらない）。
+    影響を受ける出発拠点だけを障害後のネットワークで Dijkstra し直すので、N-1 のように
+    多数のシナリオを評価しても1件あたりの計算は影響範囲の大きさで決まる。
+
+    ネットワークにない拠点を含む需要は評価対象外として件数・需要量を記録する。
+    平常時から届かない需要は「平常時未達」として別に集計し、障害の影響には含めない。
+    max_workers=None で全コアを使用。1 のときはプロセスを起動せずに逐次実行する。
+    """
+
+    @instrumented("DemandImpact")
+    def __init__(self, G: nx.DiGraph, demand: pd.DataFrame, weight: str = "weight",
+                 max_workers: int | None = None, batch: int = DEMAND_BATCH):
+        cg = CompactGraph.from_networkx(G, weight=weight)
+        self.cg = cg
+        self.batch = batch
+        n = cg.number_of_nodes()
+
+        names = pd.Index(cg.nodes)
+        o = names.get_indexer(demand["origin"])
+        d = names.get_indexer(demand["destination"])
+        volume = demand["volume"].to_numpy(dtype=np.float64)
+        known = (o >= 0) & (d >= 0)
+        self.unknown_pairs  = int((~known).sum())
+        self.unknown_volume = float(volume[~known].sum())
+
+        order = np.argsort(o[known], kind="stable")
+        o, d, volume = o[known][order], d[known][order], volume[known][order]
+        self.origins, starts = np.unique(o, return_index=True)
+        self.group_ptr = np.append(starts, len(o)).astype(np.int64)
+        self.dests  = d.astype(np.int64)
+        self.volume = volume
+
+        # 平常時の最短経路木（出発拠点 batch 件ごと）
+        csr = cg.to_csr()
+        bounds = [(g, min(g + batch, len(self.origins))) for g in range(0, len(self.origins), batch)]
+        max_workers = max_workers or os.cpu_count() or 1
+        if max_workers == 1 or len(bounds) <= 1:
+            _init_worker(csr, self.origins, self.group_ptr, self.dests)
+            results = [_baseline_batch(b) for b in bounds]
+        else:
+            with ProcessPoolExecutor(
+                max_workers=max_workers, initializer=_init_worker,
+                initargs=(csr, self.origins, self.group_ptr, self.dests),
+            ) as pool:
+                results = list(pool.map(_baseline_batch, bounds))
+
+        cat = lambda i, dt: np.concatenate([r[i] for r in results]) if results else np.empty(0, dtype=dt)
+        self.base = cat(0, np.float64)
+        self.served = np.isfinite(self.base)
+        groups, nodes, parents = cat(1, np.int64), cat(2, np.int64), cat(3, np.int64)
+
+        # 転置索引: 拠点 → その拠点を最短経路木の部分に含む (出発拠点のまとまり, 親拠点)
+        by_node = np.argsort(nodes, kind="stable")
+        self._use_group  = groups[by_node].astype(np.int32)
+        self._use_parent = parents[by_node].astype(np.int32)
+        self._use_ptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(nodes, minlength=n), out=self._use_ptr[1:])
+
+    # -- 集計 ---------------------------------------------------------------------
+    def summary(self) -> dict:
+        """需要表の概要（評価対象の OD ペア数・需要量、平常時未達、対象外）。"""
+        return {
+            "ODペア数":       len(self.base),
+            "総需要量":       float(self.volume.sum()),
+            "出発拠点数":     len(self.origins),
+            "平常時未達需要量": float(self.volume[~self.served].sum()),
+            "対象外ODペア数": self.unknown_pairs,
+            "対象外需要量":   self.unknown_volume,
+        }
+
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.origins, self.group_ptr, self.dests, self.volume, self.base,
+                                      self._use_group, self._use_parent, self._use_ptr))
+
+    # -- 内部 ---------------------------------------------------------------------
+    def _affected_groups(self, failed_nodes, failed_edges) -> np.ndarray:
+        index, ptr = self.cg.index, self._use_ptr
+        found = []
+        for x in failed_nodes:
+            if x in index:
+                found.append(self._use_group[ptr[index[x]]:ptr[index[x] + 1]])
+        for u, v in failed_edges:
+            if u in index and v in index:
+                lo, hi = ptr[index[v]], ptr[index[v] + 1]
+                found.append(self._use_group[lo:hi][self._use_parent[lo:hi] == index[u]])
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.int32)
+
+    def _rescore(self, failed_nodes=None, failed_edges=None) -> tuple:
+        """影響を受けうる需要ペアの番号と障害後コスト（到達不能は inf）。"""
+        failed_nodes = list(failed_nodes or [])
+        failed_edges = [tuple(e) for e in (failed_edges or [])]
+        groups = self._affected_groups(failed_nodes, failed_edges)
+        if len(groups) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+
+        _, edge_alive = failure_masks(self.cg, failed_nodes, failed_edges)
+        csr = self.cg.to_csr(edge_alive)
+        ptr = self.group_ptr
+        pairs, after = [], []
+        for i in range(0, len(groups), self.batch):
+            g = groups[i:i + self.batch]
+            dist = dijkstra(csr, directed=True, indices=self.origins[g])
+            counts = ptr[g + 1] - ptr[g]
+            rows = np.repeat(np.arange(len(g)), counts)
+            idx = np.repeat(ptr[g] - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            pairs.append(idx)
+            after.append(dist[rows, self.dests[idx]])
+        return np.concatenate(pairs), np.concatenate(after)
+
+    def _classify(self, failed_nodes, failed_edges) -> tuple:
+        """影響を受けた需要ペアの (番号, 障害後コスト, 未達の真偽, スコア)。"""
+        idx, after = self._rescore(failed_nodes, failed_edges)
+        before, volume = self.base[idx], self.volume[idx]
+        ok = self.served[idx]
+        lost = ok & ~np.isfinite(after)
+        rerouted = ok & np.isfinite(after) & (after > before) & ~np.isclose(after, before)
+        hit = lost | rerouted
+        score = {
+            "影響OD数":           int(hit.sum()),
+            "影響需要量":         float(volume[hit].sum()),
+            "未達需要量":         float(volume[lost].sum()),
+            "需要加重追加コスト": float((volume[rerouted] * (after[rerouted] - before[rerouted])).sum()),
+        }
+        return idx[hit], after[hit], lost[hit], score
+
+    # -- 公開API ------------------------------------------------------------------
+    def evaluate(self, failed_nodes=None, failed_edges=None) -> dict:
+        """
+        障害シナリオ1件の需要加重スコア（SCORE_KEYS）。
+          影響OD数・影響需要量 : コストが増えたか届かなくなった OD ペアの数・需要量
+          未達需要量           : 平常時は届いていて障害後に届かなくなる需要量
+          需要加重追加コスト   : 届く需要について Σ 需要量 ×（障害後コスト − 平常時コスト）
+        """
+        return self._classify(failed_nodes, failed_edges)[3]
+
+    def impact(self, failed_nodes=None, failed_edges=None, max_rows: int | None = None) -> tuple:
+        """
+        evaluate のスコアに加え、影響を受けた OD ペアの表（IMPACT_COLUMNS）を返す。
+        表は未達を先頭に、需要加重追加コストの大きい順（未達の追加コストは inf）。
+
+        Returns:
+          (df, score)
+        """
+        idx, after, lost, score = self._classify(failed_nodes, failed_edges)
+        before, volume = self.base[idx], self.volume[idx]
+        weighted = volume * (after - before)
+        order = np.lexsort((-np.where(lost, 0.0, weighted), ~lost))
+        if max_rows is not None:
+            order = order[:max_rows]
+        idx = idx[order]
+        names = self.cg.nodes
+        origin_of = np.repeat(self.origins, np.diff(self.group_ptr))
+        df = pd.DataFrame({
+            "出発拠点":           [names[i] for i in origin_of[idx]],
+            "到着拠点":           [names[i] for i in self.dests[idx]],
+            "需要量":             volume[order],
+            "平常時コスト":       before[order],
+            "障害後コスト":       after[order],
+            "追加コスト":         after[order] - before[order],
+            "需要加重追加コスト": weighted[order],
+        }, columns=IMPACT_COLUMNS)
+        df.index += 1
+        return df, score
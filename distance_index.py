@@ -0,0 +1,411 @@
+import math
+import time
+
+import networkx as nx
+import numpy as np
+from scipy.sparse import csr_array
+from scipy.sparse.csgraph import connected_components, dijkstra
+
+from compact_graph import CompactGraph
+from instrumentation import instrumented
+
+# ---------------------------------------------------------------------------
+# 設定
+# ---------------------------------------------------------------------------
+DISSECTION_LEAF  = 24      # 入れ子分割でこれ以下の拠点数になったら分割をやめる
+SHORTCUT_LIMIT   = 40      # ショートカット込みの辺数の上限（元の無向辺数に対する倍率）
+TRIANGLE_CHUNK   = 2_000_000   # 重みの設定で一度に処理する三角形の数（メモリの上限）
+INDEX_MIN_NODES  = 5_000   # この拠点数以上で画面・一括評価から距離インデックスを使う
+UNREACHABLE      = math.inf
+
+
+# ---------------------------------------------------------------------------
+# 入れ子分割による縮約順序（重みに依存しない）
+# ---------------------------------------------------------------------------
+def _nested_dissection(A: csr_array) -> np.ndarray:
+    """
+    無向の隣接行列 A の拠点を、幅優先探索の層で2分割する入れ子分割（George の方法）で並べる。
+    分割した2つの部分を先に、区切りの拠点（分離集合）を後に並べるので、
+    縮約時のショートカットは分離集合の中に閉じ込められる。返り値は順位 → 拠点ID。
+    """
+    order: list = []
+    # 再帰の代わりに、取り出す順が「手前の部分 → 奥の部分 → 分離集合」になるよう逆順に積む
+    work = [("part", np.arange(A.shape[0]))]
+    while work:
+        kind, idx = work.pop()
+        if kind == "sep":
+            order.extend(idx.tolist())
+            continue
+        if len(idx) <= DISSECTION_LEAF:
+            order.extend(idx.tolist())
+            continue
+        sub = A[idx][:, idx]
+        n_comp, labels = connected_components(sub, directed=False)
+        if n_comp > 1:
+            for c in range(n_comp - 1, -1, -1):
+                work.append(("part", idx[labels == c]))
+            continue
+
+        # 疑似周辺拠点（最も遠い拠点）から幅優先の層を作り、拠点数が半分になる層で切る
+        degree = np.diff(sub.indptr)
+        start = int(np.argmin(degree))
+        for _ in range(2):
+            level = dijkstra(sub, directed=False, unweighted=True, indices=start)
+            start = int(np.argmax(level))
+        level = level.astype(np.int64)
+        counts = np.bincount(level)
+        if len(counts) < 3:                      # 直径 2 以下（ほぼ完全グラフ）は分割しても得がない
+            order.extend(idx.tolist())
+            continue
+        cut = int(np.searchsorted(np.cumsum(counts), len(idx) / 2))
+        cut = min(max(cut, 1), len(counts) - 2)  # 手前・奥の両側を空にしない
+
+        # 分離集合は切る層のうち次の層に隣接する拠点だけ（残りは手前側に入れる）
+        rows = np.repeat(np.arange(len(idx)), degree)
+        beyond = np.zeros(len(idx), dtype=bool)
+        beyond[rows[level[sub.indices] == cut + 1]] = True
+        in_sep = (level == cut) & beyond
+        near = (level < cut) | ((level == cut) & ~in_sep)
+        far = level > cut
+        work.append(("sep", idx[in_sep]))
+        work.append(("part", idx[far]))
+        work.append(("part", idx[near]))
+    return np.array(order, dtype=np.int64)
+
+
+def _chordal_completion(n: int, lo: np.ndarray, hi: np.ndarray, limit: int) -> tuple:
+    """
+    順位の小さい拠点から縮約し、上位の隣接拠点どうしをすべて結ぶ（記号的な縮約）。
+    拠点 v の上位隣接は除去木の親（上位隣接のうち最下位）へ合流させれば足りる。
+
+    Returns:
+      (ptr, head, parent)  上向き隣接の CSR（行ごとに順位の昇順）と除去木の親（根は -1）
+    """
+    up = [set() for _ in range(n)]
+    for x, y in zip(lo.tolist(), hi.tolist()):
+        up[x].add(y)
+    parent = [-1] * n
+    total = 0
+    for v in range(n):
+        U = up[v]
+        total += len(U)
+        if total > limit:
+            raise ValueError(
+                "ショートカットが多すぎるため距離インデックスを作れません"
+                f"（元のルート数の {SHORTCUT_LIMIT} 倍を超過）。小さな分離集合で分割できる道路網向けの機能です。"
+            )
+        if U:
+            p = min(U)
+            parent[v] = p
+            up[p] |= U
+            up[p].discard(p)
+    ptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum([len(U) for U in up], out=ptr[1:])
+    head = np.fromiter((y for U in up for y in sorted(U)), dtype=np.int64, count=int(ptr[-1]))
+    return ptr, head, np.array(parent, dtype=np.int64)
+
+
+def _relax_min(weights: np.ndarray, mids: np.ndarray, target: np.ndarray,
+               cand: np.ndarray, via: np.ndarray) -> None:
+    """weights[target] = min(weights[target], cand) を経由拠点つきで一括適用する（target は重複可）。"""
+    order = np.lexsort((cand, target))
+    target, cand, via = target[order], cand[order], via[order]
+    first = np.ones(len(target), dtype=bool)
+    first[1:] = target[1:] != target[:-1]
+    target, cand, via = target[first], cand[first], via[first]
+    better = cand < weights[target]
+    weights[target[better]] = cand[better]
+    mids[target[better]] = via[better]
+
+
+# ---------------------------------------------------------------------------
+# 距離インデックス（カスタマイズ可能な縮約階層）
+# ---------------------------------------------------------------------------
+class DistanceIndex:
+    """
+    拠点間の最短経路コストを高速に答える距離インデックス（Customizable Contraction Hierarchies）。
+
+    1. 重みに依存しない縮約順序を入れ子分割で決め、その順に縮約したときに必要なショートカットを
+       すべて張る（witness 探索で省かないので、どんな重みに対しても正しい）
+    2. 重みの設定: 下位の拠点 v から順に、三角形 v-x-y の x→v→y を x→y のショートカットへ反映する。
+       除去木で同じ高さの拠点どうしは互いに影響しないので、高さごとに NumPy でまとめて処理する
+    3. 問い合わせ: 出発・到着拠点から除去木を根まで上りながら上向きの辺だけを緩和し、
+       共通の祖先で合流した最小値が距離になる（探索範囲は除去木の深さ程度で、拠点数に依らない）
+
+    停止した拠点・ルートは、展開するとそれを通るショートカット（重みを決めた経由拠点を記録しておき、
+    そこからたどる）だけを下位から計算し直した重みの差分として扱う。インデックス本体は書き換えないので、
+    キャッシュしたインデックスを複数のセッションで共有できる。停止以外の重み変更は作り直しになる。
+
+    分離集合の小さい分割が取れない（道路網らしくない）ネットワークではショートカットが爆発的に増えるため、
+    元のルート数の SHORTCUT_LIMIT 倍を超えた時点で ValueError を送出する。
+    """
+
+    @instrumented("DistanceIndex")
+    def __init__(self, G: nx.DiGraph, weight: str = "weight"):
+        start = time.perf_counter()
+        cg = CompactGraph.from_networkx(G, weight=weight)
+        n = cg.number_of_nodes()
+        tails, heads = cg.tails.astype(np.int64), cg.indices.astype(np.int64)
+        keep = tails != heads
+        tails, heads, weights = tails[keep], heads[keep], cg.weights[keep]
+
+        # 1. 縮約順序。以後の拠点IDはすべて順位（小さいほど先に縮約する）
+        A = csr_array((np.ones(len(tails)), (tails, heads)), shape=(n, n))
+        A = ((A + A.T) > 0).astype(np.float64).tocsr()
+        order = _nested_dissection(A)
+        rank = np.empty(n, dtype=np.int64)
+        rank[order] = np.arange(n)
+        self.nodes = [cg.nodes[i] for i in order.tolist()]
+        self.index = {name: r for r, name in enumerate(self.nodes)}
+        rt, rh = rank[tails], rank[heads]
+        lo, hi = np.minimum(rt, rh), np.maximum(rt, rh)
+
+        # 2. 弦グラフ（ショートカット込みの無向辺）。辺 e = (x, y), x < y に上向き x→y と下向き y→x の
+        #    2本の有向辺を持たせ、有向辺IDは上向き e・下向き E + e とする
+        ptr, head, parent = _chordal_completion(n, lo, hi, limit=SHORTCUT_LIMIT * max(A.nnz // 2, 1))
+        E = len(head)
+        row = np.repeat(np.arange(n, dtype=np.int64), np.diff(ptr))
+        self._n, self._E = n, E
+        self._ptr, self._head, self._row, self._parent = ptr, head, row, parent
+        self._keys = row * n + head
+
+        orig = np.full(2 * E, UNREACHABLE)
+        e = self._edge_ids(lo, hi)
+        np.minimum.at(orig, np.where(rt < rh, e, E + e), weights)
+        self._orig = orig
+
+        # 3. 重みの設定（除去木の高さごと）
+        w = orig.copy()
+        mid = np.full(2 * E, -1, dtype=np.int64)
+        height = np.zeros(n, dtype=np.int64)
+        for v, p in enumerate(parent.tolist()):
+            if p >= 0 and height[p] <= height[v]:
+                height[p] = height[v] + 1
+        degree = np.diff(ptr)
+        by_height = np.argsort(height, kind="stable")
+        bounds = np.searchsorted(height[by_height], np.arange(int(height.max()) + 2))
+        for h in range(len(bounds) - 1):
+            V = by_height[bounds[h]:bounds[h + 1]]
+            pairs = np.cumsum(degree[V] * (degree[V] - 1) // 2)
+            cuts = np.searchsorted(pairs, np.arange(TRIANGLE_CHUNK, pairs[-1] if len(pairs) else 0,
+                                                    TRIANGLE_CHUNK), side="right")
+            for chunk in np.split(V, cuts):
+                e1, e2, via = self._triangles(chunk)
+                if len(e1) == 0:
+                    continue
+                t = self._edge_ids(head[e1], head[e2])
+                _relax_min(w, mid, t, w[E + e1] + w[e2], via)        # x→v→y
+                _relax_min(w, mid, E + t, w[E + e2] + w[e1], via)    # y→v→x
+        self._w, self._mid = w, mid
+
+        # 4. ショートカットの依存関係（有向辺 → それを経由して重みが決まった有向辺）
+        arcs = np.flatnonzero(mid >= 0)
+        e = arcs % E
+        x, y, v = row[e], head[e], mid[arcs]
+        e_vx, e_vy = self._edge_ids(v, x), self._edge_ids(v, y)
+        upward = arcs < E
+        leg1 = np.where(upward, E + e_vx, E + e_vy)
+        leg2 = np.where(upward, e_vy, e_vx)
+        src = np.concatenate([leg1, leg2])
+        dep_order = np.argsort(src, kind="stable")
+        self._dep = np.concatenate([arcs, arcs])[dep_order]
+        self._dep_ptr = np.zeros(2 * E + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=2 * E), out=self._dep_ptr[1:])
+
+        # 下位隣接（拠点ごとの順位の小さい隣接拠点と辺ID）。停止時の再計算で三角形を列挙する
+        low_order = np.lexsort((row, head))
+        self._lnode, self._ledge = row[low_order], low_order
+        self._lptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(head, minlength=n), out=self._lptr[1:])
+
+        self.stats = {
+            "拠点数":           n,
+            "ルート数":         int(len(tails)),
+            "ショートカット数": int(E - A.nnz // 2),
+            "除去木の深さ":     int(height.max()) + 1 if n else 0,
+            "構築秒":           time.perf_counter() - start,
+            "サイズMiB":        self.nbytes / 2**20,
+        }
+        self._lists = None
+
+    # -- 内部 ---------------------------------------------------------------------
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["_lists"] = None       # 問い合わせ用の Python リストは読み込み後に作り直す
+        return state
+
+    def _edge_ids(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        return np.searchsorted(self._keys, x * self._n + y)
+
+    def _edge(self, x: int, y: int) -> int | None:
+        key = x * self._n + y
+        i = int(np.searchsorted(self._keys, key))
+        return i if i < self._E and self._keys[i] == key else None
+
+    def _triangles(self, V: np.ndarray) -> tuple:
+        """拠点群 V を最下位とする三角形 (v→x の辺, v→y の辺, v)（x < y）を列挙する。"""
+        d = self._ptr[V + 1] - self._ptr[V]
+        rows = np.repeat(np.arange(len(V)), d)
+        first = self._ptr[V][rows] + (np.arange(int(d.sum())) - np.repeat(np.cumsum(d) - d, d))
+        count = self._ptr[V + 1][rows] - first - 1          # first より後ろ（上位）の辺の数
+        e1 = np.repeat(first, count)
+        e2 = e1 + 1 + (np.arange(int(count.sum())) - np.repeat(np.cumsum(count) - count, count))
+        return e1, e2, np.repeat(V[rows], count)
+
+    def _prepare(self) -> tuple:
+        if self._lists is None:
+            self._lists = (self._ptr.tolist(), self._head.tolist(), self._parent.tolist(), self._w.tolist())
+        return self._lists
+
+    def _failures(self, failed_nodes=None, failed_edges=None) -> tuple:
+        """停止を反映した重み（_FailureMetric、停止がなければ None）と、停止拠点の順位の集合。"""
+        ptr = self._prepare()[0]
+        E, lptr, ledge = self._E, self._lptr, self._ledge
+        changed: dict = {}
+        down = set()
+        for u in failed_nodes or []:
+            r = self.index.get(u)
+            if r is None:
+                continue
+            down.add(r)
+            for e in list(range(ptr[r], ptr[r + 1])) + ledge[lptr[r]:lptr[r + 1]].tolist():
+                changed[e] = changed[E + e] = UNREACHABLE
+        for u, v in failed_edges or []:
+            ru, rv = self.index.get(u), self.index.get(v)
+            if ru is None or rv is None or ru == rv:
+                continue
+            e = self._edge(min(ru, rv), max(ru, rv))
+            if e is not None:
+                changed[e if ru < rv else E + e] = UNREACHABLE
+        seeds = [a for a in changed if self._mid[a] < 0 and self._orig[a] < UNREACHABLE]
+        if not seeds:
+            return None, down
+
+        # 元のルートの重みで決まっていた有向辺から、それを経由して重みが決まったショートカットへ広げる
+        invalid = np.zeros(2 * E, dtype=bool)
+        frontier = np.array(seeds, dtype=np.int64)
+        invalid[frontier] = True
+        while len(frontier):
+            starts, counts = self._dep_ptr[frontier], np.diff(self._dep_ptr)[frontier]
+            offsets = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+            nxt = self._dep[np.repeat(starts, counts) + offsets]
+            frontier = np.unique(nxt[~invalid[nxt]])
+            invalid[frontier] = True
+        return _FailureMetric(self, changed, set(np.flatnonzero(invalid).tolist())), down
+
+    def _search(self, r: int, offset: int, metric=None) -> dict:
+        """順位 r から除去木を根まで上り、上向き（offset=0）または下向き（offset=E）の辺で緩和する。"""
+        ptr, head, parent, w = self._prepare()
+        invalid = metric.invalid if metric is not None else ()
+        dist = {r: 0.0}
+        x = r
+        while x >= 0:
+            dx = dist.get(x)
+            if dx is not None:
+                for e in range(ptr[x], ptr[x + 1]):
+                    a = offset + e
+                    nd = dx + (metric.weight(a) if a in invalid else w[a])
+                    y = head[e]
+                    if nd < dist.get(y, UNREACHABLE):
+                        dist[y] = nd
+            x = parent[x]
+        return dist
+
+    # -- 公開API ------------------------------------------------------------------
+    @property
+    def nbytes(self) -> int:
+        """インデックス本体（NumPy 配列）のバイト数。"""
+        return sum(v.nbytes for v in self.__dict__.values() if isinstance(v, np.ndarray))
+
+    def distance(self, source, target, failed_nodes=None, failed_edges=None) -> float:
+        """source → target の最短経路コスト（到達不能・停止拠点は inf）。"""
+        return self.distances([(source, target)], failed_nodes, failed_edges)[0]
+
+    def distances(self, pairs, failed_nodes=None, failed_edges=None) -> list:
+        """
+        拠点ペアごとの最短経路コスト。停止の反映はペアの数によらず1回だけで、
+        同じ出発・到着拠点の探索結果は使い回す。
+        """
+        metric, down = self._failures(failed_nodes, failed_edges)
+        forward: dict = {}
+        backward: dict = {}
+        out = []
+        for s, t in pairs:
+            rs, rt = self.index.get(s), self.index.get(t)
+            if rs is None or rt is None or rs in down or rt in down:
+                out.append(UNREACHABLE)
+                continue
+            if rs == rt:
+                out.append(0.0)
+                continue
+            if rs not in forward:
+                forward[rs] = self._search(rs, 0, metric)
+            if rt not in backward:
+                backward[rt] = self._search(rt, self._E, metric)
+            df, db = forward[rs], backward[rt]
+            if len(db) < len(df):
+                df, db = db, df
+            out.append(min((d + db[x] for x, d in df.items() if x in db), default=UNREACHABLE))
+        return out
+
+    def distance_matrix(self, origins, destinations, failed_nodes=None, failed_edges=None) -> np.ndarray:
+        """起点 × 終点の最短経路コスト行列（len(origins) × len(destinations)）。"""
+        destinations = list(destinations)
+        pairs = [(o, d) for o in origins for d in destinations]
+        return np.array(self.distances(pairs, failed_nodes, failed_edges), dtype=np.float64).reshape(
+            -1, len(destinations))
+
+
+class _FailureMetric:
+    """
+    停止を反映したショートカット重み。展開すると停止要素を通るショートカット（invalid）だけを、
+    問い合わせで使われたときに計算し直して記憶する（経由する2辺は必ずより下位から始まる）。
+    """
+
+    def __init__(self, index: DistanceIndex, changed: dict, invalid: set):
+        self.index   = index
+        self.changed = changed
+        self.invalid = invalid
+        self.memo: dict = {}
+
+    def _legs(self, a: int) -> list:
+        """有向辺 a の三角形（経由する2本の有向辺の組）。"""
+        ix = self.index
+        E, lptr, lnode, ledge = ix._E, ix._lptr, ix._lnode, ix._ledge
+        e = a % E
+        x, y = int(ix._row[e]), int(ix._head[e])
+        # x・y に共通の下位隣接 v（どちらの行も順位の昇順なので二分探索で突き合わせる）
+        lx, ly = lnode[lptr[x]:lptr[x + 1]], lnode[lptr[y]:lptr[y + 1]]
+        pos = np.minimum(np.searchsorted(ly, lx), max(len(ly) - 1, 0))
+        px = np.flatnonzero(ly[pos] == lx) if len(ly) else pos[:0]
+        e_vx, e_vy = ledge[lptr[x] + px], ledge[lptr[y] + pos[px]]
+        if a < E:
+            return list(zip((E + e_vx).tolist(), e_vy.tolist()))     # x→v→y
+        return list(zip((E + e_vy).tolist(), e_vx.tolist()))         # y→v→x
+
+    def weight(self, a: int) -> float:
+        memo, invalid = self.memo, self.invalid
+        if a in memo:
+            return memo[a]
+        w = self.index._prepare()[3]
+        legs_of: dict = {}
+        stack = [a]
+        while stack:
+            b = stack[-1]
+            if b in memo:
+                stack.pop()
+                continue
+            if b not in legs_of:
+                legs_of[b] = self._legs(b)
+            todo = [c for pair in legs_of[b] for c in pair if c in invalid and c not in memo]
+            if todo:
+                stack.extend(todo)
+                continue
+            best = self.changed.get(b, self.index._orig[b])
+            for p, q in legs_of.pop(b):
+                c = (memo[p] if p in invalid else w[p]) + (memo[q] if q in invalid else w[q])
+                if c < best:
+                    best = c
+            memo[b] = float(best)
+            stack.pop()
+        return memo[a]
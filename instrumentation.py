@@ -0,0 +1,211 @@
+import cProfile
+import io
+import json
+import marshal
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+
+import pandas as pd
+
+# ---------------------------------------------------------------------------
+# 設定（環境変数で上書き可能）
+# ---------------------------------------------------------------------------
+SPAN_LOG_PATH     = os.environ.get("LOGISTICS_SPAN_LOG", "")   # 指定すると区間を JSON Lines で追記する
+SPAN_DETAIL_LIMIT = 500    # 1回の実行で個別に残す区間数（超えた分は処理名ごとの集計だけ）
+PROFILE_TOP       = 30     # プロファイル結果に載せる行数
+PROFILE_MODES     = ("cProfile", "tracemalloc")
+
+# Streamlit はセッションごとに別スレッドでスクリプトを実行するため、記録はスレッドごとに持つ。
+# 記録中でないスレッド・プロセス（並列評価のワーカーなど）では span は何もしない。
+_local = threading.local()
+
+
+# ---------------------------------------------------------------------------
+# 1回の実行分の記録
+# ---------------------------------------------------------------------------
+class RunRecorder:
+    """
+    1回の実行（Streamlit の再実行1回分・CLI の1コマンド分）の計測区間を集める。
+
+    memory=True のときは tracemalloc で区間ごとのピークメモリ（区間開始時からの増分）も測る。
+    入れ子の区間では子の開始時にピークを親へ引き継いでからリセットするため、親のピークは子を含む。
+    profile に "cProfile" / "tracemalloc" を指定すると、実行全体のプロファイルを1回分取る。
+    """
+
+    def __init__(self, memory: bool = False, profile: str | None = None, log_path: str | None = None):
+        self.run_id   = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{id(self) & 0xffff:04x}"
+        self.memory   = memory or profile == "tracemalloc"
+        self.profile  = profile
+        self.log_path = log_path or None
+        self.spans: list = []
+        self.totals: dict = {}      # 処理名 → [回数, 合計秒, 最大秒, 最大ピークMiB]
+        self.dropped  = 0
+        self.seconds  = None
+        self.profile_text  = None
+        self.profile_bytes = None
+        self._stack: list = []      # [処理名, 開始時刻, 開始時メモリ, 区間内の最大メモリ]
+        self._own_tracing = False
+        self._profiler = None
+        self._t0 = time.perf_counter()
+
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_tracing = True
+        if profile == "cProfile":
+            self._profiler = cProfile.Profile()
+            try:
+                self._profiler.enable()
+            except ValueError:      # 他のプロファイラが動作中
+                self._profiler = None
+
+    def _enter(self, name: str) -> None:
+        mem = 0
+        if self.memory:
+            mem, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                self._stack[-1][3] = max(self._stack[-1][3], peak)
+            tracemalloc.reset_peak()
+        self._stack.append([name, time.perf_counter(), mem, mem])
+
+    def _exit(self, attrs: dict) -> None:
+        name, start, mem, max_abs = self._stack.pop()
+        seconds = time.perf_counter() - start
+        peak_mib = None
+        if self.memory:
+            abs_peak = max(max_abs, tracemalloc.get_traced_memory()[1])
+            peak_mib = (abs_peak - mem) / 2**20
+            if self._stack:
+                self._stack[-1][3] = max(self._stack[-1][3], abs_peak)
+
+        total = self.totals.setdefault(name, [0, 0.0, 0.0, None])
+        total[0] += 1
+        total[1] += seconds
+        total[2] = max(total[2], seconds)
+        if peak_mib is not None:
+            total[3] = max(total[3] or 0.0, peak_mib)
+
+        if len(self.spans) < SPAN_DETAIL_LIMIT:
+            self.spans.append({
+                "処理": name, "親": self._stack[-1][0] if self._stack else None,
+                "階層": len(self._stack), "開始秒": start - self._t0,
+                "秒": seconds, "ピークMiB": peak_mib, **attrs,
+            })
+        else:
+            self.dropped += 1
+
+    def finish(self) -> None:
+        """計測を終える（プロファイル結果の整形・JSON Lines の書き出し・tracemalloc の停止）。"""
+        if self.seconds is not None:
+            return
+        self.seconds = time.perf_counter() - self._t0
+
+        if self._profiler is not None:
+            self._profiler.disable()
+            buf = io.StringIO()
+            pstats.Stats(self._profiler, stream=buf).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            self.profile_text = buf.getvalue()
+            self._profiler.create_stats()
+            self.profile_bytes = marshal.dumps(self._profiler.stats)   # dump_stats と同じ形式（.prof）
+        if self.profile == "tracemalloc" and tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+                tracemalloc.Filter(False, tracemalloc.__file__),
+            ))
+            lines = [f"{s.size / 2**20:10.2f} MiB {s.count:>9,} 件  {s.traceback}"
+                     for s in snapshot.statistics("lineno")[:PROFILE_TOP]]
+            self.profile_text = "実行終了時点で確保されているメモリ（行ごと・上位）\n" + "\n".join(lines)
+        if self._own_tracing:
+            tracemalloc.stop()
+
+        if self.log_path:
+            try:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    for record in sorted(self.spans, key=lambda r: r["開始秒"]):
+                        f.write(json.dumps({"実行ID": self.run_id, **record}, ensure_ascii=False, default=str) + "\n")
+                    f.write(json.dumps({
+                        "実行ID": self.run_id, "処理": "(実行全体)", "秒": self.seconds,
+                        "区間数": sum(t[0] for t in self.totals.values()), "省略した区間数": self.dropped,
+                    }, ensure_ascii=False) + "\n")
+            except OSError:
+                pass    # 書き出しの失敗で分析を止めない
+
+    def summary(self) -> pd.DataFrame:
+        """処理名ごとの集計（合計時間の長い順）。割合は実行全体の時間に対する合計時間（入れ子は重複して数える）。"""
+        total = self.seconds or (time.perf_counter() - self._t0)
+        rows = [
+            {"処理": name, "回数": c, "合計秒": s, "最大秒": m, "最大ピークMiB": p,
+             "割合": s / total if total > 0 else 0.0}
+            for name, (c, s, m, p) in self.totals.items()
+        ]
+        df = pd.DataFrame(rows, columns=["処理", "回数", "合計秒", "最大秒", "最大ピークMiB", "割合"])
+        if not self.memory:
+            df = df.drop(columns="最大ピークMiB")
+        return df.sort_values("合計秒", ascending=False).reset_index(drop=True)
+
+    def timeline(self) -> pd.DataFrame:
+        """個別の区間を開始順に並べた表（処理名は階層に応じて字下げ）。"""
+        records = sorted(self.spans, key=lambda r: r["開始秒"])
+        df = pd.DataFrame([{**r, "処理": "　" * r["階層"] + r["処理"]} for r in records])
+        if df.empty:
+            return df
+        drop = ["親", "階層"] + ([] if self.memory else ["ピークMiB"])
+        return df.drop(columns=[c for c in drop if c in df.columns])
+
+
+# ---------------------------------------------------------------------------
+# 公開API
+# ---------------------------------------------------------------------------
+def start_run(memory: bool = False, profile: str | None = None, log_path: str | None = None) -> RunRecorder:
+    """
+    現在のスレッドで計測を始める。前回の実行が途中で打ち切られていた場合（st.rerun など）は
+    その記録をここで締める。
+    """
+    previous = getattr(_local, "recorder", None)
+    if previous is not None:
+        previous.finish()
+    _local.recorder = RunRecorder(memory=memory, profile=profile, log_path=log_path)
+    return _local.recorder
+
+
+def finish_run() -> RunRecorder | None:
+    """現在のスレッドの計測を終えて記録を返す（計測中でなければ None）。"""
+    recorder = getattr(_local, "recorder", None)
+    _local.recorder = None
+    if recorder is not None:
+        recorder.finish()
+    return recorder
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """処理区間の時間（と設定に応じてピークメモリ）を記録する。計測中でなければ何もしない。"""
+    recorder = getattr(_local, "recorder", None)
+    if recorder is None:
+        yield
+        return
+    recorder._enter(name)
+    try:
+        yield
+    finally:
+        recorder._exit(attrs)
+
+
+def instrumented(name: str | None = None):
+    """関数全体を1つの区間として記録するデコレータ（区間名の既定は関数名）。"""
+    def decorate(fn):
+        label = name or fn.__name__
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if getattr(_local, "recorder", None) is None:
+                return fn(*args, **kwargs)
+            with span(label):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
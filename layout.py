@@ -0,0 +1,188 @@
+import networkx as nx
+import numpy as np
+
+from analysis_cache import cache_key, get_cache
+from instrumentation import span
+
+# ---------------------------------------------------------------------------
+# 設定
+# ---------------------------------------------------------------------------
+LAYOUT_SPRING_LIMIT = 500    # これ以下は nx.spring_layout、超えたら格子近似の力学配置
+LAYOUT_GRID_CELLS   = 16     # 格子近似の1辺のセル数（反発力の計算は V × セル数²）
+LAYOUT_ITERATIONS   = 100
+LAYOUT_WARM_ITERS   = 15     # 前回の配置から始める場合の反復回数
+LAYOUT_WARM_OVERLAP = 0.5    # 前回の配置と共通する拠点がこの割合以上なら warm start
+GEO_KEYS            = (("lon", "lat"), ("x", "y"))
+
+
+# ---------------------------------------------------------------------------
+# 地理座標レイアウト
+# ---------------------------------------------------------------------------
+def geographic_layout(G: nx.DiGraph) -> dict | None:
+    """
+    全拠点が経緯度（lon/lat）または平面座標（x/y）属性を持つ場合、その座標で配置する。
+    経緯度は平均緯度で横方向を縮める正距円筒図法で投影し、[-1, 1] に正規化する。
+    座標のない拠点があれば None。
+    """
+    for kx, ky in GEO_KEYS:
+        data = G.nodes(data=True)
+        if len(G) == 0 or not all(kx in d and ky in d for _, d in data):
+            continue
+        nodes = list(G.nodes())
+        xy = np.array([[float(G.nodes[n][kx]), float(G.nodes[n][ky])] for n in nodes])
+        if kx == "lon":
+            xy[:, 0] *= np.cos(np.radians(xy[:, 1].mean()))
+        return dict(zip(nodes, _normalize(xy)))
+    return None
+
+
+def _normalize(xy: np.ndarray) -> np.ndarray:
+    xy = xy - xy.mean(axis=0)
+    scale = np.abs(xy).max()
+    return xy / scale if scale > 0 else xy
+
+
+# ---------------------------------------------------------------------------
+# 格子近似（Barnes–Hut 型）の力学配置
+# ---------------------------------------------------------------------------
+def grid_force_layout(
+    G: nx.DiGraph,
+    seed: int = 42,
+    init: dict | None = None,
+    iterations: int = LAYOUT_ITERATIONS,
+    cells: int = LAYOUT_GRID_CELLS,
+) -> dict:
+    """
+    Fruchterman–Reingold 型の力学配置を NumPy で一括計算する大規模グラフ向けレイアウト。
+
+    反発力は拠点どうしの総当たり（O(V²)）ではなく、平面を cells×cells の格子に分け、
+    各セルの重心と質量（拠点数）で近似する（Barnes–Hut の1階層版）。
+    引力は辺ごとに一括計算する。1反復あたり O(V × cells² + E)。
+    init を渡すとその座標から開始する（warm start）。
+    """
+    nodes = list(G.nodes())
+    n = len(nodes)
+    if n == 0:
+        return {}
+    index = {v: i for i, v in enumerate(nodes)}
+    rng = np.random.default_rng(seed)
+
+    pos = rng.uniform(-1, 1, size=(n, 2))
+    if init:
+        for v, p in init.items():
+            i = index.get(v)
+            if i is not None:
+                pos[i] = p
+
+    ed = np.array([(index[u], index[v]) for u, v in G.edges() if u != v], dtype=np.int64)
+    src, dst = (ed[:, 0], ed[:, 1]) if len(ed) else (np.empty(0, int), np.empty(0, int))
+
+    k = 2.0 / np.sqrt(n)                  # [-1,1]² に n 拠点を並べたときの理想距離
+    temperature = k if init else 0.5       # warm start では理想距離程度しか動かさない
+    cooling = temperature / (iterations + 1)
+
+    for _ in range(iterations):
+        lo = pos.min(axis=0)
+        extent = np.maximum(pos.max(axis=0) - lo, 1e-9)
+        cell = np.minimum(((pos - lo) / extent * cells).astype(np.int64), cells - 1)
+        cid = cell[:, 0] * cells + cell[:, 1]
+        mass = np.bincount(cid, minlength=cells * cells).astype(float)
+        occupied = np.flatnonzero(mass)
+        cx = np.bincount(cid, weights=pos[:, 0], minlength=cells * cells)[occupied] / mass[occupied]
+        cy = np.bincount(cid, weights=pos[:, 1], minlength=cells * cells)[occupied] / mass[occupied]
+        m  = mass[occupied]
+
+        disp = np.zeros_like(pos)
+        for start in range(0, n, 20000):          # メモリを抑えるため拠点をまとめて処理
+            p  = pos[start:start + 20000]
+            dx = p[:, 0:1] - cx[None, :]
+            dy = p[:, 1:2] - cy[None, :]
+            d2 = np.maximum(dx * dx + dy * dy, 1e-4 * k * k)
+            f  = k * k * m[None, :] / d2
+            disp[start:start + 20000, 0] = (f * dx).sum(axis=1)
+            disp[start:start + 20000, 1] = (f * dy).sum(axis=1)
+
+        if len(src):
+            delta = pos[dst] - pos[src]
+            dist = np.sqrt((delta ** 2).sum(axis=1)) + 1e-9
+            pull = (dist / k)[:, None] * delta
+            for axis in (0, 1):
+                disp[:, axis] += np.bincount(src, weights=pull[:, axis], minlength=n)
+                disp[:, axis] -= np.bincount(dst, weights=pull[:, axis], minlength=n)
+
+        # 中心への引力: 孤立拠点が外へ飛ばされて全体が縮んで見えるのを防ぐ
+        # （係数 k²·n は半径1付近で全体からの反発力とつり合う大きさ）
+        disp -= k * k * n * pos
+
+        length = np.sqrt((disp ** 2).sum(axis=1)) + 1e-9
+        pos += disp / length[:, None] * np.minimum(length, temperature)[:, None]
+        temperature -= cooling
+
+    return dict(zip(nodes, _normalize(pos)))
+
+
+# ---------------------------------------------------------------------------
+# レイアウトサービス（キャッシュ + warm start）
+# ---------------------------------------------------------------------------
+def _warm_start_positions(G: nx.DiGraph, prev: dict | None) -> dict | None:
+    """直前に表示した配置 prev と十分に重なる場合、その座標を初期値として返す。"""
+    if not prev or len(G) == 0:
+        return None
+    shared = sum(1 for v in G.nodes() if v in prev)
+    if shared < LAYOUT_WARM_OVERLAP * len(G):
+        return None
+
+    init = {v: prev[v] for v in G.nodes() if v in prev}
+    # 新しい拠点は配置済みの隣接拠点の重心に置く（なければ乱数のまま）
+    for v in G.nodes():
+        if v in init:
+            continue
+        placed = [init[u] for u in nx.all_neighbors(G, v) if u in init]
+        if placed:
+            init[v] = np.mean(placed, axis=0)
+    return init
+
+
+def compute_layout(G: nx.DiGraph, seed: int = 42, init: dict | None = None) -> dict:
+    """
+    グラフの規模に応じて配置方法を選ぶ。
+    座標属性あり → 地理配置 / LAYOUT_SPRING_LIMIT 以下 → nx.spring_layout / それ以上 → 格子近似。
+    """
+    with span("geographic_layout"):
+        geo = geographic_layout(G)
+    if geo is not None:
+        return geo
+    n = len(G)
+    if n <= LAYOUT_SPRING_LIMIT:
+        k = 1.5 / max(n ** 0.5, 1)
+        with span("spring_layout", 拠点数=n, 前回配置を利用=bool(init)):
+            if init:
+                return nx.spring_layout(G, seed=seed, k=k, pos=init, iterations=LAYOUT_WARM_ITERS)
+            return nx.spring_layout(G, seed=seed, k=k)
+    with span("grid_force_layout", 拠点数=n, 前回配置を利用=bool(init)):
+        if init:
+            return grid_force_layout(G, seed=seed, init=init, iterations=LAYOUT_WARM_ITERS)
+        return grid_force_layout(G, seed=seed)
+
+
+def get_layout(G: nx.DiGraph, seed: int = 42, previous: dict | None = None) -> dict:
+    """
+    グラフの内容ハッシュごとにキャッシュした配置を返す。
+
+    キャッシュにない場合、呼び出し側が直前に表示した配置 previous と拠点の大半が共通していれば
+    その座標から warm start し、少し変わっただけのグラフで配置が大きく動かないようにする。
+    warm start の結果は previous に依存するためキャッシュには保存しない（キャッシュの配置は
+    グラフと seed だけで決まる）。previous は利用者ごと（Streamlit ではセッションごと）に持つこと。
+    障害後のグラフ（G_after）には G の配置をそのまま使うこと（拠点の位置が揃う）。
+    """
+    cache = get_cache()
+    key = cache_key("layout", G, seed)
+    found, pos = cache.get(key)
+    if found:
+        return pos
+    init = _warm_start_positions(G, previous)
+    if init:
+        return compute_layout(G, seed=seed, init=init)
+    pos = compute_layout(G, seed=seed)
+    cache.put(key, pos)
+    return pos
@@ -6,23 +6,157 @@ import streamlit as st
 import pandas as pd
 import io
 import os
+import time
 import warnings
 import random as _rnd
 import matplotlib
 
 from algorithms import (
-    find_strong_bridges,
-    simulate_failure,         # 分析モード（後半）の障害シミュレーションで必要
     analyze_rerouting_cost,   # 分析モード（後半）の迂回コスト計算で必要
+    analyze_rerouting_impact, # 障害シミュレーションのネットワーク全体影響で必要
     build_stable_scc_map,     # 分析モード（後半）のMatplotlib描画で必要
     _natural_key
 )
-from scenarios import DEMO_SCENARIOS  # ← 【追加】サイドバーのデモ読み込みで必須
+from analysis_cache import (
+    cached_strong_bridges,       # 分析結果はグラフの内容ハッシュでキャッシュする
+    cached_articulation_points,
+    cached_scc_map,
+    cached_distance_index,       # 大規模グラフの迂回コストは距離インデックスへ問い合わせる
+    cached_demand_impact,        # 需要表（OD表）に対する平常時の最短経路木
+    cached_reachable,            # ルート脆弱性プロファイルの到着拠点の候補
+    demand_fingerprint,
+    graph_fingerprint,
+)
+from demand import load_demand_from_file  # 障害シミュレーション・一括障害評価の需要加重スコア
+from distance_index import INDEX_MIN_NODES
+from compact_graph import CompactGraph
+from montecarlo import (
+    failure_probability_arrays,  # モンテカルロ障害評価で必要
+    iter_monte_carlo,
+    summarize_monte_carlo,
+)
+from contingency import (
+    contingency_scenarios,    # 一括障害評価モードのシナリオ列挙で必要
+    iter_contingency_sweep,
+    rank_contingencies,
+)
+from instrumentation import (
+    PROFILE_MODES,            # サイドバーの診断パネル（処理区間ごとの時間・メモリ）
+    SPAN_LOG_PATH,
+    finish_run,
+    span,
+    start_run,
+)
+from layout import get_layout  # グラフのハッシュごとにキャッシュする配置
+from maxflow import (
+    DEFAULT_CAPACITY,
+    FlowNetwork,              # 容量分析モードの最大流量・最小カット
+    iter_capacity_sweep,
+    rank_capacity_losses,
+)
+from redundancy import (
+    candidates_from_graph,    # 強橋分析モードの冗長化プラン（追加ルートの提案）
+    distance_candidates,
+    plan_redundancy,
+)
+from scenarios import (
+    DEMO_SCENARIOS,           # ← 【追加】サイドバーのデモ読み込みで必須
+    load_graph_from_file,     # CSV / Parquet アップロードの読み込みで必要
+)
+from synthetic import generate_network, min_nodes  # ランダム生成（ハブ＆スポーク・地理的近傍・幹線回廊・一様ランダム）
+from route_profile import (
+    NO_DETOUR,                    # 迂回できない区間の表示
+    route_vulnerability_profile,  # 最短経路の全区間の迂回コストを一括計算
+)
+from supply_index import SupplyDependencyIndex  # 供給依存分析モードの支配木インデックス
+from whatif import WhatIfSession  # 障害シミュレーションの停止対象の切り替えを差分で反映する
 from visualization import (
     draw_network_pyvis,
+    setup_japanese_font,
+    show_condensed_network,   # 描画上限超え: 強連結成分ごとの縮約表示
     draw_network_matplotlib   # 分析モード（後半）の静止画描画で必要
 )
 
+# ---------------------------------------------------------------------------
+# ページ設定（Streamlit の最初の呼び出しである必要がある）
+# ---------------------------------------------------------------------------
+st.set_page_config(page_title="物流ネットワーク障害シミュレーター", layout="wide")
+setup_japanese_font()
+
+# ---------------------------------------------------------------------------
+# 計測: 再実行1回分の処理区間を記録する（設定と結果はサイドバー最下部の診断パネル）
+# ---------------------------------------------------------------------------
+# パネルのウィジェットは最後に描画するため、前回の実行で保存された値をここで読む
+run_recorder = start_run(
+    memory=st.session_state.get("diag_memory", False),
+    profile=st.session_state.get("diag_profile") if st.session_state.get("diag_profile_run") else None,
+    log_path=SPAN_LOG_PATH or (st.session_state.get("diag_log_path") if st.session_state.get("diag_log") else None),
+)
+
+
+# ---------------------------------------------------------------------------
+# CSV / Parquet 読み込み（キャッシュ付き）
+# ---------------------------------------------------------------------------
+@st.cache_data(show_spinner="ルート表を読み込み中...")
+def load_graph_from_csv(file_bytes: bytes, fmt: str = "csv") -> tuple:
+    """アップロードされたルート表を読み込む。返り値は (G, err, report)。"""
+    return load_graph_from_file(io.BytesIO(file_bytes), fmt=fmt)
+
+
+@st.cache_data(show_spinner="需要表を読み込み中...")
+def load_demand_from_upload(file_bytes: bytes, fmt: str = "csv") -> tuple:
+    """
+    アップロードされた需要表（OD表）を読み込む。返り値は (demand, err, report, fingerprint)。
+    需要表のハッシュ（fingerprint）はここで1回だけ計算し、再実行のたびに全行を読み直さない。
+    """
+    demand, err, report = load_demand_from_file(io.BytesIO(file_bytes), fmt=fmt)
+    fingerprint = demand_fingerprint(demand) if demand is not None else None
+    return demand, err, report, fingerprint
+
+
+def demand_uploader(key: str) -> tuple:
+    """サイドバーの需要表アップロード欄。読み込めた (需要表, ハッシュ) か (None, None) を返す。"""
+    demand_file = st.sidebar.file_uploader(
+        "需要表（任意: origin / destination / volume）", type=["csv", "parquet"], key=key,
+        help="拠点間の需要量。指定すると届かなくなる需要量・需要量で重み付けした追加コストも評価します。",
+    )
+    if demand_file is None:
+        return None, None
+    demand_fmt = "parquet" if demand_file.name.lower().endswith((".parquet", ".pq")) else "csv"
+    demand, demand_err, demand_report, fingerprint = load_demand_from_upload(
+        demand_file.getvalue(), demand_fmt,
+    )
+    if demand_err:
+        st.sidebar.error(demand_err)
+        return None, None
+    st.sidebar.caption(f"需要表: {len(demand):,} ODペア / 総需要量 {demand['volume'].sum():,.0f}")
+    n_skipped = (demand_report["拠点名欠損で除外"] + demand_report["同一拠点で除外"]
+                 + demand_report["数量不正で除外"])
+    if n_skipped:
+        st.sidebar.warning(
+            f"⚠️ {demand_report['総行数']}行中 拠点名欠損: {demand_report['拠点名欠損で除外']}行 / "
+            f"同一拠点: {demand_report['同一拠点で除外']}行 / 数量不正: {demand_report['数量不正で除外']}行 を除外"
+        )
+    return demand, fingerprint
+
+
+# ---------------------------------------------------------------------------
+# 配置（warm start の元はセッションごと）
+# ---------------------------------------------------------------------------
+def session_layout(G: nx.DiGraph) -> dict:
+    """
+    get_layout の呼び出し口。warm start に使う直前の配置はセッションごとに持ち、
+    他の利用者が表示したグラフの配置が混ざらないようにする。
+    """
+    fingerprint = graph_fingerprint(G)
+    saved = st.session_state.get("_layout")
+    if saved and saved[0] == fingerprint:
+        return saved[1]
+    pos = get_layout(G, previous=saved[1] if saved else None)
+    st.session_state["_layout"] = (fingerprint, pos)
+    return pos
+
+
 # ===========================================================================
 # ページ本体
 # ===========================================================================
@@ -57,6 +191,10 @@ with st.expander("📖 詳細説明・用語定義・想定ユースケース（
 **カスケード故障（Cascade Failure）**
 : 直接障害を受けていないノードが、補給元の孤立によって連鎖的に到達不能になる現象。
 入次数の確認だけでは見逃すため、祖先ノードの到達可能性を追跡して検出する。
+
+**強連結切断点（Strong Articulation Point）**
+: その拠点を除去すると所属する強連結成分が複数に分裂する頂点。
+物流では「この拠点が止まると循環配送が崩れる」重要拠点に相当する。
         """)
 
     with col_r:
@@ -72,11 +210,20 @@ with st.expander("📖 詳細説明・用語定義・想定ユースケース（
 #### ⚙️ アルゴリズム計算量
 | 処理 | 計算量 |
 |------|--------|
-| 強橋検出 | O(E × (V+E)) |
-| カスケード故障検出 | O(V × (V+E)) |
-| 迂回コスト分析 | O(V × E) |
+| 強橋検出（支配木） | O(E log V) |
+| 強連結切断点検出（支配木） | O(E log V) |
+| カスケード故障検出 | O(V+E) |
+| 迂回コスト分析 | O(V × E)、大規模グラフは距離インデックスで1問い合わせ数 ms |
+| 距離インデックス（CCH） | 構築 入れ子分割 + 三角形数、停止は影響するショートカットだけ再計算 |
+| 全体迂回影響（CSR一括） | O(影響起点数 × E log V) |
+| 需要加重の障害影響（OD表） | 平常時 O(出発拠点数 × E log V)、障害ごとに経路が通る出発拠点だけ再計算 |
+| モンテカルロ障害評価 | O(試行数 × (V+E)) |
+| 容量分析（最大流量・Dinic 法） | O(V² × E)、障害シナリオは基準の流れから差分計算 |
+| 供給依存インデックス（支配木） | 構築 O(E log V)、依存判定 O(1)・途絶拠点の列挙 O(部分木) |
+| ルート脆弱性プロファイル（置換経路） | 最短経路木 2 回 + 区間ごとに迂回部分だけの局所探索 |
+| 冗長化プラン（追加ルートの提案） | 候補1本の評価は支配木・到達集合の参照のみ、採用ごとに変化した成分だけ再計算 |
 
-描画: ≤80ノード → Matplotlib静止画 / 81〜200 → PyVisインタラクティブ
+描画: ≤800ノード → Matplotlib静止画（≤200はPyVisインタラクティブも選択可） / 800超 → 強連結成分の縮約表示
         """)
 
 st.divider()
@@ -91,8 +238,19 @@ input_method = st.sidebar.radio(
     help="デモシナリオを読み込んだ場合、この設定は上書きされます"
 )
 
-DRAW_LIMIT_STATIC      = 80
-DRAW_LIMIT_INTERACTIVE = 200
+DRAW_LIMIT_STATIC      = 800    # Matplotlib静止画（一括描画・基本層キャッシュ）の上限
+DRAW_LIMIT_INTERACTIVE = 200    # PyVisインタラクティブ表示を選べる上限
+IMPACT_ORIGIN_LIMIT    = 1000   # 全起点で迂回影響を計算する上限（超えたら起点を抽出）
+SWEEP_PREVIEW_ROWS     = 50     # 一括評価の実行中に表示する上位シナリオ数（全件は終了後に表示）
+SWEEP_REFRESH_SECONDS  = 1.0    # 一括評価の実行中の表を更新する間隔（秒）
+GEN_NODE_LIMIT         = 300_000  # ランダム生成の拠点数の上限（一様ランダムは GEN_RANDOM_LIMIT）
+GEN_RANDOM_LIMIT       = 1000
+GEN_KINDS = {
+    "ハブ＆スポーク":       "hub",
+    "地理的近傍（道路網）": "knn",
+    "幹線回廊":             "corridor",
+    "一様ランダム":         "random",
+}
 
 G            = None
 preview_ready = False
@@ -154,33 +312,37 @@ elif input_method == "テキスト入力":
 elif input_method == "ランダム生成":
     st.sidebar.markdown(
         "⚠️ **パフォーマンス目安**\n"
-        "- ~80ノード: 静止画描画\n"
-        "- ~200ノード: インタラクティブ描画\n"
-        "- 200超: 描画スキップ（数値のみ）"
+        "- ~200ノード: 静止画 / インタラクティブ描画\n"
+        "- ~800ノード: 静止画描画（ラベル省略）\n"
+        "- 800超: 強連結成分ごとの縮約表示"
     )
-    n_nodes   = st.sidebar.number_input("拠点数", min_value=2, max_value=1000, value=15)
-    edge_prob = st.sidebar.slider("ルート密度（接続確率）", 0.0, 1.0, 0.15)
+    gen_kind  = GEN_KINDS[st.sidebar.selectbox(
+        "ネットワークの種類", list(GEN_KINDS),
+        help="一様ランダム以外は拠点の座標（km）を作り、ルートのコストを座標間の距離で決めます。",
+    )]
+    gen_limit = GEN_RANDOM_LIMIT if gen_kind == "random" else GEN_NODE_LIMIT
+    gen_min   = min_nodes(gen_kind)
+    n_nodes   = st.sidebar.number_input("拠点数", min_value=gen_min, max_value=gen_limit,
+                                        value=max(15, gen_min))
+    gen_params = {}
+    if gen_kind == "random":
+        gen_params["edge_prob"] = st.sidebar.slider("ルート密度（接続確率）", 0.0, 1.0, 0.15)
     gen_seed  = st.sidebar.number_input("シード（固定再現）", value=42)
-    graph_key = f"rand_{int(n_nodes)}_{edge_prob:.3f}_{int(gen_seed)}"
+    graph_key = (gen_kind, int(n_nodes), tuple(sorted(gen_params.items())), int(gen_seed))
 
-    _prev_key = st.session_state.get("_prev_graph_key", "")
+    _prev_key = st.session_state.get("_prev_graph_key")
     if graph_key != _prev_key or "current_graph" not in st.session_state:
-        raw = nx.fast_gnp_random_graph(int(n_nodes), edge_prob,
-                                       seed=int(gen_seed), directed=True)
-        mapping = {i: f"N{i}" for i in raw.nodes()}
-        st.session_state["current_graph"] = nx.relabel_nodes(raw, mapping)
-        for u, v in st.session_state["current_graph"].edges():
-            st.session_state["current_graph"][u][v]["weight"] = float(_rnd.randint(1, 5))
+        with st.spinner("ネットワークを生成中..."):
+            st.session_state["current_graph"] = generate_network(
+                gen_kind, int(n_nodes), seed=int(gen_seed), **gen_params,
+            ).to_networkx()
         st.session_state["_prev_graph_key"] = graph_key
 
     if st.sidebar.button("🎲 別の乱数で再生成"):
         new_seed = _rnd.randint(0, 9999)
-        raw = nx.fast_gnp_random_graph(int(n_nodes), edge_prob,
-                                       seed=new_seed, directed=True)
-        mapping = {i: f"N{i}" for i in raw.nodes()}
-        st.session_state["current_graph"] = nx.relabel_nodes(raw, mapping)
-        for u, v in st.session_state["current_graph"].edges():
-            st.session_state["current_graph"][u][v]["weight"] = float(_rnd.randint(1, 5))
+        st.session_state["current_graph"] = generate_network(
+            gen_kind, int(n_nodes), seed=new_seed, **gen_params,
+        ).to_networkx()
         st.sidebar.caption(f"使用シード: {new_seed}")
 
     G = st.session_state.get("current_graph")
@@ -188,18 +350,29 @@ elif input_method == "ランダム生成":
 
 elif input_method == "CSVアップロード":
     st.sidebar.markdown(
-        "**CSVフォーマット**\n"
+        "**CSV / Parquet フォーマット**\n"
         "- 必須列: `from`, `to`\n"
-        "- 任意列: `cost`（迂回コスト分析に使用）"
+        "- 任意列: `cost`（迂回コスト分析に使用）、`capacity`（ルートの輸送容量、容量分析に使用）"
     )
-    uploaded = st.sidebar.file_uploader("CSVファイルを選択", type=["csv"])
+    uploaded = st.sidebar.file_uploader("CSV / Parquet ファイルを選択", type=["csv", "parquet"])
     if uploaded:
         file_bytes = uploaded.getvalue()
-        G, err = load_graph_from_csv(file_bytes)
+        file_fmt   = "parquet" if uploaded.name.lower().endswith(".parquet") else "csv"
+        G, err, ingest_report = load_graph_from_csv(file_bytes, file_fmt)
         if err:
             st.sidebar.error(err)
         else:
             st.sidebar.success(f"✅ {G.number_of_nodes()}拠点 / {G.number_of_edges()}ルート")
+            n_dropped = ingest_report["拠点名欠損で除外"]
+            n_invalid = ingest_report["コスト不正（1.0で補完）"]
+            n_cap_bad = ingest_report["容量不正（1.0で補完）"]
+            if n_dropped or n_invalid or n_cap_bad:
+                st.sidebar.warning(
+                    f"⚠️ {ingest_report['総行数']}行中 "
+                    f"拠点名欠損で除外: {n_dropped}行 / コスト不正（1.0で補完）: {n_invalid}行"
+                    + (f" / 容量不正（1.0で補完）: {n_cap_bad}行" if n_cap_bad else "") + "  \n"
+                    f"例: {', '.join(str(r) for r in ingest_report['不正行の例'])} 行目"
+                )
             preview_ready = True
             
 # ===========================================================================
@@ -217,9 +390,22 @@ if G and preview_ready:
     recommend_mode  = DEMO_SCENARIOS.get(active_scenario, {}).get(
         "recommend_mode", "強橋分析（単一障害点の特定）"
     )
-    mode_options  = ["強橋分析（単一障害点の特定）", "障害シミュレーション（影響範囲の確認）"]
+    mode_options  = [
+        "強橋分析（単一障害点の特定）",
+        "重要拠点分析（強連結切断点の特定）",
+        "障害シミュレーション（影響範囲の確認）",
+        "一括障害評価（N-1 / N-2 影響ランキング）",
+        "確率的障害評価（モンテカルロ）",
+        "容量分析（最大流量・最小カット）",
+        "供給依存分析（上流の単一障害点）",
+        "ルート脆弱性プロファイル（区間ごとの迂回コスト）",
+    ]
     default_index = mode_options.index(recommend_mode)
     mode = st.sidebar.radio("モードを選択", mode_options, index=default_index)
+    use_pyvis = node_count <= DRAW_LIMIT_INTERACTIVE and st.sidebar.checkbox(
+        "インタラクティブ表示（PyVis）", value=False,
+        help=f"{DRAW_LIMIT_INTERACTIVE}拠点まで。ズーム・ドラッグが可能です。",
+    )
 
     # =========================================================================
     # モード1: 強橋分析
@@ -232,7 +418,7 @@ if G and preview_ready:
         )
 
         with st.spinner("強橋を検出中..."):
-            bridges = find_strong_bridges(G)
+            bridges = cached_strong_bridges(G)
 
         col_a, col_b, col_c = st.columns(3)
         col_a.metric("拠点数", node_count)
@@ -249,12 +435,13 @@ if G and preview_ready:
         else:
             st.success("✅ 強橋は検出されませんでした。全ルートに冗長性があります。")
 
-        if node_count <= DRAW_LIMIT_STATIC:
+        if node_count <= DRAW_LIMIT_STATIC and not use_pyvis:
             fig, ax = plt.subplots(figsize=(12, 7))
-            pos = nx.spring_layout(G, seed=42, k=1.5 / max(node_count ** 0.5, 1))
-            scc_map, large_sccs = build_stable_scc_map(G)
+            pos = session_layout(G)
+            scc_map, large_sccs = cached_scc_map(G)
             draw_network_matplotlib(G, pos, ax, bridge_edges=bridges, scc_map=scc_map,
-                                    title="物流ネットワーク — 赤: 強橋 / 色: 強連結成分")
+                                    title="物流ネットワーク — 赤: 強橋 / 色: 強連結成分",
+                                    cached_base=True)
             cmap = plt.colormaps["tab10"]
             legend_elements = [mpatches.Patch(color="#e74c3c", label="強橋（単一障害点）")]
             for i in range(min(len(large_sccs), 5)):
@@ -264,17 +451,149 @@ if G and preview_ready:
                     mpatches.Patch(color="white", label=f"... 他 {len(large_sccs) - 5} 個"))
             legend_elements += [mpatches.Patch(color="#cccccc", label="非強連結（サイズ1）")]
             ax.legend(handles=legend_elements, loc="lower left", fontsize=9)
-            st.pyplot(fig)
+            with span("st.pyplot"):
+                st.pyplot(fig)
 
-        elif node_count <= DRAW_LIMIT_INTERACTIVE:
-            st.info("💡 ノード数が多いためインタラクティブ表示に切り替えました。ズーム・ドラッグが可能です。")
+        elif use_pyvis:
+            st.info("💡 インタラクティブ表示です。ズーム・ドラッグが可能です。")
             draw_network_pyvis(G, bridge_edges=bridges)
 
         else:
-            st.info(f"拠点数が {DRAW_LIMIT_INTERACTIVE} を超えているため描画をスキップしました（{node_count}拠点）。")
+            show_condensed_network(G, cached_scc_map(G), "bridges", bridge_edges=bridges,
+                                   static_limit=DRAW_LIMIT_STATIC,
+                                   interactive_limit=DRAW_LIMIT_INTERACTIVE)
+
+        st.divider()
+        st.subheader("🛠 冗長化プラン — 単一障害点を減らす追加ルートの提案")
+        st.markdown(
+            "追加ルート候補から、**強橋の解消**と**循環ルート（強連結成分）の統合**に効くものを"
+            "コストあたりの効果が大きい順に選びます。"
+        )
+        plan_source = st.radio("候補の作り方", ["距離ルール（近傍拠点）", "候補ファイル（CSV / Parquet）"],
+                               horizontal=True)
+        col_a, col_b, col_c = st.columns(3)
+        plan_budget = col_a.number_input("予算（追加コストの上限、0 で無制限）", min_value=0.0, value=0.0)
+        plan_max    = col_b.number_input("追加ルート数の上限", min_value=1, max_value=500, value=10)
+        candidates  = None
+        if plan_source.startswith("距離"):
+            plan_k = col_c.number_input("近傍拠点数（拠点ごと）", min_value=1, max_value=50, value=5)
+            st.caption("座標（lon/lat・x/y）がなければ既存ルート上の最短距離をコストにします。")
+        else:
+            cand_file = st.file_uploader("追加ルート候補（from / to / cost）", type=["csv", "parquet"],
+                                         key="plan_candidates")
+            if cand_file is not None:
+                cand_fmt = "parquet" if cand_file.name.lower().endswith((".parquet", ".pq")) else "csv"
+                C, cand_err, _ = load_graph_from_csv(cand_file.getvalue(), fmt=cand_fmt)
+                if cand_err:
+                    st.error(cand_err)
+                else:
+                    candidates = candidates_from_graph(C)
+
+        if st.button("▶️ 冗長化プランを作成"):
+            if plan_source.startswith("距離"):
+                candidates = distance_candidates(G, k=int(plan_k))
+            if not candidates:
+                st.warning("候補ファイルを選択してください。")
+            else:
+                t0 = time.perf_counter()
+                with st.spinner("追加ルートを選定中..."):
+                    df_plan, plan_summary = plan_redundancy(
+                        G, candidates, budget=plan_budget or None, max_additions=int(plan_max),
+                    )
+                st.session_state["redundancy_plan"] = (
+                    graph_fingerprint(G), df_plan, plan_summary, time.perf_counter() - t0,
+                )
+
+        saved = st.session_state.get("redundancy_plan")
+        if saved and saved[0] == graph_fingerprint(G):
+            _, df_plan, plan_summary, elapsed = saved
+            col_a, col_b, col_c = st.columns(3)
+            col_a.metric("強橋数", plan_summary["強橋数（追加後）"],
+                         delta=plan_summary["強橋数（追加後）"] - plan_summary["強橋数（追加前）"],
+                         delta_color="inverse")
+            col_b.metric("強連結成分数", plan_summary["強連結成分数（追加後）"],
+                         delta=plan_summary["強連結成分数（追加後）"] - plan_summary["強連結成分数（追加前）"],
+                         delta_color="inverse")
+            col_c.metric("追加コスト合計", f"{plan_summary['追加コスト合計']:,.1f}")
+            st.caption(f"候補 {plan_summary['候補数']:,} 本から {elapsed:.2f} 秒で選定")
+            if df_plan.empty:
+                st.info("単一障害点を減らせる候補がありませんでした。")
+            else:
+                st.dataframe(df_plan.set_index("順位"), use_container_width=True)
 
     # =========================================================================
-    # モード2: 障害シミュレーション
+    # モード2: 重要拠点分析
+    # =========================================================================
+    elif mode == "重要拠点分析（強連結切断点の特定）":
+        st.subheader("🏭 重要拠点分析 — 停止すると循環配送が分裂する拠点の特定")
+        st.markdown(
+            "**強連結切断点**とは、その拠点が1つでも止まると所属する循環配送（強連結成分）が"
+            "分裂する拠点。赤枠で表示された拠点が単一障害点です。"
+        )
+
+        with st.spinner("強連結切断点を検出中..."):
+            articulation_points = cached_articulation_points(G)
+            scc_map, large_sccs = cached_scc_map(G)
+
+        col_a, col_b, col_c = st.columns(3)
+        col_a.metric("拠点数", node_count)
+        col_b.metric("循環配送ブロック数", len(large_sccs))
+        col_c.metric("強連結切断点（重要拠点）数", len(articulation_points),
+                     delta=f"全拠点の {len(articulation_points) / max(node_count, 1) * 100:.1f}%",
+                     delta_color="inverse")
+
+        if articulation_points:
+            st.warning(
+                f"⚠️ {len(articulation_points)} 箇所の重要拠点が検出されました。"
+                "これらの拠点が止まると循環配送が分裂します。"
+            )
+            df_points = pd.DataFrame(
+                [
+                    {
+                        "拠点":             n,
+                        "所属する強連結成分": f"強連結成分 {scc_map[n] + 1}",
+                        "成分の拠点数":      len(large_sccs[scc_map[n]]),
+                    }
+                    for n in sorted(articulation_points, key=_natural_key)
+                ]
+            )
+            df_points.index += 1
+            st.dataframe(df_points, use_container_width=True)
+        else:
+            st.success("✅ 強連結切断点は検出されませんでした。全拠点に冗長性があります。")
+
+        if node_count <= DRAW_LIMIT_STATIC and not use_pyvis:
+            fig, ax = plt.subplots(figsize=(12, 7))
+            pos = session_layout(G)
+            draw_network_matplotlib(G, pos, ax, scc_map=scc_map,
+                                    articulation_nodes=articulation_points,
+                                    title="物流ネットワーク — 赤枠: 強連結切断点 / 色: 強連結成分",
+                                    cached_base=True)
+            cmap = plt.colormaps["tab10"]
+            legend_elements = [mpatches.Patch(facecolor="white", edgecolor="#e74c3c",
+                                              linewidth=2, label="強連結切断点（重要拠点）")]
+            for i in range(min(len(large_sccs), 5)):
+                legend_elements.append(mpatches.Patch(color=cmap(i % 10), label=f"強連結成分 {i + 1}"))
+            if len(large_sccs) > 5:
+                legend_elements.append(
+                    mpatches.Patch(color="white", label=f"... 他 {len(large_sccs) - 5} 個"))
+            legend_elements += [mpatches.Patch(color="#cccccc", label="非強連結（サイズ1）")]
+            ax.legend(handles=legend_elements, loc="lower left", fontsize=9)
+            with span("st.pyplot"):
+                st.pyplot(fig)
+
+        elif use_pyvis:
+            st.info("💡 インタラクティブ表示です。ズーム・ドラッグが可能です。")
+            draw_network_pyvis(G, articulation_nodes=articulation_points)
+
+        else:
+            show_condensed_network(G, (scc_map, large_sccs), "articulation",
+                                   articulation_nodes=articulation_points,
+                                   static_limit=DRAW_LIMIT_STATIC,
+                                   interactive_limit=DRAW_LIMIT_INTERACTIVE)
+
+    # =========================================================================
+    # モード3: 障害シミュレーション
     # =========================================================================
     elif mode == "障害シミュレーション（影響範囲の確認）":
         st.subheader("🛑 障害シミュレーション — 拠点・ルート停止時の影響範囲")
@@ -305,28 +624,47 @@ if G and preview_ready:
             default=[e for e in demo_failed_edges_str if e in all_edges_str],
         )
         failed_edges = [tuple(e.replace(" ", "").split("→")) for e in failed_edges_raw]
+        failure_demand, failure_demand_key = demand_uploader("failure_demand")
 
         if not failed_nodes_raw and not failed_edges:
             st.info("⬅️ サイドバーから停止させる拠点またはルートを選択してください。")
-            if node_count <= DRAW_LIMIT_STATIC:
+            if node_count <= DRAW_LIMIT_STATIC and not use_pyvis:
                 fig, ax = plt.subplots(figsize=(12, 7))
-                pos = nx.spring_layout(G, seed=42, k=1.5 / max(node_count ** 0.5, 1))
-                bridges = find_strong_bridges(G)
-                scc_map, _ = build_stable_scc_map(G)
+                pos = session_layout(G)
+                bridges = cached_strong_bridges(G)
+                scc_map, _ = cached_scc_map(G)
                 draw_network_matplotlib(G, pos, ax, bridge_edges=bridges,
-                                        scc_map=scc_map, title="現状ネットワーク（赤: 強橋）")
-                st.pyplot(fig)
-            elif node_count <= DRAW_LIMIT_INTERACTIVE:
-                bridges = find_strong_bridges(G)
+                                        scc_map=scc_map, title="現状ネットワーク（赤: 強橋）",
+                                        cached_base=True)
+                with span("st.pyplot"):
+                    st.pyplot(fig)
+            elif use_pyvis:
+                bridges = cached_strong_bridges(G)
                 draw_network_pyvis(G, bridge_edges=bridges)
+            else:
+                show_condensed_network(G, cached_scc_map(G), "current",
+                                       bridge_edges=cached_strong_bridges(G),
+                                       static_limit=DRAW_LIMIT_STATIC,
+                                       interactive_limit=DRAW_LIMIT_INTERACTIVE)
 
         else:
             with st.spinner("障害シミュレーション実行中..."):
+                scc_index = cached_scc_map(G)
+                # 同じグラフの間はセッションを使い回し、停止対象の追加・解除だけを差分で反映する
+                whatif_key = graph_fingerprint(G)
+                saved_session = st.session_state.get("whatif_session")
+                if saved_session is None or saved_session[0] != whatif_key:
+                    saved_session = (whatif_key, WhatIfSession(G, scc_index=scc_index))
+                    st.session_state["whatif_session"] = saved_session
+                whatif = saved_session[1]
                 (G_after, isolated_all, isolated_complete,
                  isolated_no_input, isolated_no_output,
-                 cascade_failures, scc_before, scc_after, broken_sccs) = simulate_failure(
-                    G, failed_nodes=failed_nodes_raw, failed_edges=failed_edges,
+                 cascade_failures, scc_before, scc_after, broken_sccs) = whatif.set_failures(
+                    failed_nodes_raw, failed_edges,
                 )
+            st.caption(
+                f"差分更新: {whatif.last_changes} 件の切り替えを {whatif.last_elapsed * 1000:.1f} ms で反映"
+            )
 
             col_a, col_b, col_c, col_d, col_e = st.columns(5)
             col_a.metric("停止拠点数",          len(failed_nodes_raw))
@@ -365,6 +703,18 @@ if G and preview_ready:
                     + "、".join(str(n) for n in sorted(cascade_failures, key=str))
                     + "\n\n直接障害ではなく、供給元の孤立が伝播して実質到達不能になった拠点です。"
                 )
+                with st.expander("🔍 連鎖の原因（どの孤立拠点から伝播したか）"):
+                    df_chain = pd.DataFrame([
+                        {
+                            "カスケード故障拠点": n,
+                            "原因となった孤立拠点": "、".join(
+                                str(p) for p in sorted(cascade_failures[n], key=_natural_key)
+                            ),
+                        }
+                        for n in sorted(cascade_failures, key=_natural_key)
+                    ])
+                    df_chain.index += 1
+                    st.dataframe(df_chain, use_container_width=True)
             if broken_sccs:
                 st.warning(f"⚠️ **{len(broken_sccs)}個の循環配送ルートが分裂しました**")
                 for i, item in enumerate(broken_sccs):
@@ -379,20 +729,74 @@ if G and preview_ready:
             if failed_edges:
                 st.divider()
                 st.subheader("🔄 迂回コスト分析")
-                st.caption("障害前後の最短経路コストを比較します。")
-                df_cost = analyze_rerouting_cost(G, G_after, failed_edges)
+                distance_index = None
+                if node_count >= INDEX_MIN_NODES:
+                    with st.spinner("距離インデックスを準備中（グラフごとに初回のみ）..."):
+                        distance_index = cached_distance_index(G)
+                st.caption("障害前後の最短経路コストを比較します。"
+                           + ("（距離インデックスで計算）" if distance_index is not None else ""))
+                df_cost = analyze_rerouting_cost(G, G_after, failed_edges, distance_index=distance_index)
                 if not df_cost.empty:
                     st.dataframe(df_cost, use_container_width=True)
 
+            st.divider()
+            st.subheader("🌐 ネットワーク全体の迂回影響")
+            impact_origins = None
+            if node_count > IMPACT_ORIGIN_LIMIT:
+                impact_origins = _rnd.Random(0).sample(list(G.nodes()), IMPACT_ORIGIN_LIMIT)
+                st.caption(
+                    f"拠点数が多いため、無作為に抽出した {IMPACT_ORIGIN_LIMIT} 拠点を起点として評価しています。"
+                )
+            else:
+                st.caption("全拠点間（起点×終点）の最短経路コストを障害前後で比較します。")
+            with st.spinner("全拠点間の迂回影響を計算中..."):
+                df_impact, impact = analyze_rerouting_impact(
+                    G, failed_nodes=failed_nodes_raw, failed_edges=failed_edges,
+                    origins=impact_origins, max_rows=500,
+                )
+            col_a, col_b, col_c = st.columns(3)
+            col_a.metric("総追加コスト", f"{impact['総追加コスト']:,.1f}")
+            col_b.metric("コスト増加ペア数", impact["コスト増加ペア数"])
+            col_c.metric("新規到達不能ペア数", impact["新規到達不能ペア数"],
+                         delta=f"+{impact['新規到達不能ペア数']}" if impact["新規到達不能ペア数"] else "0",
+                         delta_color="inverse")
+            if not df_impact.empty:
+                with st.expander(f"コストが変化した拠点ペア（上位 {len(df_impact)} 件）"):
+                    st.dataframe(df_impact, use_container_width=True)
+
+            if failure_demand is not None:
+                st.divider()
+                st.subheader("📦 需要への影響")
+                with st.spinner("需要ペアの平常時の経路を準備中（需要表ごとに初回のみ）..."):
+                    demand_impact = cached_demand_impact(G, failure_demand, fingerprint=failure_demand_key)
+                df_demand, demand_score = demand_impact.impact(failed_nodes_raw, failed_edges, max_rows=500)
+                demand_summary = demand_impact.summary()
+                total_volume = demand_summary["総需要量"] or 1.0
+                col_a, col_b, col_c = st.columns(3)
+                col_a.metric("未達需要量", f"{demand_score['未達需要量']:,.1f}",
+                             delta=f"{demand_score['未達需要量'] / total_volume:.1%}",
+                             delta_color="inverse")
+                col_b.metric("需要加重追加コスト", f"{demand_score['需要加重追加コスト']:,.1f}")
+                col_c.metric("影響需要量", f"{demand_score['影響需要量']:,.1f}",
+                             delta=f"{demand_score['影響OD数']:,} ODペア", delta_color="off")
+                st.caption(
+                    f"評価対象 {demand_summary['ODペア数']:,} ODペア（総需要量 {demand_summary['総需要量']:,.1f}）。"
+                    f"平常時から届かない需要 {demand_summary['平常時未達需要量']:,.1f}、"
+                    f"ネットワークにない拠点を含む需要 {demand_summary['対象外需要量']:,.1f} は除いています。"
+                )
+                if not df_demand.empty:
+                    with st.expander(f"影響を受けた需要（上位 {len(df_demand)} 件）"):
+                        st.dataframe(df_demand, use_container_width=True)
+
             if not isolated_all and not broken_sccs and not cascade_failures:
                 st.success("✅ 指定した障害範囲では循環配送への影響はありませんでした。")
 
-            if node_count <= DRAW_LIMIT_STATIC:
-                bridges_before = find_strong_bridges(G)
-                scc_map_before, large_sccs_before = build_stable_scc_map(G)
+            if node_count <= DRAW_LIMIT_STATIC and not use_pyvis:
+                bridges_before = cached_strong_bridges(G)
+                scc_map_before, large_sccs_before = scc_index
                 scc_map_after,  large_sccs_after  = build_stable_scc_map(G_after)
 
-                pos = nx.spring_layout(G, seed=42, k=1.5 / max(node_count ** 0.5, 1))
+                pos = session_layout(G)
                 pos_after = {n: p for n, p in pos.items() if n in G_after.nodes()}
 
                 fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 7))
@@ -401,7 +805,8 @@ if G and preview_ready:
                                         failed_nodes=failed_nodes_raw,
                                         failed_edges=failed_edges,
                                         scc_map=scc_map_before,
-                                        title="障害前（赤辺: 強橋 / 赤点線: 停止ルート）")
+                                        title="障害前（赤辺: 強橋 / 赤点線: 停止ルート）",
+                                        cached_base=True)
                 draw_network_matplotlib(G_after, pos_after, ax2,
                                         isolated_nodes=isolated_all,
                                         cascade_nodes=list(cascade_failures),
@@ -424,18 +829,500 @@ if G and preview_ready:
                            ncol=min(len(legend_elements), 7), fontsize=9,
                            bbox_to_anchor=(0.5, -0.02))
                 plt.tight_layout()
-                st.pyplot(fig)
+                with span("st.pyplot"):
+                    st.pyplot(fig)
 
-            elif node_count <= DRAW_LIMIT_INTERACTIVE:
+            elif use_pyvis:
                 st.info("💡 インタラクティブ表示（障害後）")
                 draw_network_pyvis(G_after,
                                    failed_nodes=failed_nodes_raw,
                                    isolated_nodes=isolated_all,
                                    cascade_nodes=list(cascade_failures))
             else:
-                st.info(
-                    f"拠点数が {DRAW_LIMIT_INTERACTIVE} を超えているため描画をスキップしました（{node_count}拠点）。"
+                show_condensed_network(G, scc_index, "failure",
+                                       bridge_edges=cached_strong_bridges(G),
+                                       failed_nodes=failed_nodes_raw,
+                                       failed_edges=failed_edges,
+                                       isolated_nodes=isolated_all,
+                                       cascade_nodes=list(cascade_failures),
+                                       static_limit=DRAW_LIMIT_STATIC,
+                                       interactive_limit=DRAW_LIMIT_INTERACTIVE)
+
+    # =========================================================================
+    # モード4: 一括障害評価（N-1 / N-2）
+    # =========================================================================
+    elif mode == "一括障害評価（N-1 / N-2 影響ランキング）":
+        st.subheader("📊 一括障害評価 — 全拠点・全ルートの停止影響ランキング")
+        st.markdown(
+            "すべての拠点・ルートを1つずつ（N-1）、または2つ同時に（N-2）停止させ、"
+            "**新たに発生する孤立・カスケード故障・循環ルートの分裂・追加迂回コスト**で順位付けします。"
+            "需要表を指定すると、**届かなくなる需要量と需要量で重み付けした追加コスト**でも順位付けできます。"
+        )
+
+        st.sidebar.divider()
+        st.sidebar.subheader("評価設定")
+        sweep_targets = st.sidebar.multiselect(
+            "評価対象", ["拠点", "ルート"], default=["拠点", "ルート"]
+        )
+        sweep_order = st.sidebar.radio(
+            "停止パターン", ["N-1（単一停止）", "N-2（無作為抽出）", "N-2（全組合せ）"]
+        )
+        n_elements = (node_count if "拠点" in sweep_targets else 0) + \
+                     (edge_count if "ルート" in sweep_targets else 0)
+        sweep_sample = None
+        if sweep_order == "N-2（無作為抽出）":
+            sweep_sample = st.sidebar.number_input(
+                "抽出する組合せ数", min_value=1, max_value=1_000_000, value=1000
+            )
+        elif sweep_order == "N-2（全組合せ）":
+            st.sidebar.caption(f"組合せ数: {n_elements * (n_elements - 1) // 2:,}")
+        cpu_total = os.cpu_count() or 1
+        sweep_workers = int(st.sidebar.number_input("並列プロセス数", 1, cpu_total, cpu_total))
+        sweep_demand, sweep_demand_key = demand_uploader("sweep_demand")
+        rank_by_demand = sweep_demand is not None and st.sidebar.radio(
+            "並べ替え", ["需要加重（未達需要量 → 需要加重追加コスト）", "拠点数（孤立 + カスケード）"],
+        ).startswith("需要")
+        sweep_key = (graph_fingerprint(G), tuple(sweep_targets), sweep_order, sweep_sample, sweep_demand_key)
+
+        if st.sidebar.button("▶️ 一括評価を実行", disabled=not sweep_targets):
+            scenarios = contingency_scenarios(
+                G,
+                include_nodes="拠点" in sweep_targets,
+                include_edges="ルート" in sweep_targets,
+                order=1 if sweep_order.startswith("N-1") else 2,
+                sample=int(sweep_sample) if sweep_sample else None,
+            )
+            progress    = st.progress(0.0, text=f"0 / {len(scenarios)} シナリオ")
+            table_slot  = st.empty()
+            records: list = []
+            preview: list = []   # 実行中の上位 SWEEP_PREVIEW_ROWS 件（全件の並べ替えは終了後に1回だけ）
+            pending: list = []
+            last_refresh = time.perf_counter()
+            done, elapsed = 0, 0.0
+            distance_index = None
+            if node_count >= INDEX_MIN_NODES and "ルート" in sweep_targets:
+                with st.spinner("距離インデックスを準備中（グラフごとに初回のみ）..."):
+                    distance_index = cached_distance_index(G)
+            demand_impact = None
+            if sweep_demand is not None:
+                with st.spinner("需要ペアの平常時の経路を準備中（需要表ごとに初回のみ）..."):
+                    demand_impact = cached_demand_impact(G, sweep_demand, max_workers=sweep_workers,
+                                                         fingerprint=sweep_demand_key)
+            for batch, done, elapsed in iter_contingency_sweep(
+                G, scenarios, max_workers=sweep_workers, distance_index=distance_index,
+                demand_impact=demand_impact,
+            ):
+                records.extend(batch)
+                pending.extend(batch)
+                rate = done / elapsed if elapsed > 0 else 0.0
+                progress.progress(
+                    done / max(len(scenarios), 1),
+                    text=f"{done} / {len(scenarios)} シナリオ（{rate:,.1f} シナリオ/秒）",
+                )
+                if time.perf_counter() - last_refresh >= SWEEP_REFRESH_SECONDS:
+                    top = rank_contingencies(preview + pending, by_demand=rank_by_demand).head(SWEEP_PREVIEW_ROWS)
+                    preview, pending = top.to_dict("records"), []
+                    with table_slot.container():
+                        st.caption(f"実行中の暫定上位 {SWEEP_PREVIEW_ROWS} 件（全件は終了後に表示）")
+                        st.dataframe(top, use_container_width=True)
+                    last_refresh = time.perf_counter()
+            progress.empty()
+            table_slot.empty()
+            st.session_state["contingency_result"] = (sweep_key, records, done, elapsed)
+
+        saved = st.session_state.get("contingency_result")
+        if saved and saved[0] == sweep_key:
+            _, records, done, elapsed = saved
+            df_rank = rank_contingencies(records, by_demand=rank_by_demand)
+            col_a, col_b, col_c = st.columns(3)
+            col_a.metric("評価シナリオ数", done)
+            col_b.metric("処理速度", f"{done / elapsed if elapsed > 0 else 0:,.1f} シナリオ/秒")
+            col_c.metric("影響ありシナリオ数",
+                         int(((df_rank["孤立拠点数"] + df_rank["カスケード故障数"]
+                               + df_rank["分裂した循環ルート数"]) > 0).sum()))
+            if "未達需要量" in df_rank.columns:
+                col_a, col_b, col_c = st.columns(3)
+                col_a.metric("需要が届かなくなるシナリオ数", int((df_rank["未達需要量"] > 0).sum()))
+                col_b.metric("最大の未達需要量", f"{df_rank['未達需要量'].max():,.1f}")
+                col_c.metric("最大の需要加重追加コスト", f"{df_rank['需要加重追加コスト'].max():,.1f}")
+            st.caption("列見出しをクリックすると並べ替えできます。")
+            st.dataframe(df_rank, use_container_width=True)
+        else:
+            st.info("⬅️ サイドバーで評価対象と停止パターンを選び「一括評価を実行」を押してください。")
+
+    # =========================================================================
+    # モード5: 確率的障害評価（モンテカルロ）
+    # =========================================================================
+    elif mode == "確率的障害評価（モンテカルロ）":
+        st.subheader("🎲 確率的障害評価 — 拠点ごとの孤立・カスケード故障の発生確率")
+        st.markdown(
+            "拠点・ルートごとの停止確率（気象・地震などの被災確率）に従って障害を無作為に発生させる試行を"
+            "数千〜数万回繰り返し、**各拠点が停止・孤立・カスケード故障に巻き込まれる確率**と"
+            "**循環ルートが分裂する回数の分布**を推定します。"
+        )
+
+        st.sidebar.divider()
+        st.sidebar.subheader("停止確率")
+        mc_node_prob = st.sidebar.number_input(
+            "拠点の停止確率（一律）", 0.0, 1.0, 0.01, step=0.005, format="%.3f"
+        )
+        mc_edge_prob = st.sidebar.number_input(
+            "ルートの停止確率（一律）", 0.0, 1.0, 0.02, step=0.005, format="%.3f"
+        )
+        mc_overrides_raw = st.sidebar.text_area(
+            "個別の停止確率（1行ずつ）", "",
+            help="`拠点,確率` または `from,to,確率` の形式。一律の確率を上書きします。",
+        )
+        node_overrides, edge_overrides = {}, {}
+        for line in mc_overrides_raw.strip().split("\n"):
+            parts = [p.strip() for p in line.split(",")]
+            try:
+                if len(parts) == 2 and parts[0]:
+                    node_overrides[parts[0]] = float(parts[1])
+                elif len(parts) == 3 and parts[0] and parts[1]:
+                    edge_overrides[(parts[0], parts[1])] = float(parts[2])
+                elif line.strip():
+                    st.sidebar.warning(f"スキップ: '{line}'")
+            except ValueError:
+                st.sidebar.warning(f"スキップ: '{line}'")
+
+        st.sidebar.subheader("試行設定")
+        mc_max_trials = int(st.sidebar.number_input("最大試行回数", 100, 1_000_000, 20_000, step=1000))
+        mc_tol = st.sidebar.number_input(
+            "打ち切り判定（95%信頼区間の半幅）", 0.001, 0.1, 0.01, step=0.001, format="%.3f",
+            help="全拠点の影響確率の信頼区間がこの幅以下になったら試行を打ち切ります。",
+        )
+        cpu_total  = os.cpu_count() or 1
+        mc_workers = int(st.sidebar.number_input("並列プロセス数", 1, cpu_total, cpu_total))
+        mc_seed    = int(st.sidebar.number_input("シード（固定再現）", value=0))
+        mc_key = (graph_fingerprint(G), mc_node_prob, mc_edge_prob, mc_overrides_raw,
+                  mc_max_trials, mc_tol, mc_seed)
+
+        if st.sidebar.button("▶️ モンテカルロ評価を実行"):
+            cg = CompactGraph.from_networkx(G)
+            p_node, p_edge = failure_probability_arrays(
+                cg, mc_node_prob, mc_edge_prob, node_overrides, edge_overrides
+            )
+            progress = st.progress(0.0, text=f"0 / {mc_max_trials:,} 試行")
+            state = None
+            for state in iter_monte_carlo(
+                cg, p_node, p_edge, max_trials=mc_max_trials, tol=mc_tol,
+                max_workers=mc_workers, seed=mc_seed,
+            ):
+                rate = state["trials"] / state["elapsed"] if state["elapsed"] > 0 else 0.0
+                progress.progress(
+                    state["trials"] / mc_max_trials,
+                    text=f"{state['trials']:,} / {mc_max_trials:,} 試行（{rate:,.0f} 試行/秒、"
+                         f"信頼区間 ±{state['half_width']:.3f}）",
+                )
+            progress.empty()
+            st.session_state["montecarlo_result"] = (mc_key, summarize_monte_carlo(cg, state))
+
+        saved = st.session_state.get("montecarlo_result")
+        if saved and saved[0] == mc_key:
+            _, (df_mc, df_broken, mc_summary) = saved
+            col_a, col_b, col_c, col_d = st.columns(4)
+            col_a.metric("試行回数", f"{mc_summary['試行回数']:,}",
+                         delta="収束" if mc_summary["収束"] else "上限で打ち切り",
+                         delta_color="normal" if mc_summary["収束"] else "off")
+            col_b.metric("処理速度", f"{mc_summary['試行/秒']:,.0f} 試行/秒")
+            col_c.metric("平均影響拠点数", f"{mc_summary['平均影響拠点数']:.2f}")
+            col_d.metric("循環ルート分裂確率", f"{mc_summary['循環ルート分裂確率']:.1%}")
+            st.caption(
+                f"孤立・カスケード故障は障害なしの状態から新たに発生した分を数えています。"
+                f"影響確率 = 停止・孤立・カスケード故障のいずれかになる確率"
+                f"（最大の95%信頼区間 ±{mc_summary['最大信頼区間（±）']:.3f}）。"
+            )
+            st.dataframe(df_mc, use_container_width=True)
+            st.markdown("##### 1試行あたりの分裂した循環ルート数の分布")
+            st.bar_chart(df_broken.set_index("分裂した循環ルート数")["割合"])
+        else:
+            st.info("⬅️ サイドバーで停止確率を設定し「モンテカルロ評価を実行」を押してください。")
+
+    # =========================================================================
+    # モード6: 容量分析（最大流量・最小カット）
+    # =========================================================================
+    elif mode == "容量分析（最大流量・最小カット）":
+        st.subheader("🚚 容量分析 — 拠点間で運べる最大量と制約ルート")
+        st.markdown(
+            "各ルートの輸送容量（`capacity` 列）をもとに、**出発拠点から到着拠点へ同時に運べる最大量**と、"
+            "その上限を決めている**最小カット（ボトルネックとなるルートの組）**を求めます。"
+            "停止シナリオは障害なしの流れを出発点に差分で再計算します。"
+        )
+        if not any("capacity" in d for _, _, d in G.edges(data=True)):
+            st.info(
+                "ルート表に `capacity` 列がないため、全ルートの容量を 1 として計算しています"
+                "（最大流量 = ルートを共有せずに同時に使える経路の本数）。"
+            )
+
+        st.sidebar.divider()
+        st.sidebar.subheader("容量分析の設定")
+        all_nodes = sorted(G.nodes(), key=_natural_key)
+        flow_sources = st.sidebar.multiselect(
+            "出発拠点（供給元）", all_nodes, default=all_nodes[:1]
+        )
+        sink_options = [n for n in all_nodes if n not in flow_sources]
+        flow_sinks = st.sidebar.multiselect(
+            "到着拠点（届け先）", sink_options, default=sink_options[-1:]
+        )
+        flow_failed_nodes = st.sidebar.multiselect(
+            "停止する拠点（複数選択可）", all_nodes
+        )
+        all_edges_str = sorted(
+            [f"{u} → {v}" for u, v in G.edges()],
+            key=lambda e: (_natural_key(e.split(" → ")[0]), _natural_key(e.split(" → ")[1]))
+        )
+        flow_failed_edges = [
+            tuple(e.replace(" ", "").split("→"))
+            for e in st.sidebar.multiselect("停止するルート（複数選択可）", all_edges_str)
+        ]
+
+        if not flow_sources or not flow_sinks:
+            st.info("⬅️ サイドバーで出発拠点と到着拠点を選択してください。")
+        else:
+            # 基準状態の流れはセッションに保持し、停止シナリオの評価で使い回す
+            flow_key = (graph_fingerprint(G), graph_fingerprint(G, weight="capacity", default=DEFAULT_CAPACITY),
+                        tuple(flow_sources), tuple(flow_sinks))
+            saved_flow = st.session_state.get("flow_network")
+            if saved_flow is None or saved_flow[0] != flow_key:
+                with st.spinner("最大流量を計算中..."):
+                    saved_flow = (flow_key, FlowNetwork(G, flow_sources, flow_sinks))
+                st.session_state["flow_network"] = saved_flow
+            net = saved_flow[1]
+
+            col_a, col_b, col_c = st.columns(3)
+            col_a.metric("最大流量（障害なし）", f"{net.value:,.1f}")
+            if flow_failed_nodes or flow_failed_edges:
+                flow_start = time.perf_counter()
+                scenario = net.evaluate(flow_failed_nodes, flow_failed_edges, with_cut=True)
+                flow_ms = (time.perf_counter() - flow_start) * 1000
+                loss = net.value - scenario["value"]
+                col_b.metric("最大流量（停止後）", f"{scenario['value']:,.1f}",
+                             delta=f"-{loss:,.1f}" if loss > 0 else "0",
+                             delta_color="normal" if loss > 0 else "off")
+                col_c.metric("減少率", f"{loss / net.value:.1%}" if net.value > 0 else "-")
+                st.caption(f"停止後の最大流量は基準の流れから差分で {flow_ms:.1f} ms で再計算しました。")
+                df_cut = pd.DataFrame(scenario["cut"], columns=["出発拠点", "到着拠点", "容量"])
+                df_cut.index += 1
+                if scenario["value"] <= 0:
+                    st.error("🚫 停止後は出発拠点から到着拠点へ届く経路がありません。")
+                else:
+                    st.markdown("##### 停止後の最小カット（ボトルネックとなるルート）")
+                    st.dataframe(df_cut, use_container_width=True)
+            elif net.value <= 0:
+                st.error("🚫 出発拠点から到着拠点へ届く経路がありません。")
+            else:
+                st.markdown("##### 最小カット（ボトルネックとなるルート）")
+                st.dataframe(net.min_cut(), use_container_width=True)
+            with st.expander("障害なしの状態でのルート別流量"):
+                st.dataframe(net.edge_flows(), use_container_width=True)
+
+            st.divider()
+            st.subheader("📉 単一停止（N-1）による最大流量の減少ランキング")
+            cpu_total = os.cpu_count() or 1
+            flow_workers = int(st.sidebar.number_input("並列プロセス数", 1, cpu_total, cpu_total))
+            if st.button("▶️ 全拠点・全ルートの N-1 評価を実行"):
+                scenarios = contingency_scenarios(G)
+                progress = st.progress(0.0, text=f"0 / {len(scenarios)} シナリオ")
+                records: list = []
+                done, elapsed = 0, 0.0
+                for batch, done, elapsed in iter_capacity_sweep(
+                    G, flow_sources, flow_sinks, scenarios, max_workers=flow_workers
+                ):
+                    records.extend(batch)
+                    rate = done / elapsed if elapsed > 0 else 0.0
+                    progress.progress(
+                        done / max(len(scenarios), 1),
+                        text=f"{done} / {len(scenarios)} シナリオ（{rate:,.1f} シナリオ/秒）",
+                    )
+                progress.empty()
+                st.session_state["capacity_result"] = (flow_key, records, done, elapsed)
+
+            saved = st.session_state.get("capacity_result")
+            if saved and saved[0] == flow_key:
+                _, records, done, elapsed = saved
+                df_loss = rank_capacity_losses(records)
+                col_a, col_b, col_c = st.columns(3)
+                col_a.metric("評価シナリオ数", done)
+                col_b.metric("処理速度", f"{done / elapsed if elapsed > 0 else 0:,.1f} シナリオ/秒")
+                col_c.metric("流量が減るシナリオ数", int((df_loss["減少量"] > 1e-9).sum()))
+                st.dataframe(df_loss, use_container_width=True)
+
+    # =========================================================================
+    # モード7: 供給依存分析
+    # =========================================================================
+    elif mode == "供給依存分析（上流の単一障害点）":
+        st.subheader("🏗 供給依存分析 — 供給拠点から見た上流の単一障害点")
+        st.markdown(
+            "供給拠点（デポ・工場など）から各拠点への**すべての供給経路が通る拠点・ルート**を支配木で求めます。"
+            " その拠点・ルートが1つ止まるだけで、下流の拠点への供給が途絶えます。"
+        )
+
+        st.sidebar.divider()
+        st.sidebar.subheader("供給依存分析の設定")
+        all_nodes = sorted(G.nodes(), key=_natural_key)
+        busiest = max(all_nodes, key=G.out_degree)
+        supply_hubs = st.sidebar.multiselect("供給拠点（デポ・工場など）", all_nodes, default=[busiest])
+
+        if not supply_hubs:
+            st.info("⬅️ サイドバーで供給拠点を1つ以上選択してください。")
+        else:
+            supply_key = (graph_fingerprint(G), tuple(supply_hubs))
+            saved = st.session_state.get("supply_index")
+            if saved is None or saved[0] != supply_key:
+                with st.spinner("支配木を構築中..."):
+                    saved = (supply_key, SupplyDependencyIndex(G, supply_hubs))
+                st.session_state["supply_index"] = saved
+            index = saved[1]
+            df_rank = index.ranking()
+
+            col_a, col_b, col_c, col_d = st.columns(4)
+            col_a.metric("供給される拠点数", len(index.supplied))
+            col_b.metric("供給されない拠点数", len(index.unsupplied()))
+            col_c.metric("上流の単一障害点（拠点）", int((df_rank["種別"] == "拠点").sum()))
+            col_d.metric("代替のないルート", int((df_rank["種別"] == "ルート").sum()))
+            if index.unsupplied():
+                st.warning(
+                    "⚠️ 障害がなくても供給拠点から届かない拠点があります: "
+                    + "、".join(map(str, index.unsupplied()[:20]))
+                    + (f" ほか {len(index.unsupplied()) - 20} 拠点" if len(index.unsupplied()) > 20 else "")
+                )
+
+            st.markdown("##### 停止すると供給が途絶える拠点・ルート")
+            if df_rank.empty:
+                st.success("✅ どの拠点・ルートが1つ止まっても、供給は迂回経路で維持されます。")
+            else:
+                df_rank.index += 1
+                st.dataframe(df_rank, use_container_width=True)
+
+            supplied_nodes = [n for n in all_nodes if n in index.supplied]
+            col_l, col_r = st.columns(2)
+            with col_l:
+                target = st.selectbox("拠点の依存先を確認", supplied_nodes)
+                chain = index.dependencies(target)
+                routes = index.critical_routes(target)
+                if chain or routes:
+                    st.markdown("**依存する上流拠点**: " + (" → ".join(map(str, chain)) or "なし"))
+                    st.markdown("**代替のないルート**: "
+                                + ("、".join(f"{u} → {v}" for u, v in routes) or "なし"))
+                else:
+                    st.success(f"{target} は単一の上流拠点・ルートに依存していません。")
+            with col_r:
+                stopped = st.selectbox("停止すると途絶える拠点を確認", supplied_nodes,
+                                       index=supplied_nodes.index(supply_hubs[0]))
+                dark = index.dependents(stopped)
+                if dark:
+                    st.markdown(f"**{stopped} の停止で途絶える拠点（{len(dark)}）**: " + "、".join(map(str, dark)))
+                else:
+                    st.success(f"{stopped} が止まっても他の拠点への供給は維持されます。")
+
+            st.divider()
+            st.markdown("##### 停止シミュレーション（供給途絶とその原因）")
+            supply_failed_nodes = st.multiselect("停止する拠点（複数選択可）", all_nodes, key="supply_failed_nodes")
+            all_edges_str = sorted(
+                [f"{u} → {v}" for u, v in G.edges()],
+                key=lambda e: (_natural_key(e.split(" → ")[0]), _natural_key(e.split(" → ")[1]))
+            )
+            supply_failed_edges = [
+                tuple(e.replace(" ", "").split("→"))
+                for e in st.multiselect("停止するルート（複数選択可）", all_edges_str, key="supply_failed_edges")
+            ]
+            if supply_failed_nodes or supply_failed_edges:
+                t0 = time.perf_counter()
+                loss = index.supply_loss(supply_failed_nodes, supply_failed_edges)
+                elapsed = time.perf_counter() - t0
+                st.caption(f"{len(loss)} 拠点への供給が途絶（{elapsed * 1000:.1f} ms）")
+                if loss:
+                    df_loss = pd.DataFrame(
+                        [(n, f"{c[0]} → {c[1]}" if isinstance(c, tuple) else str(c))
+                         for n, c in sorted(loss.items(), key=lambda kv: _natural_key(kv[0]))],
+                        columns=["拠点", "原因"],
+                    )
+                    df_loss.index += 1
+                    st.dataframe(df_loss, use_container_width=True)
+                else:
+                    st.success("✅ 指定した停止では供給は途絶えません。")
+
+                if node_count <= DRAW_LIMIT_STATIC:
+                    fig, ax = plt.subplots(figsize=(12, 7))
+                    draw_network_matplotlib(G, session_layout(G), ax,
+                                            failed_nodes=supply_failed_nodes,
+                                            failed_edges=supply_failed_edges,
+                                            cascade_nodes=list(loss),
+                                            title="供給途絶（赤: 停止 / 橙◆: 供給が途絶える拠点）",
+                                            cached_base=True)
+                    with span("st.pyplot"):
+                        st.pyplot(fig)
+
+            with st.expander("全拠点の依存先一覧"):
+                df_dep = index.dependency_table()
+                df_dep.index += 1
+                st.dataframe(df_dep, use_container_width=True)
+
+    # =========================================================================
+    # モード8: ルート脆弱性プロファイル
+    # =========================================================================
+    elif mode == "ルート脆弱性プロファイル（区間ごとの迂回コスト）":
+        st.subheader("🛣 ルート脆弱性プロファイル — 最短経路のどの区間が止まっても迂回できるか")
+        st.markdown(
+            "出発拠点 → 到着拠点の最短経路上の**すべてのルート**について、1本止まったときの迂回後コストを"
+            "最短経路木2回分の計算でまとめて求めます（区間ごとに迂回コスト分析を繰り返す必要はありません）。"
+        )
+
+        st.sidebar.divider()
+        st.sidebar.subheader("対象の区間")
+        all_nodes = sorted(G.nodes(), key=_natural_key)
+        lane_source = st.sidebar.selectbox("出発拠点", all_nodes,
+                                           index=all_nodes.index(max(all_nodes, key=G.out_degree)))
+        reachable, farthest = cached_reachable(G, lane_source)
+        reachable = set(reachable)
+        lane_targets = [n for n in all_nodes if n in reachable]
+
+        if not lane_targets:
+            st.info(f"{lane_source} から到達できる拠点がありません。出発拠点を変えてください。")
+        else:
+            lane_target = st.sidebar.selectbox("到着拠点", lane_targets,
+                                               index=lane_targets.index(farthest))
+            t0 = time.perf_counter()
+            with st.spinner("全区間の迂回コストを計算中..."):
+                df_profile, profile = route_vulnerability_profile(G, lane_source, lane_target)
+            elapsed = time.perf_counter() - t0
+
+            col_a, col_b, col_c, col_d = st.columns(4)
+            col_a.metric("基準コスト", f"{profile['基準コスト']:,.1f}")
+            col_b.metric("区間数", profile["区間数"])
+            col_c.metric("迂回不能区間数", profile["迂回不能区間数"],
+                         delta=f"+{profile['迂回不能区間数']}" if profile["迂回不能区間数"] else "0",
+                         delta_color="inverse")
+            col_d.metric("最大増加コスト",
+                         "∞" if profile["迂回不能区間数"] else f"{profile['最大増加コスト']:,.1f}")
+            st.caption(f"最短経路: {profile['最短経路']}（{elapsed * 1000:.0f} ms）")
+
+            if profile["迂回不能区間数"]:
+                st.error(
+                    f"🚨 {profile['迂回不能区間数']} 区間は止まると {lane_target} へ到達できません"
+                    "（障害後コスト ∞）。"
                 )
+            else:
+                st.info(f"最も弱い区間: **{profile['最も弱い区間']}**（+{profile['最大増加コスト']:,.1f}）")
+
+            df_show = df_profile.set_index("区間")
+            st.dataframe(df_show, use_container_width=True)
+            finite = df_show[df_show["障害後コスト"] != float("inf")]
+            if len(finite) > 1:
+                st.bar_chart(finite.set_index("停止ルート")["増加コスト"])
+
+            if node_count <= DRAW_LIMIT_STATIC:
+                lane_edges = [tuple(r.split(" → ")) for r in df_profile["停止ルート"]]
+                no_detour = [tuple(r.split(" → ")) for r in
+                             df_profile.loc[df_profile["迂回経路"] == NO_DETOUR, "停止ルート"]]
+                fig, ax = plt.subplots(figsize=(12, 7))
+                draw_network_matplotlib(G, session_layout(G), ax,
+                                        bridge_edges=lane_edges,
+                                        failed_edges=no_detour,
+                                        title="対象の最短経路（赤: 経路 / 赤点線: 迂回できない区間）")
+                with span("st.pyplot"):
+                    st.pyplot(fig)
 
 # ---------------------------------------------------------------------------
 # 初期画面: デモ未読み込み・入力なし
@@ -465,4 +1352,36 @@ else:
             "🚧 **シナリオ3: 幹線遮断と迂回コスト**  \n"
             "東京↔横浜 遮断で  \n"
             "迂回コストが2.8倍に増大。"
-        )
\ No newline at end of file
+        )
+
+# ---------------------------------------------------------------------------
+# 診断パネル: 処理区間ごとの時間・メモリとプロファイル
+# ---------------------------------------------------------------------------
+finish_run()
+with st.sidebar.expander("⏱ 診断（処理時間・メモリ）"):
+    st.caption(
+        f"今回の実行: {run_recorder.seconds:.2f} 秒 / 計測区間 "
+        f"{sum(t[0] for t in run_recorder.totals.values()):,} 件"
+        + (f"（個別表示は先頭 {len(run_recorder.spans)} 件）" if run_recorder.dropped else "")
+    )
+    if run_recorder.totals:
+        st.dataframe(run_recorder.summary().set_index("処理"), use_container_width=True)
+        st.markdown("##### 区間の内訳（開始順）")
+        st.dataframe(run_recorder.timeline().set_index("処理"), use_container_width=True)
+    else:
+        st.caption("この実行では計測対象の処理は呼ばれていません（結果はキャッシュから表示）。")
+
+    st.checkbox("区間ごとのピークメモリも測る（tracemalloc、処理が遅くなります）", key="diag_memory")
+    if SPAN_LOG_PATH:
+        st.caption(f"区間を JSON Lines で書き出し中: `{SPAN_LOG_PATH}`（環境変数 LOGISTICS_SPAN_LOG）")
+    else:
+        st.checkbox("区間を JSON Lines で書き出す", key="diag_log")
+        st.text_input("書き出し先", value="spans.jsonl", key="diag_log_path")
+    st.radio("プロファイルの種類", PROFILE_MODES, horizontal=True, key="diag_profile")
+    st.button("▶️ 1回だけプロファイルを取って再実行", key="diag_profile_run")
+    if run_recorder.profile_text:
+        st.markdown(f"##### プロファイル（{run_recorder.profile}）")
+        st.code(run_recorder.profile_text, language=None)
+    if run_recorder.profile_bytes:
+        st.download_button("💾 .prof をダウンロード（snakeviz 等で表示）", run_recorder.profile_bytes,
+                           file_name=f"profile-{run_recorder.run_id}.prof")
@@ -0,0 +1,348 @@
+import math
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import networkx as nx
+import pandas as pd
+
+from contingency import _scenario_label
+
+# ---------------------------------------------------------------------------
+# 定数
+# ---------------------------------------------------------------------------
+FLOW_EPS         = 1e-9
+DEFAULT_CAPACITY = 1.0   # capacity 属性のないルートの容量（全ルート容量なしなら辺素なルート数になる）
+FLOW_COLUMNS     = ["出発拠点", "到着拠点", "流量", "容量", "使用率"]
+CUT_COLUMNS      = ["出発拠点", "到着拠点", "容量"]
+SWEEP_COLUMNS    = ["障害対象", "種別", "最大流量", "減少量", "減少率"]
+
+
+# ---------------------------------------------------------------------------
+# 残余ネットワークと Dinic 法
+# ---------------------------------------------------------------------------
+class FlowNetwork:
+    """
+    出発拠点群 → 到着拠点群の最大流量・最小カットを求める残余ネットワーク。
+
+    ルート e とその逆辺 e^1 を対にして配列（Python のリスト）で持ち、Dinic 法で増加路を流す。
+    複数の出発・到着拠点は仮想の総出発点・総到着点に容量無限の辺でまとめる。
+
+    障害シナリオは基準状態の流れから warm start で評価する（evaluate）。
+      1. 停止した要素に流れていた量を取り消し、その両端に生じた過不足を記録する
+      2. 過剰な拠点から不足した拠点へ、残余ネットワーク上で迂回させる（局所的な付け替え）
+      3. 付け替えきれない過剰は出発点へ、不足は到着点から戻す（流量が減る分）
+      4. 残った残余ネットワークで出発点 → 到着点の増加路を探す
+    変更はすべて記録しておき、評価後に巻き戻すので、基準状態の流れを何度でも再利用できる。
+    """
+
+    def __init__(
+        self,
+        G: nx.DiGraph,
+        sources: list,
+        sinks: list,
+        capacity: str = "capacity",
+        default: float = DEFAULT_CAPACITY,
+    ):
+        sources = [s for s in dict.fromkeys(sources) if s in G]
+        sinks   = [t for t in dict.fromkeys(sinks) if t in G]
+        if not sources or not sinks:
+            raise ValueError("出発拠点と到着拠点をそれぞれ1つ以上指定してください。")
+        if set(sources) & set(sinks):
+            raise ValueError("同じ拠点を出発拠点と到着拠点の両方に指定することはできません。")
+
+        self.nodes   = list(G.nodes())
+        self.index   = {n: i for i, n in enumerate(self.nodes)}
+        self.sources = sources
+        self.sinks   = sinks
+        n = len(self.nodes)
+        self.S, self.T = n, n + 1                  # 総出発点・総到着点
+        self._aux_src, self._aux_dst = n + 2, n + 3  # 過不足の付け替え用（evaluate 中のみ辺を持つ）
+        self.n_nodes = n + 4
+
+        self.head: list = []
+        self.cap:  list = []
+        self.flow: list = []
+        self.adj:  list = [[] for _ in range(self.n_nodes)]
+        self.edge_index: dict = {}                 # (始点, 終点) → 辺ID（偶数）
+        for u, v, d in G.edges(data=True):
+            if u != v:
+                self.edge_index[(u, v)] = self._add_edge(self.index[u], self.index[v],
+                                                         float(d.get(capacity, default)))
+        for s in sources:
+            self._add_edge(self.S, self.index[s], math.inf)
+        for t in sinks:
+            self._add_edge(self.index[t], self.T, math.inf)
+        self._n_edges = len(self.head)
+
+        self._journal: list | None = None
+        self.value = self._augment(self.S, self.T)
+
+    # -----------------------------------------------------------------------
+    # 基本操作
+    # -----------------------------------------------------------------------
+    def _add_edge(self, u: int, v: int, c: float) -> int:
+        e = len(self.head)
+        self.head += [v, u]
+        self.cap  += [c, 0.0]
+        self.flow += [0.0, 0.0]
+        self.adj[u].append(e)
+        self.adj[v].append(e + 1)
+        return e
+
+    def _push(self, e: int, amount: float) -> None:
+        self.flow[e]     += amount
+        self.flow[e ^ 1] -= amount
+        if self._journal is not None:
+            self._journal.append((e, amount))
+
+    def _levels(self, s: int, t: int) -> list | None:
+        head, cap, flow, adj = self.head, self.cap, self.flow, self.adj
+        level = [-1] * self.n_nodes
+        level[s] = 0
+        queue = deque([s])
+        while queue:
+            x = queue.popleft()
+            for e in adj[x]:
+                y = head[e]
+                if level[y] < 0 and cap[e] - flow[e] > FLOW_EPS:
+                    level[y] = level[x] + 1
+                    queue.append(y)
+        return level if level[t] >= 0 else None
+
+    def _blocking_flow(self, s: int, t: int, level: list, limit: float) -> float:
+        """層別グラフ上の阻止流（現在辺ポインタ付きの反復 DFS）。"""
+        head, cap, flow, adj = self.head, self.cap, self.flow, self.adj
+        it = [0] * self.n_nodes
+        total = 0.0
+        while total < limit - FLOW_EPS:
+            path: list = []
+            x = s
+            while x != t:
+                edges, i = adj[x], it[x]
+                while i < len(edges):
+                    e = edges[i]
+                    if level[head[e]] == level[x] + 1 and cap[e] - flow[e] > FLOW_EPS:
+                        break
+                    i += 1
+                it[x] = i
+                if i < len(edges):
+                    path.append(edges[i])
+                    x = head[edges[i]]
+                    continue
+                if not path:
+                    return total
+                level[x] = -1                  # 行き止まり: 以後この拠点には入らない
+                x = head[path.pop() ^ 1]
+                it[x] += 1
+            amount = min(limit - total, min(cap[e] - flow[e] for e in path))
+            for e in path:
+                self._push(e, amount)
+            total += amount
+        return total
+
+    def _augment(self, s: int, t: int, limit: float = math.inf) -> float:
+        """s から t へ残余ネットワーク上で最大 limit だけ流し、流せた量を返す。"""
+        total = 0.0
+        while total < limit - FLOW_EPS:
+            level = self._levels(s, t)
+            if level is None:
+                break
+            pushed = self._blocking_flow(s, t, level, limit - total)
+            if pushed <= FLOW_EPS:
+                break
+            total += pushed
+        return total
+
+    def _current_value(self) -> float:
+        return sum(self.flow[e] for e in self.adj[self.S] if e % 2 == 0)
+
+    # -----------------------------------------------------------------------
+    # 障害シナリオ（基準状態からの warm start）
+    # -----------------------------------------------------------------------
+    def evaluate(self, failed_nodes=(), failed_edges=(), with_cut: bool = False) -> dict:
+        """
+        停止拠点・停止ルートがある場合の最大流量（と最小カット）を返す。評価後は基準状態に戻る。
+
+        Returns: {"value": 最大流量, "cut": [(始点, 終点, 容量), ...]（with_cut のときのみ）}
+        """
+        self._journal = []
+        cap_changes: list = []
+        try:
+            pairs = {self.edge_index[tuple(e)] for e in failed_edges if tuple(e) in self.edge_index}
+            for n in failed_nodes:
+                if n in self.index:
+                    pairs.update(e & ~1 for e in self.adj[self.index[n]])
+
+            # 1. 停止した辺の流れを取り消し、両端の過不足を記録する
+            excess: dict = {}
+            for e in pairs:
+                f = self.flow[e]
+                if f > FLOW_EPS:
+                    u, v = self.head[e ^ 1], self.head[e]
+                    excess[u] = excess.get(u, 0.0) + f
+                    excess[v] = excess.get(v, 0.0) - f
+                    self._push(e, -f)
+                cap_changes.append((e, self.cap[e]))
+                self.cap[e] = 0.0
+            for x in (self.S, self.T):
+                excess.pop(x, None)
+
+            if excess:
+                self._rebalance(excess)
+            self._augment(self.S, self.T)
+            result = {"value": self._current_value()}
+            if with_cut:
+                result["cut"] = self._min_cut()
+            return result
+        finally:
+            for e, amount in reversed(self._journal):
+                self.flow[e]     -= amount
+                self.flow[e ^ 1] += amount
+            for e, c in reversed(cap_changes):
+                self.cap[e] = c
+            self._journal = None
+
+    def _rebalance(self, excess: dict) -> None:
+        """取り消しで生じた過不足を解消し、流れを実行可能な状態に戻す（流量は減ることがある）。"""
+        A, B = self._aux_src, self._aux_dst
+        added = []
+        for x, amount in excess.items():
+            if amount > FLOW_EPS:
+                added.append(self._add_edge(A, x, amount))
+            elif amount < -FLOW_EPS:
+                added.append(self._add_edge(x, B, -amount))
+        try:
+            # 2. 過剰 → 不足 へ付け替える
+            self._augment(A, B)
+            # 3. 残った過剰は総出発点へ、不足は総到着点から戻す（補助辺の残余容量が残量）
+            self._augment(A, self.S)
+            self._augment(self.T, B)
+        finally:
+            for e in reversed(added):
+                u, v = self.head[e + 1], self.head[e]
+                self.adj[u].pop()
+                self.adj[v].pop()
+            del self.head[self._n_edges:], self.cap[self._n_edges:], self.flow[self._n_edges:]
+            if self._journal is not None:
+                self._journal = [(e, a) for e, a in self._journal if e < self._n_edges]
+
+    # -----------------------------------------------------------------------
+    # 結果
+    # -----------------------------------------------------------------------
+    def _min_cut(self) -> list:
+        """現在の流れで総出発点から残余ネットワーク上で届く側と届かない側を分けるルート。"""
+        reach = [False] * self.n_nodes
+        reach[self.S] = True
+        queue = deque([self.S])
+        while queue:
+            x = queue.popleft()
+            for e in self.adj[x]:
+                y = self.head[e]
+                if not reach[y] and self.cap[e] - self.flow[e] > FLOW_EPS:
+                    reach[y] = True
+                    queue.append(y)
+        names = self.nodes
+        return [
+            (names[self.head[e ^ 1]], names[self.head[e]], self.cap[e])
+            for e in self.edge_index.values()
+            if reach[self.head[e ^ 1]] and not reach[self.head[e]] and self.cap[e] > 0
+        ]
+
+    def min_cut(self) -> pd.DataFrame:
+        """基準状態の最小カット（最大流量を制約しているルート）。"""
+        df = pd.DataFrame(self._min_cut(), columns=CUT_COLUMNS)
+        df = df.sort_values(["容量", "出発拠点", "到着拠点"], ascending=[False, True, True],
+                            kind="stable").reset_index(drop=True)
+        df.index += 1
+        return df
+
+    def edge_flows(self) -> pd.DataFrame:
+        """基準状態で流れているルートごとの流量と使用率（流量の多い順）。"""
+        rows = [
+            (u, v, self.flow[e], self.cap[e], self.flow[e] / self.cap[e] if self.cap[e] > 0 else 0.0)
+            for (u, v), e in self.edge_index.items()
+            if self.flow[e] > FLOW_EPS
+        ]
+        df = pd.DataFrame(rows, columns=FLOW_COLUMNS)
+        df = df.sort_values(["流量", "出発拠点", "到着拠点"], ascending=[False, True, True],
+                            kind="stable").reset_index(drop=True)
+        df.index += 1
+        return df
+
+
+# ---------------------------------------------------------------------------
+# ワーカー: 基準状態の流れは初期化時に1回だけ求める
+# ---------------------------------------------------------------------------
+_WORKER_STATE: dict = {}
+
+
+def _init_worker(G: nx.DiGraph, sources: list, sinks: list, capacity: str, default: float) -> None:
+    _WORKER_STATE["net"] = FlowNetwork(G, sources, sinks, capacity=capacity, default=default)
+
+
+def _evaluate_chunk(scenarios: list) -> list:
+    net = _WORKER_STATE["net"]
+    records = []
+    for failed_nodes, failed_edges in scenarios:
+        value = net.evaluate(failed_nodes, failed_edges)["value"]
+        label, kind = _scenario_label(failed_nodes, failed_edges)
+        records.append({
+            "障害対象": label,
+            "種別":     kind,
+            "最大流量": value,
+            "減少量":   net.value - value,
+            "減少率":   (net.value - value) / net.value if net.value > 0 else 0.0,
+        })
+    return records
+
+
+# ---------------------------------------------------------------------------
+# 容量の一括障害評価（並列・逐次出力）
+# ---------------------------------------------------------------------------
+def iter_capacity_sweep(
+    G: nx.DiGraph,
+    sources: list,
+    sinks: list,
+    scenarios: list,
+    capacity: str = "capacity",
+    default: float = DEFAULT_CAPACITY,
+    max_workers: int | None = None,
+    chunksize: int = 64,
+):
+    """
+    シナリオ群の最大流量を評価し、完了したチャンクごとに (records, 完了数, 経過秒) を返すジェネレータ。
+
+    各ワーカーは基準状態の最大流を1回だけ求め、シナリオごとにそこから warm start する。
+    max_workers=None で全コアを使用。1 のときはプロセスを起動せずに逐次実行する。
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    initargs = (G, sources, sinks, capacity, default)
+    chunks = [scenarios[i:i + chunksize] for i in range(0, len(scenarios), chunksize)]
+    start, done = time.perf_counter(), 0
+
+    if max_workers == 1 or len(chunks) <= 1:
+        _init_worker(*initargs)
+        for chunk in chunks:
+            records = _evaluate_chunk(chunk)
+            done   += len(chunk)
+            yield records, done, time.perf_counter() - start
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=initargs) as pool:
+        futures = {pool.submit(_evaluate_chunk, chunk): len(chunk) for chunk in chunks}
+        for fut in as_completed(futures):
+            done += futures[fut]
+            yield fut.result(), done, time.perf_counter() - start
+
+
+def rank_capacity_losses(records: list) -> pd.DataFrame:
+    """評価結果を最大流量の減少量が大きい順に並べる。"""
+    if not records:
+        return pd.DataFrame(columns=SWEEP_COLUMNS)
+    df = pd.DataFrame(records, columns=SWEEP_COLUMNS)
+    df = df.sort_values(["減少量", "障害対象"], ascending=[False, True], kind="stable").reset_index(drop=True)
+    df.index += 1
+    return df
@@ -0,0 +1,236 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from compact_graph import CompactGraph, scc_labels, simulate_failure_compact
+
+# ---------------------------------------------------------------------------
+# 定数: 結果表の列
+# ---------------------------------------------------------------------------
+MC_COLUMNS = [
+    "拠点", "停止確率", "孤立確率", "カスケード故障確率", "影響確率", "信頼区間（±）",
+]
+
+
+# ---------------------------------------------------------------------------
+# 停止確率の配列
+# ---------------------------------------------------------------------------
+def failure_probability_arrays(
+    cg: CompactGraph,
+    node_prob: float = 0.0,
+    edge_prob: float = 0.0,
+    node_overrides: dict | None = None,
+    edge_overrides: dict | None = None,
+) -> tuple:
+    """
+    拠点・ルートごとの停止確率を長さ V / E の配列にする。
+
+    node_prob / edge_prob は全体に一律の確率、overrides は {拠点名: 確率} / {(始点, 終点): 確率}
+    で個別に上書きする（気象・地震の被災確率など）。存在しない拠点・ルートは無視する。
+    """
+    p_node = np.full(cg.number_of_nodes(), float(node_prob))
+    p_edge = np.full(cg.number_of_edges(), float(edge_prob))
+    for name, p in (node_overrides or {}).items():
+        if name in cg.index:
+            p_node[cg.index[name]] = p
+    for edge, p in (edge_overrides or {}).items():
+        p_edge[cg.edge_ids([edge])] = p
+    return np.clip(p_node, 0.0, 1.0), np.clip(p_edge, 0.0, 1.0)
+
+
+def _wilson_half_width(hits: np.ndarray, n: int, z: float) -> np.ndarray:
+    """二項比率の Wilson 信頼区間の半幅（p=0 付近でも幅が 0 にならない）。"""
+    if n == 0:
+        return np.ones(len(hits))
+    p = hits / n
+    return z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+
+
+# ---------------------------------------------------------------------------
+# ワーカー: グラフと確率は初期化時に1回だけ受け取る
+# ---------------------------------------------------------------------------
+_WORKER_STATE: dict = {}
+
+
+def _init_worker(cg: CompactGraph, p_node, p_edge, labels_before, baseline, seed: int) -> None:
+    """contingency._init_worker と同じく、fork 起動では親プロセスのメモリをそのまま共有する。"""
+    _WORKER_STATE.update(cg=cg, p_node=p_node, p_edge=p_edge,
+                         labels_before=labels_before, baseline=baseline, seed=seed)
+
+
+def _run_batch(task: tuple) -> dict:
+    """
+    1バッチ分の試行を行い、拠点ごとの発生回数と試行ごとの分裂数を返す。
+
+    停止の有無はバッチ全体を (試行数 × 確率が正の要素数) の乱数行列1つで一括抽選する。
+    乱数は (seed, バッチ番号) から作るため、並列数や完了順によらず結果が再現する。
+    """
+    batch_index, size = task
+    cg       = _WORKER_STATE["cg"]
+    p_node   = _WORKER_STATE["p_node"]
+    p_edge   = _WORKER_STATE["p_edge"]
+    labels   = _WORKER_STATE["labels_before"]
+    base_isolated, base_cascade = _WORKER_STATE["baseline"]
+    rng      = np.random.default_rng([_WORKER_STATE["seed"], batch_index])
+
+    node_ids  = np.flatnonzero(p_node > 0)
+    edge_ids  = np.flatnonzero(p_edge > 0)
+    node_fail = rng.random((size, len(node_ids))) < p_node[node_ids]
+    edge_fail = rng.random((size, len(edge_ids))) < p_edge[edge_ids]
+
+    n = cg.number_of_nodes()
+    out = {
+        "trials":   size,
+        "failed":   np.zeros(n, dtype=np.int64),
+        "isolated": np.zeros(n, dtype=np.int64),
+        "cascade":  np.zeros(n, dtype=np.int64),
+        "affected": np.zeros(n, dtype=np.int64),
+        "broken":   np.zeros(size, dtype=np.int64),
+        "n_affected": np.zeros(size, dtype=np.int64),
+    }
+    any_failure = node_fail.any(axis=1) | edge_fail.any(axis=1)
+    for t in np.flatnonzero(any_failure):      # 何も止まらない試行は影響なしなので評価を省く
+        node_alive = np.ones(n, dtype=bool)
+        node_alive[node_ids[node_fail[t]]] = False
+        edge_alive = node_alive[cg.tails] & node_alive[cg.indices]
+        edge_alive[edge_ids[edge_fail[t]]] = False
+
+        result   = simulate_failure_compact(cg, node_alive, edge_alive, labels)
+        isolated = result["isolated"] & ~base_isolated
+        cascade  = result["cascade"] & ~base_cascade
+        affected = ~node_alive | isolated | cascade
+
+        out["failed"]   += ~node_alive
+        out["isolated"] += isolated
+        out["cascade"]  += cascade
+        out["affected"] += affected
+        out["broken"][t]     = result["broken_sccs"]
+        out["n_affected"][t] = int(affected.sum())
+    return out
+
+
+# ---------------------------------------------------------------------------
+# モンテカルロ障害評価（並列・逐次出力・早期終了）
+# ---------------------------------------------------------------------------
+def iter_monte_carlo(
+    cg: CompactGraph,
+    p_node: np.ndarray,
+    p_edge: np.ndarray,
+    max_trials: int = 20_000,
+    batch_size: int = 250,
+    tol: float = 0.01,
+    confidence: float = 0.95,
+    min_trials: int = 1_000,
+    max_workers: int | None = None,
+    seed: int = 0,
+):
+    """
+    停止確率に従って障害を無作為に発生させる試行を繰り返し、累積結果を逐次返すジェネレータ。
+
+    孤立・カスケード故障は障害なしの状態との差分（新たに発生した分）を数える。
+    全拠点の影響確率の信頼区間の半幅が tol 以下になった時点（min_trials 試行以降）で打ち切る。
+    並列時はワーカー数ぶんのバッチを1組として評価し、1組ごとに収束を判定して結果を返す。
+
+    返す dict: trials / failed / isolated / cascade / affected（拠点ごとの回数）、
+              broken / n_affected（試行ごとの分裂数・影響拠点数）、elapsed / half_width / converged
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    n = cg.number_of_nodes()
+
+    labels_before = scc_labels(cg)
+    all_nodes = np.ones(n, dtype=bool)
+    all_edges = np.ones(cg.number_of_edges(), dtype=bool)
+    base      = simulate_failure_compact(cg, all_nodes, all_edges, labels_before)
+    initargs  = (cg, p_node, p_edge, labels_before, (base["isolated"], base["cascade"]), seed)
+
+    tasks = [(i, min(batch_size, max_trials - s)) for i, s in enumerate(range(0, max_trials, batch_size))]
+    state = {
+        "trials": 0,
+        "failed":   np.zeros(n, dtype=np.int64),
+        "isolated": np.zeros(n, dtype=np.int64),
+        "cascade":  np.zeros(n, dtype=np.int64),
+        "affected": np.zeros(n, dtype=np.int64),
+        "broken":   [],
+        "n_affected": [],
+        "elapsed": 0.0, "half_width": 1.0, "converged": False, "z": z,
+    }
+    start = time.perf_counter()
+
+    def _accumulate(results):
+        for r in results:
+            state["trials"] += r["trials"]
+            for key in ("failed", "isolated", "cascade", "affected"):
+                state[key] += r[key]
+            state["broken"].append(r["broken"])
+            state["n_affected"].append(r["n_affected"])
+        state["elapsed"]    = time.perf_counter() - start
+        state["half_width"] = float(_wilson_half_width(state["affected"], state["trials"], z).max()) if n else 0.0
+        state["converged"]  = state["trials"] >= min_trials and state["half_width"] <= tol
+
+    if max_workers == 1 or len(tasks) <= 1:
+        _init_worker(*initargs)
+        for task in tasks:
+            _accumulate([_run_batch(task)])
+            yield state
+            if state["converged"]:
+                return
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=initargs) as pool:
+        for i in range(0, len(tasks), max_workers):
+            _accumulate(pool.map(_run_batch, tasks[i:i + max_workers]))
+            yield state
+            if state["converged"]:
+                return
+
+
+def summarize_monte_carlo(cg: CompactGraph, state: dict) -> tuple:
+    """
+    iter_monte_carlo の最終状態を表にまとめる。
+
+    Returns:
+      df_nodes  : 拠点ごとの推定確率（影響確率の高い順）
+      df_broken : 1試行あたりの分裂した循環ルート数の分布
+      summary   : 試行回数・試行/秒・収束したか などの集計
+    """
+    n_trials = max(state["trials"], 1)
+    half = _wilson_half_width(state["affected"], state["trials"], state["z"])
+    df_nodes = pd.DataFrame({
+        "拠点":               cg.nodes,
+        "停止確率":           state["failed"] / n_trials,
+        "孤立確率":           state["isolated"] / n_trials,
+        "カスケード故障確率": state["cascade"] / n_trials,
+        "影響確率":           state["affected"] / n_trials,
+        "信頼区間（±）":      half,
+    }, columns=MC_COLUMNS)
+    df_nodes = df_nodes.sort_values(
+        ["影響確率", "拠点"], ascending=[False, True], kind="stable"
+    ).reset_index(drop=True)
+    df_nodes.index += 1
+
+    broken = np.concatenate(state["broken"]) if state["broken"] else np.zeros(0, dtype=np.int64)
+    n_affected = (np.concatenate(state["n_affected"]) if state["n_affected"]
+                  else np.zeros(0, dtype=np.int64))
+    counts = np.bincount(broken) if len(broken) else np.zeros(1, dtype=np.int64)
+    df_broken = pd.DataFrame({
+        "分裂した循環ルート数": np.arange(len(counts)),
+        "試行数":               counts,
+        "割合":                 counts / n_trials,
+    })
+
+    summary = {
+        "試行回数":           state["trials"],
+        "経過秒":             state["elapsed"],
+        "試行/秒":            state["trials"] / state["elapsed"] if state["elapsed"] > 0 else 0.0,
+        "最大信頼区間（±）":  state["half_width"],
+        "収束":               state["converged"],
+        "平均影響拠点数":     float(n_affected.mean()) if len(n_affected) else 0.0,
+        "循環ルート分裂確率": float((broken > 0).mean()) if len(broken) else 0.0,
+    }
+    return df_nodes, df_broken, summary
@@ -0,0 +1,227 @@
+import csv
+import json
+import sys
+import time
+
+import networkx as nx
+
+from whatif import WhatIfSession
+
+# ---------------------------------------------------------------------------
+# 設定: イベントの形式
+# ---------------------------------------------------------------------------
+# 1イベント = 1行。JSONL は1行1オブジェクト、CSV は先頭行が列名。
+#   {"time": "2024-04-01T09:00:00", "status": "down", "node": "御殿場"}
+#   {"time": "2024-04-01T09:05:00", "status": "up",   "from": "東京", "to": "横浜"}
+#   time,status,node,from,to
+#   2024-04-01T09:00:00,down,御殿場,,
+EVENT_STATUS = {
+    "down": True, "fail": True, "停止": True,
+    "up": False, "restore": False, "復旧": False,
+}
+NORMAL_LABEL = "正常"
+TAIL_POLL_SECONDS = 0.2
+
+
+# ---------------------------------------------------------------------------
+# イベントの読み込み
+# ---------------------------------------------------------------------------
+def tail_lines(path: str, follow: bool = False, poll_interval: float = TAIL_POLL_SECONDS):
+    """
+    ファイル（"-" で標準入力）を1行ずつ返すジェネレータ。
+
+    follow=True のときは末尾に達しても終了せず、追記を poll_interval 秒ごとに待つ（tail -f 相当）。
+    書き込み途中の行（改行がまだない行）は改行が届くまで保留する。
+    """
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+    pending = ""
+    try:
+        while True:
+            line = f.readline()
+            if line:
+                pending += line
+                if pending.endswith("\n"):
+                    yield pending.rstrip("\r\n")
+                    pending = ""
+                continue
+            if not follow:
+                break
+            time.sleep(poll_interval)
+        if pending:
+            yield pending.rstrip("\r\n")
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def parse_event(record: dict) -> dict | None:
+    """
+    1件の記録を {"time", "down", "node", "edge"} に正規化する。
+    状態が不明、または対象（node か from/to）がない記録は None。
+    """
+    status = str(record.get("status") or "").strip().lower()
+    if status not in EVENT_STATUS:
+        return None
+    node = record.get("node")
+    u, v = record.get("from"), record.get("to")
+    if isinstance(record.get("edge"), (list, tuple)) and len(record["edge"]) == 2:
+        u, v = record["edge"]
+    if node not in (None, ""):
+        return {"time": record.get("time"), "down": EVENT_STATUS[status], "node": str(node), "edge": None}
+    if u not in (None, "") and v not in (None, ""):
+        return {"time": record.get("time"), "down": EVENT_STATUS[status], "node": None,
+                "edge": (str(u), str(v))}
+    return None
+
+
+def read_events(lines, fmt: str = "jsonl", errors: dict | None = None):
+    """
+    行のイテラブル（tail_lines など）からイベントを順に返すジェネレータ。
+    読めない行は捨てて errors["不正な行"] に数える。
+    """
+    errors = errors if errors is not None else {}
+    errors.setdefault("不正な行", 0)
+    if fmt == "csv":
+        records = csv.DictReader(line for line in lines if line.strip())
+    else:
+        records = _json_records(lines, errors)
+    for record in records:
+        event = parse_event(record)
+        if event is None:
+            errors["不正な行"] += 1
+            continue
+        yield event
+
+
+def _json_records(lines, errors: dict):
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            errors["不正な行"] += 1
+            continue
+        if isinstance(record, dict):
+            yield record
+        else:
+            errors["不正な行"] += 1
+
+
+def event_format(path: str) -> str:
+    """拡張子からイベントの形式を決める（標準入力・不明な拡張子は JSONL）。"""
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+# ---------------------------------------------------------------------------
+# 停止イベントの逐次処理
+# ---------------------------------------------------------------------------
+class OutageStreamProcessor:
+    """
+    停止・復旧イベントを1件ずつ WhatIfSession に反映し、状態が変わった拠点・循環ルートを通知する。
+
+    各イベントの処理量は切り替えた要素の周辺（次数・該当SCC）に比例し、
+    グラフ全体の再計算は行わない。保持するのは現在の停止状態と拠点・SCC ごとの状態だけで、
+    通知はジェネレータで順に返すため、イベント数によらずメモリ使用量は一定。
+    """
+
+    def __init__(self, G: nx.DiGraph, scc_index: tuple | None = None):
+        self.session = WhatIfSession(G, scc_index=scc_index)
+        self.stats = {"イベント数": 0, "反映数": 0, "無視": 0, "通知数": 0, "経過秒": 0.0}
+
+        # 障害なしの時点で既に孤立している拠点（ネットワークの端）もあるため、初期状態を記録しておく
+        self._status = {}
+        for n in G.nodes():
+            s = self.session.node_status(n)
+            if s is not None:
+                self._status[n] = s
+        self._broken: dict = {}
+        self.session.pop_changes()
+
+    def apply(self, event: dict) -> list:
+        """1件のイベントを反映し、通知（状態が変わった拠点・循環ルート）のリストを返す。"""
+        start = time.perf_counter()
+        session = self.session
+        self.stats["イベント数"] += 1
+
+        if event["node"] is not None:
+            n = event["node"]
+            target = f"拠点 {n}"
+            known = n in session.G
+            active = n in session.failed_nodes
+            if known and event["down"] != active:
+                (session.fail_node if event["down"] else session.restore_node)(n)
+        else:
+            u, v = event["edge"]
+            target = f"ルート {u} → {v}"
+            known = session.G.has_edge(u, v)
+            active = (u, v) in session.failed_edges
+            if known and event["down"] != active:
+                (session.fail_edge if event["down"] else session.restore_edge)(u, v)
+
+        if not known or event["down"] == active:
+            # 存在しない対象・既に同じ状態の対象（重複イベント）は何もしない
+            self.stats["無視"] += 1
+            self.stats["経過秒"] += time.perf_counter() - start
+            return []
+        self.stats["反映数"] += 1
+
+        label = f"{'停止' if event['down'] else '復旧'} {target}"
+        notices = []
+        nodes, sccs = session.pop_changes()
+        for n in sorted(nodes, key=str):
+            new = session.node_status(n)
+            old = self._status.get(n)
+            if new == old:
+                continue
+            if new is None:
+                self._status.pop(n, None)
+            else:
+                self._status[n] = new
+            notice = {
+                "時刻": event["time"], "イベント": label, "種類": "拠点",
+                "対象": n, "変化前": old or NORMAL_LABEL, "変化後": new or NORMAL_LABEL,
+            }
+            if new == "カスケード故障":
+                notice["原因となった孤立拠点"] = list(session.cascade_causes(n))
+            notices.append(notice)
+        for i in sorted(sccs):
+            new = session.split_count(i)
+            old = self._broken.get(i, 0)
+            if new == old:
+                continue
+            if new:
+                self._broken[i] = new
+            else:
+                self._broken.pop(i, None)
+            size = len(session.large_sccs[i])
+            notices.append({
+                "時刻": event["time"], "イベント": label, "種類": "循環ルート",
+                "対象": f"強連結成分 {i + 1}（{size}拠点）",
+                "変化前": f"分裂（{old}グループ）" if old else "維持",
+                "変化後": f"分裂（{new}グループ）" if new else "維持",
+            })
+
+        self.stats["通知数"] += len(notices)
+        self.stats["経過秒"] += time.perf_counter() - start
+        return notices
+
+    def process(self, events):
+        """イベントのイテラブルを順に反映し、通知を1件ずつ返すジェネレータ。"""
+        for event in events:
+            yield from self.apply(event)
+
+    def summary(self) -> dict:
+        """処理件数・処理速度と現在の影響範囲の集計。"""
+        counts: dict = {}
+        for s in self._status.values():
+            counts[s] = counts.get(s, 0) + 1
+        elapsed = self.stats["経過秒"]
+        return {
+            **self.stats,
+            "イベント/秒":       self.stats["イベント数"] / elapsed if elapsed > 0 else 0.0,
+            "停止拠点数":        len(self.session.failed_nodes),
+            "停止ルート数":      len(self.session.failed_edges),
+            "状態別拠点数":      counts,
+            "分裂中の循環ルート数": len(self._broken),
+        }
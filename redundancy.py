@@ -0,0 +1,382 @@
+import heapq
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from algorithms import (
+    _bridges_from_dominators,
+    _dominator_intervals,
+    _dominator_tree,
+    _natural_key,
+    _scc_local_adjacency,
+)
+from layout import GEO_KEYS
+
+# ---------------------------------------------------------------------------
+# 設定
+# ---------------------------------------------------------------------------
+DEFAULT_NEIGHBORS = 5        # 距離ルールで候補にする近傍拠点数（拠点ごと）
+KM_PER_DEGREE     = 111.0    # 経緯度 → km の換算（正距円筒図法の近似）
+PLAN_COLUMNS = [
+    "順位", "出発拠点", "到着拠点", "コスト", "解消する強橋数", "統合する拠点数",
+    "累計コスト", "残る強橋数", "強連結成分数",
+]
+
+
+# ---------------------------------------------------------------------------
+# 追加ルート候補の作成
+# ---------------------------------------------------------------------------
+def candidates_from_graph(C: nx.DiGraph) -> list:
+    """
+    候補ルート表（load_graph_from_file で読んだ from / to / cost）を (出発, 到着, コスト) のリストにする。
+    """
+    return [(u, v, float(d.get("weight", 1.0))) for u, v, d in C.edges(data=True)]
+
+
+def _coordinates(G: nx.DiGraph) -> np.ndarray | None:
+    """全拠点が座標を持てば km（経緯度）または座標の単位（x/y）の平面座標を返す。"""
+    for kx, ky in GEO_KEYS:
+        if len(G) == 0 or not all(kx in d and ky in d for _, d in G.nodes(data=True)):
+            continue
+        xy = np.array([[float(d[kx]), float(d[ky])] for _, d in G.nodes(data=True)])
+        if kx == "lon":
+            xy[:, 0] *= np.cos(np.radians(xy[:, 1].mean()))
+            xy *= KM_PER_DEGREE
+        return xy
+    return None
+
+
+def _nearest_by_route(G: nx.DiGraph, k: int) -> dict:
+    """
+    座標がない場合の近傍: ルートを向きを無視した重み付きグラフとみなし、
+    拠点ごとに Dijkstra を「相互に直結していない拠点」が k 個確定した時点で打ち切る。
+    """
+    adj: dict = {n: {} for n in G.nodes()}
+    for u, v, d in G.edges(data=True):
+        if u == v:
+            continue
+        w = float(d.get("weight", 1.0))
+        adj[u][v] = min(w, adj[u].get(v, w))
+        adj[v][u] = min(w, adj[v].get(u, w))
+
+    nearest: dict = {}
+    for s in G.nodes():
+        dist  = {s: 0.0}
+        found = []
+        heap  = [(0.0, 0, s)]
+        tie   = 1
+        while heap and len(found) < k:
+            d, _, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if u != s and not (G.has_edge(s, u) and G.has_edge(u, s)):
+                found.append((u, d))
+            for v, w in adj[u].items():
+                nd = d + w
+                if nd < dist.get(v, np.inf):
+                    dist[v] = nd
+                    heapq.heappush(heap, (nd, tie, v))
+                    tie += 1
+        nearest[s] = found
+    return nearest
+
+
+def distance_candidates(G: nx.DiGraph, k: int = DEFAULT_NEIGHBORS, cost_per_unit: float = 1.0) -> list:
+    """
+    距離ルールで追加ルート候補を作る。拠点ごとに近い k 拠点との間で、まだ存在しない向きのルートを候補にする。
+
+    全拠点が座標（lon/lat または x/y）を持てば直線距離（経緯度は km）を、
+    持たなければ既存ルート上の最短距離（向きは無視）をコストの基準にする。
+    コスト = 距離 × cost_per_unit。
+    """
+    nodes = list(G.nodes())
+    xy = _coordinates(G)
+    if xy is not None:
+        from scipy.spatial import cKDTree
+
+        kk = min(k + 1, len(nodes))
+        dist, idx = cKDTree(xy).query(xy, k=kk)
+        dist, idx = np.atleast_2d(dist), np.atleast_2d(idx)
+        nearest = {
+            nodes[i]: [(nodes[j], d) for j, d in zip(idx[i].tolist(), dist[i].tolist()) if j != i]
+            for i in range(len(nodes))
+        }
+    else:
+        nearest = _nearest_by_route(G, k)
+
+    best: dict = {}
+    for a, found in nearest.items():
+        for b, d in found:
+            for u, v in ((a, b), (b, a)):
+                if not G.has_edge(u, v):
+                    cost = float(d) * cost_per_unit
+                    best[(u, v)] = min(cost, best.get((u, v), cost))
+    return [(u, v, c) for (u, v), c in best.items()]
+
+
+# ---------------------------------------------------------------------------
+# 内部: 強連結成分ごとの支配木情報
+# ---------------------------------------------------------------------------
+class _FlowBridges:
+    """
+    フローグラフ G(0)（または逆グラフ）の橋と、追加辺で橋が迂回されるかの判定表。
+
+    橋 (x, y) を除くと根から届かなくなるのは y の支配木の部分木 D(y) だけで、
+    D(y) へ外から入る辺は (x, y) しかない。したがって辺 (a, b) の追加で橋が迂回される
+    ⇔ a ∉ D(y) かつ b が D(y) の内部だけを通って y に戻れる。
+    後者を満たす b の集合 R(y) を y から D(y) 内で逆向きに辿って前計算し、
+    hits[b] に (pre[y], post[y], 橋ID) として持つ。候補1本の判定は O(|hits[b]|)。
+    """
+
+    def __init__(self, succ: list, pred: list):
+        idom = _dominator_tree(succ, pred, 0)
+        self.pre, self.post = _dominator_intervals(idom, 0)
+        self.bridges = _bridges_from_dominators(pred, idom, self.pre, self.post, 0)
+        self.hits: list = [[] for _ in succ]
+        for k, (_, y) in enumerate(self.bridges):
+            lo, hi = self.pre[y], self.post[y]
+            seen, stack = {y}, [y]
+            while stack:
+                w = stack.pop()
+                self.hits[w].append((lo, hi, k))
+                for p in pred[w]:
+                    if p not in seen and lo <= self.pre[p] and self.post[p] <= hi:
+                        seen.add(p)
+                        stack.append(p)
+
+    def bypassed(self, tail: int, head: int):
+        """辺 tail → head を追加したときに迂回される橋のIDを返す。"""
+        p, q = self.pre[tail], self.post[tail]
+        for lo, hi, k in self.hits[head]:
+            if not (lo <= p and q <= hi):
+                yield k
+
+
+class _Component:
+    """サイズ2以上の強連結成分1つ分の強橋と、成分内の追加辺による解消数の判定。"""
+
+    def __init__(self, H: nx.DiGraph, members):
+        self.nodes, succ, pred = _scc_local_adjacency(H, members)
+        self.index = {n: i for i, n in enumerate(self.nodes)}
+        self.fwd = _FlowBridges(succ, pred)
+        self.rev = _FlowBridges(pred, succ)
+
+        # 強橋 = G(r) の橋 ∪ 逆グラフ G^R(r) の橋。needs はその辺が橋になっているフローグラフの数
+        keys: dict = {}
+        self.fwd_keys = [keys.setdefault((x, y), len(keys)) for x, y in self.fwd.bridges]
+        self.rev_keys = [keys.setdefault((y, x), len(keys)) for x, y in self.rev.bridges]
+        self.needs = np.bincount(np.asarray(self.fwd_keys + self.rev_keys, dtype=np.int64),
+                                 minlength=len(keys))
+        self.bridges = [(self.nodes[x], self.nodes[y]) for x, y in keys]
+
+    def eliminated(self, a, b) -> int:
+        """
+        成分内に辺 a → b を追加したときに強橋でなくなる本数。
+        強橋が解消される ⇔ 橋になっているすべてのフローグラフで迂回される。
+        """
+        ia, ib = self.index[a], self.index[b]
+        count: dict = {}
+        for k in self.fwd.bypassed(ia, ib):
+            key = self.fwd_keys[k]
+            count[key] = count.get(key, 0) + 1
+        # 逆グラフでは追加辺の向きも逆（b → a）になる
+        for k in self.rev.bypassed(ib, ia):
+            key = self.rev_keys[k]
+            count[key] = count.get(key, 0) + 1
+        return sum(1 for key, c in count.items() if c == self.needs[key])
+
+
+# ---------------------------------------------------------------------------
+# 冗長化プランナー
+# ---------------------------------------------------------------------------
+class RedundancyPlanner:
+    """
+    追加ルート候補から、単一障害点を減らす効果がコストあたり最大のものを貪欲に選ぶ。
+
+    候補の効果は次の2つを重み付きで合計する（コストで割った値の大きい順に採用）。
+      - 解消する強橋数 : 同じ強連結成分内の追加。支配木から前計算した判定表で O(該当する橋の数)
+      - 統合する拠点数 : 別の成分間の追加 X → Y。縮約DAGで Y から到達でき X へ到達できる成分が
+                         1つの成分にまとまる（Eswaran–Tarjan の強連結化と同じ考え方）。
+                         到達集合をビット集合で持ち、候補1本は AND 1回で評価する
+    候補ごとに find_strong_bridges を呼び直すことはせず、採用後は変化した成分の支配木と
+    縮約DAGの到達集合だけを作り直して、影響を受ける候補だけを再評価する。
+    統合で新たに生じる強橋は採用後の再計算で「残る強橋数」に反映される。
+    """
+
+    def __init__(self, G: nx.DiGraph, candidates, bridge_weight: float = 1.0, merge_weight: float = 1.0):
+        self.H = nx.DiGraph()
+        self.H.add_nodes_from(G.nodes())
+        self.H.add_edges_from(G.edges())
+        self.bridge_weight = bridge_weight
+        self.merge_weight  = merge_weight
+
+        best: dict = {}
+        for u, v, cost in candidates:
+            if u == v or u not in G or v not in G or G.has_edge(u, v):
+                continue
+            cost = max(float(cost), 0.0)
+            best[(u, v)] = min(cost, best.get((u, v), cost))
+        self.candidates = sorted(((u, v, c) for (u, v), c in best.items()),
+                                 key=lambda t: (_natural_key(t[0]), _natural_key(t[1])))
+
+        self._components: dict = {}
+        self._rebuild()
+
+    # -- 状態の再構築 -----------------------------------------------------------
+    def _rebuild(self) -> None:
+        """強連結成分・縮約DAGの到達集合を作り直し、全候補を評価し直す（成分が統合されたとき）。"""
+        C = nx.condensation(self.H)
+        self._comp_of = C.graph["mapping"]
+        members = [C.nodes[c]["members"] for c in range(len(C))]
+        self._sizes = np.array([len(m) for m in members], dtype=np.int64)
+
+        # 変化していない成分の支配木情報は使い回す
+        old, self._components = self._components, {}
+        for c, m in enumerate(members):
+            if len(m) > 1:
+                key = frozenset(m)
+                self._components[key] = old.get(key) or _Component(self.H, m)
+        self._comp_data = {
+            c: self._components[frozenset(m)] for c, m in enumerate(members) if len(m) > 1
+        }
+
+        # 到達集合のビットは「候補の到着側から到達でき、候補の出発側へ到達できる成分」にだけ振る
+        heads = {self._comp_of[v] for u, v, _ in self.candidates if self._comp_of[u] != self._comp_of[v]}
+        tails = {self._comp_of[u] for u, v, _ in self.candidates if self._comp_of[u] != self._comp_of[v]}
+        down = set(heads).union(*(nx.descendants(C, c) for c in heads)) if heads else set()
+        up   = set(tails).union(*(nx.ancestors(C, c) for c in tails)) if tails else set()
+        relevant = sorted(down & up)
+        self._bit = {c: j for j, c in enumerate(relevant)}
+        self._bit_sizes = self._sizes[relevant] if relevant else np.empty(0, dtype=np.int64)
+
+        topo = list(nx.topological_sort(C))
+        self._reach, self._coreach = {}, {}
+        for c in reversed(topo):
+            r = 1 << self._bit[c] if c in self._bit else 0
+            for s in C.successors(c):
+                r |= self._reach[s]
+            self._reach[c] = r
+        for c in topo:
+            r = 1 << self._bit[c] if c in self._bit else 0
+            for p in C.predecessors(c):
+                r |= self._coreach[p]
+            self._coreach[c] = r
+
+        self._scores = [self._score(i) for i in range(len(self.candidates))]
+
+    def _merged_nodes(self, cu: int, cv: int) -> int:
+        """成分 cu → cv の辺で1つにまとまる成分の拠点数（最大の成分以外）。"""
+        m = self._reach[cv] & self._coreach[cu]
+        if not m:
+            return 0
+        n = len(self._bit_sizes)
+        bits = np.unpackbits(np.frombuffer(m.to_bytes((n + 7) // 8, "little"), dtype=np.uint8),
+                             bitorder="little")[:n].astype(bool)
+        sizes = self._bit_sizes[bits]
+        return int(sizes.sum() - sizes.max())
+
+    def _score(self, i: int) -> tuple:
+        """候補 i の (解消する強橋数, 統合する拠点数)。"""
+        u, v, _ = self.candidates[i]
+        cu, cv = self._comp_of[u], self._comp_of[v]
+        if cu == cv:
+            comp = self._comp_data.get(cu)
+            return (comp.eliminated(u, v) if comp else 0), 0
+        return 0, self._merged_nodes(cu, cv)
+
+    # -- 公開API ----------------------------------------------------------------
+    def bridge_count(self) -> int:
+        return sum(len(c.bridges) for c in self._comp_data.values())
+
+    def bridges(self) -> list:
+        return [e for c in self._comp_data.values() for e in c.bridges]
+
+    def scc_count(self) -> int:
+        return len(self._sizes)
+
+    def gain(self, i: int) -> float:
+        bridges, merged = self._scores[i]
+        return self.bridge_weight * bridges + self.merge_weight * merged
+
+    def add(self, i: int) -> None:
+        """候補 i を採用してネットワークに加え、影響を受ける候補だけを評価し直す。"""
+        u, v, _ = self.candidates[i]
+        cu, cv = self._comp_of[u], self._comp_of[v]
+        self.H.add_edge(u, v)
+        if cu != cv and self._scores[i][1] > 0:
+            self._rebuild()
+            return
+        if cu == cv and cu in self._comp_data:
+            m = self._comp_data[cu].nodes
+            comp = _Component(self.H, m)
+            self._components[frozenset(m)] = comp
+            self._comp_data[cu] = comp
+            for j, (a, b, _) in enumerate(self.candidates):
+                if self._comp_of[a] == cu and self._comp_of[b] == cu:
+                    self._scores[j] = self._score(j)
+
+    def plan(self, budget: float | None = None, max_additions: int | None = None):
+        """
+        効果 / コスト の大きい候補から順に採用するジェネレータ。採用ごとに計画表の1行を返す。
+        効果のある候補がなくなるか、予算・本数の上限に達したら終了する。
+        """
+        spent = 0.0
+        used: set = set()
+        rank = 0
+        while max_additions is None or rank < max_additions:
+            best, best_key = None, None
+            for i, (u, v, cost) in enumerate(self.candidates):
+                if i in used:
+                    continue
+                g = self.gain(i)
+                if g <= 0 or (budget is not None and spent + cost > budget):
+                    continue
+                key = (g / cost if cost > 0 else np.inf, g, -cost)
+                if best_key is None or key > best_key:
+                    best, best_key = i, key
+            if best is None:
+                return
+            u, v, cost = self.candidates[best]
+            bridges, merged = self._scores[best]
+            used.add(best)
+            self.add(best)
+            spent += cost
+            rank += 1
+            yield {
+                "順位": rank, "出発拠点": u, "到着拠点": v, "コスト": cost,
+                "解消する強橋数": bridges, "統合する拠点数": merged,
+                "累計コスト": spent, "残る強橋数": self.bridge_count(),
+                "強連結成分数": self.scc_count(),
+            }
+
+
+def plan_redundancy(
+    G: nx.DiGraph,
+    candidates,
+    budget: float | None = None,
+    max_additions: int | None = None,
+    bridge_weight: float = 1.0,
+    merge_weight: float = 1.0,
+) -> tuple:
+    """
+    追加ルートの計画を作る。
+
+    Returns:
+      (plan, summary)  plan は PLAN_COLUMNS の DataFrame、
+                       summary = {"候補数", "強橋数（追加前）", "強橋数（追加後）",
+                                  "強連結成分数（追加前）", "強連結成分数（追加後）", "追加コスト合計"}
+    """
+    planner = RedundancyPlanner(G, candidates, bridge_weight=bridge_weight, merge_weight=merge_weight)
+    before = (planner.bridge_count(), planner.scc_count())
+    rows = list(planner.plan(budget=budget, max_additions=max_additions))
+    plan = pd.DataFrame(rows, columns=PLAN_COLUMNS)
+    summary = {
+        "候補数":                 len(planner.candidates),
+        "強橋数（追加前）":       before[0],
+        "強橋数（追加後）":       planner.bridge_count(),
+        "強連結成分数（追加前）": before[1],
+        "強連結成分数（追加後）": planner.scc_count(),
+        "追加コスト合計":         float(plan["コスト"].sum()) if len(plan) else 0.0,
+    }
+    return plan, summary
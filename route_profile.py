@@ -0,0 +1,214 @@
+import heapq
+import math
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy.sparse.csgraph import dijkstra
+
+from compact_graph import CompactGraph
+from instrumentation import instrumented
+
+# ---------------------------------------------------------------------------
+# 設定
+# ---------------------------------------------------------------------------
+PROFILE_COLUMNS = ["区間", "停止ルート", "区間コスト", "障害後コスト", "増加コスト", "増加率",
+                   "分岐拠点", "合流拠点", "迂回経路"]
+NO_DETOUR = "迂回なし"
+
+
+# ---------------------------------------------------------------------------
+# 置換経路（最短経路上の各ルートが止まったときの迂回）
+# ---------------------------------------------------------------------------
+class ReplacementPaths:
+    """
+    出発拠点 s → 到着拠点 t の最短経路 P = p0 → p1 → … → pk について、
+    P 上のルート e_i = (p_i, p_i+1) が1本止まったときの最短迂回をまとめて求める。
+
+    最短経路木を2回だけ作る（scipy の Dijkstra）:
+      - s からの順方向木: 距離 d_s と、各拠点が P のどこで木から分かれるか（分岐位置 b）
+      - t への逆方向木: 距離 d_t（迂回探索の下界＝A* のヒューリスティック）
+    e_i が止まっても、分岐位置 b(v) ≤ i の拠点（e_i を通らずに木で届く）の距離は d_s のまま。
+    したがって迂回は「b(u) ≤ i < b(v) の横断ルート (u, v) から b ≥ i+1 の拠点だけを通って t へ」
+    に限られ、横断ルートを d_s(u) + w + d_t(v) の小さい順に与えた A* で局所的に求まる。
+    横断ルートは区間 [b(u), b(v)-1] ごとに区間木へ振り分けておき、各 i では
+    その葉の祖先にあるリストだけを併合して取り出す。
+
+    無向グラフ向けの Malik–Mittal–Gupta 法（横断辺の最小値だけで決まる）は有向グラフでは
+    厳密にならないため、横断ルートを起点にした局所探索で厳密値を求める。
+    k 回の停止ごとに Dijkstra を2回ずつ走らせる analyze_rerouting_cost と同じ値になる。
+    """
+
+    @instrumented("ReplacementPaths")
+    def __init__(self, G: nx.DiGraph, source, target, weight: str = "weight"):
+        if source not in G or target not in G:
+            raise ValueError("出発拠点と到着拠点はネットワーク内の拠点を指定してください。")
+        if source == target:
+            raise ValueError("出発拠点と到着拠点には別の拠点を指定してください。")
+        cg = CompactGraph.from_networkx(G, weight=weight)
+        self.nodes = cg.nodes
+        s, t = cg.index[source], cg.index[target]
+        csr = cg.to_csr()
+
+        d_s, pred = dijkstra(csr, indices=s, return_predecessors=True)
+        if not np.isfinite(d_s[t]):
+            raise ValueError(f"{source} から {target} へ到達できる経路がありません。")
+        d_t = dijkstra(csr.T.tocsr(), indices=t)
+
+        path = [t]
+        while path[-1] != s:
+            path.append(int(pred[path[-1]]))
+        path.reverse()
+        self.path = path
+        self.cost = float(d_s[t])
+        self._d_s, self._d_t, self._pred = d_s, d_t, pred
+
+        # 分岐位置 b(v): s からの木で v の祖先となる P 上の拠点のうち最も t 側の位置（到達不能は -1）
+        n = len(self.nodes)
+        branch = np.full(n, -1, dtype=np.int64)
+        branch[path] = np.arange(len(path))
+        anc = pred.astype(np.int64)
+        todo = np.flatnonzero((branch < 0) & (anc >= 0))
+        while len(todo):                         # ポインタジャンプ（木の深さの対数回）
+            up = anc[todo]
+            known = branch[up] >= 0
+            branch[todo[known]] = branch[up[known]]
+            todo = todo[~known]
+            anc[todo] = anc[anc[todo]]
+        self._branch = branch
+
+        # 横断ルート: b(u) < b(v) で t へ到達でき、P 上のルートでないもの
+        k = len(path) - 1
+        tails, heads, w = cg.tails.astype(np.int64), cg.indices.astype(np.int64), cg.weights
+        bu, bv = branch[tails], branch[heads]
+        cross = (bu >= 0) & (bu < bv) & np.isfinite(d_t[heads])
+        on_path = np.zeros(n, dtype=np.int64) - 1
+        on_path[path] = np.arange(len(path))
+        cross &= ~((on_path[tails] >= 0) & (on_path[heads] == on_path[tails] + 1))
+        idx = np.flatnonzero(cross)
+        g = d_s[tails[idx]] + w[idx]
+        f = g + d_t[heads[idx]]
+        order = np.argsort(f, kind="stable")
+        idx, g, f = idx[order], g[order], f[order]
+
+        # 区間木: 区間 [b(u), b(v)-1] を O(log k) 個の節に分けて持つ（各節のリストは f の昇順）
+        size = 1
+        while size < k:
+            size *= 2
+        self._size = size
+        lists: list = [[] for _ in range(2 * size)]
+        for e, ge, fe, lo, hi in zip(idx.tolist(), g.tolist(), f.tolist(),
+                                     bu[idx].tolist(), (bv[idx] - 1).tolist()):
+            item = (fe, ge, int(heads[e]), int(tails[e]))
+            lo += size
+            hi += size + 1
+            while lo < hi:
+                if lo & 1:
+                    lists[lo].append(item)
+                    lo += 1
+                if hi & 1:
+                    hi -= 1
+                    lists[hi].append(item)
+                lo >>= 1
+                hi >>= 1
+        self._lists = lists
+        self._indptr  = cg.indptr.tolist()
+        self._heads   = cg.indices.tolist()
+        self._weights = cg.weights.tolist()
+        self._branch_list = branch.tolist()
+        self._h = d_t.tolist()
+        self._s, self._t = s, t
+
+    # -- 内部 ---------------------------------------------------------------------
+    def _tree_path(self, v: int) -> list:
+        out = [v]
+        while out[-1] != self._s:
+            out.append(int(self._pred[out[-1]]))
+        return out[::-1]
+
+    def _detour(self, i: int) -> tuple:
+        """e_i 停止時の (最短コスト, 経路の拠点ID列)。迂回がなければ (inf, [])。"""
+        heads, weights, indptr = self._heads, self._weights, self._indptr
+        branch, h, t = self._branch_list, self._h, self._t
+        heap: list = []
+        node = i + self._size
+        while node:                              # 葉 i の祖先の横断ルートリスト（先頭だけ積む）
+            if self._lists[node]:
+                fe, ge, v, u = self._lists[node][0]
+                heap.append((fe, ge, v, u, node, 0))
+            node >>= 1
+        heapq.heapify(heap)
+
+        parent: dict = {}
+        while heap:
+            fe, ge, v, u, lst, pos = heapq.heappop(heap)
+            if lst:
+                nxt = self._lists[lst]
+                if pos + 1 < len(nxt):
+                    f2, g2, v2, u2 = nxt[pos + 1]
+                    heapq.heappush(heap, (f2, g2, v2, u2, lst, pos + 1))
+            if v in parent:
+                continue
+            parent[v] = u
+            if v == t:
+                route = [t]
+                while route[-1] in parent:
+                    route.append(parent[route[-1]])
+                return ge, self._tree_path(route[-1])[:-1] + route[::-1]
+            for j in range(indptr[v], indptr[v + 1]):
+                x = heads[j]
+                if branch[x] > i and x not in parent and h[x] != math.inf:
+                    g2 = ge + weights[j]
+                    heapq.heappush(heap, (g2 + h[x], g2, x, v, 0, 0))
+        return math.inf, []
+
+    # -- 公開API ------------------------------------------------------------------
+    def profile(self) -> pd.DataFrame:
+        """最短経路上のルートごとの停止時コスト（経路の順）。"""
+        names, path = self.nodes, self.path
+        position = {p: j for j, p in enumerate(path)}
+        rows = []
+        for i in range(len(path) - 1):
+            u, v = path[i], path[i + 1]
+            after, route = self._detour(i)
+            if route:
+                split = next(j for j in range(len(route)) if route[j] != path[j]) - 1
+                join = next(j for j in range(split + 1, len(route)) if position.get(route[j], -1) > i)
+                segment = [names[x] for x in route[split:join + 1]]
+                branch_at, join_at, detour = segment[0], segment[-1], " → ".join(map(str, segment))
+            else:
+                branch_at = join_at = None
+                detour = NO_DETOUR
+            rows.append((
+                i + 1, f"{names[u]} → {names[v]}",
+                float(self._d_s[v] - self._d_s[u]), after, after - self.cost,
+                (after - self.cost) / self.cost if self.cost > 0 else math.inf,
+                branch_at, join_at, detour,
+            ))
+        return pd.DataFrame(rows, columns=PROFILE_COLUMNS)
+
+
+@instrumented()
+def route_vulnerability_profile(G: nx.DiGraph, source, target, weight: str = "weight") -> tuple:
+    """
+    ルート脆弱性プロファイル: source → target の最短経路上のどのルートが1本止まっても、
+    迂回後のコストがいくらになるかを1回の計算でまとめて求める。
+
+    Returns:
+      (df, summary)
+        df      : PROFILE_COLUMNS の表（最短経路の順。迂回がない区間の障害後コストは inf）
+        summary : 基準コスト・区間数・迂回不能区間数・最大増加コスト・最も弱い区間
+    """
+    rp = ReplacementPaths(G, source, target, weight=weight)
+    df = rp.profile()
+    finite = df[np.isfinite(df["障害後コスト"])]
+    worst = df.loc[df["増加コスト"].idxmax(), "停止ルート"] if len(df) else None
+    summary = {
+        "最短経路":       " → ".join(str(rp.nodes[p]) for p in rp.path),
+        "基準コスト":     rp.cost,
+        "区間数":         len(df),
+        "迂回不能区間数": int(len(df) - len(finite)),
+        "最大増加コスト": float(df["増加コスト"].max()) if len(df) else 0.0,
+        "最も弱い区間":   worst,
+    }
+    return df, summary
@@ -1,8 +1,10 @@
 import networkx as nx
-import streamlit as st
+import numpy as np
 import pandas as pd
 import io
 
+from instrumentation import instrumented
+
 # ---------------------------------------------------------------------------
 # デモシナリオ定義
 # ---------------------------------------------------------------------------
@@ -87,25 +89,172 @@ DEMO_SCENARIOS = {
 
 
 # ---------------------------------------------------------------------------
-# CSV読み込み（キャッシュ付き）
+# ルート表の取り込み（列単位・チャンク単位）
 # ---------------------------------------------------------------------------
-@st.cache_data(show_spinner="CSVを読み込み中...")
-def load_graph_from_csv(file_bytes: bytes) -> tuple:
-    try:
-        df = pd.read_csv(io.BytesIO(file_bytes))
-    except Exception as e:
-        return None, f"CSV読み込みエラー: {e}"
+INGEST_CHUNKSIZE = 500_000
+EDGE_COLUMNS     = ("from", "to", "cost", "capacity")
+
+
+def _detect_format(name: str) -> str:
+    return "parquet" if str(name).lower().endswith((".parquet", ".pq")) else "csv"
+
+
+def iter_edge_chunks(source, fmt: str = "csv", chunksize: int = INGEST_CHUNKSIZE,
+                     columns: tuple = EDGE_COLUMNS):
+    """
+    ルート表を from / to / cost / capacity 列（columns で変更可）だけのDataFrameとして
+    チャンクごとに返すジェネレータ。
+
+    source はパス・バイト列・ファイルオブジェクト（標準入力などのパイプも可）。
+    CSV は pandas のチャンク読み込み、Parquet は pyarrow の行グループ単位の読み込みで、
+    ファイル全体をメモリに載せずに処理できる。CSV の値は文字列として読み、型変換は後段で行う。
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(source)
+        present = [c for c in columns if c in pf.schema_arrow.names]
+        for batch in pf.iter_batches(batch_size=chunksize, columns=present):
+            yield batch.to_pandas()
+        return
+
+    yield from pd.read_csv(
+        source,
+        usecols=lambda c: c in columns,
+        dtype=str,
+        chunksize=chunksize,
+    )
+
+
+def _numeric_column(df: pd.DataFrame, name: str, missing: np.ndarray, minimum: float | None = None) -> tuple:
+    """
+    数値列を float64 配列に変換する。空欄は 1.0、不正値（数値でない・有限でない・minimum 未満）も
+    1.0 で補完し、(値, 不正値の真偽配列) を返す。拠点名欠損の行は不正値として数えない。
+    """
+    if pd.api.types.is_numeric_dtype(df[name]):
+        values = df[name].to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+        blank  = np.isnan(values)
+    else:
+        raw    = df[name].astype("string").str.strip().fillna("")
+        values = pd.to_numeric(raw, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+        blank  = (raw == "").to_numpy(dtype=bool)
+    bad = ~np.isfinite(values)
+    if minimum is not None:
+        bad |= np.nan_to_num(values, nan=minimum) < minimum
+    invalid = ~blank & bad & ~missing
+    values[blank | bad] = 1.0
+    return values, invalid
+
+
+def ingest_edge_chunks(chunks, compact: bool = False) -> tuple:
+    """
+    チャンク列からグラフを構築する。
 
-    if "from" not in df.columns or "to" not in df.columns:
-        return None, "'from' と 'to' 列が必要です。"
+    拠点名は列単位で前後の空白を除去し、チャンクごとの一意値だけをPythonで採番する。
+    cost は pd.to_numeric で列ごとに変換し、空欄は 1.0 で補完する。
+    数値でない・有限でない cost は 1.0 で補完したうえで件数を集計して報告する。
+    capacity 列（ルートの輸送容量）があれば同様に変換して辺の capacity 属性に入れる（負の値も不正）。
+    CompactGraph は容量を持たないため、compact=True のときは capacity 列を読み飛ばす。
+    from / to が空欄の行は取り込まずに件数を報告する。
 
+    Args:
+      compact : True のとき nx.DiGraph ではなく CompactGraph を返す
+
+    Returns:
+      (graph, err, report)  report = {"総行数", "取り込み行数", "拠点名欠損で除外",
+                                      "コスト不正（1.0で補完）", "容量不正（1.0で補完）", "不正行の例"}
+    """
+    report = {"総行数": 0, "取り込み行数": 0, "拠点名欠損で除外": 0,
+              "コスト不正（1.0で補完）": 0, "容量不正（1.0で補完）": 0, "不正行の例": []}
     G = nx.DiGraph()
-    for _, row in df.iterrows():
-        w = 1.0
-        if "cost" in df.columns and pd.notna(row.get("cost")):
-            try:
-                w = float(row["cost"])
-            except (ValueError, TypeError):
-                pass
-        G.add_edge(str(row["from"]).strip(), str(row["to"]).strip(), weight=w)
-    return G, None
\ No newline at end of file
+    index: dict = {}
+    tails, heads, weights = [], [], []
+    offset = 0
+
+    for df in chunks:
+        if "from" not in df.columns or "to" not in df.columns:
+            return None, "'from' と 'to' 列が必要です。", None
+        n_rows = len(df)
+        row_no = np.arange(offset, offset + n_rows) + 2   # ヘッダー行を1行目とした行番号
+        offset += n_rows
+        report["総行数"] += n_rows
+
+        src = df["from"].astype("string").str.strip()
+        dst = df["to"].astype("string").str.strip()
+        missing = ((src.fillna("") == "") | (dst.fillna("") == "")).to_numpy(dtype=bool)
+
+        if "cost" in df.columns:
+            cost, invalid = _numeric_column(df, "cost", missing)
+        else:
+            cost    = np.ones(n_rows)
+            invalid = np.zeros(n_rows, dtype=bool)
+        capacity = None
+        cap_invalid = np.zeros(n_rows, dtype=bool)
+        if "capacity" in df.columns and not compact:
+            capacity, cap_invalid = _numeric_column(df, "capacity", missing, minimum=0.0)
+
+        report["拠点名欠損で除外"]        += int(missing.sum())
+        report["コスト不正（1.0で補完）"] += int(invalid.sum())
+        report["容量不正（1.0で補完）"]   += int(cap_invalid.sum())
+        if len(report["不正行の例"]) < 10:
+            bad_rows = row_no[missing | invalid | cap_invalid]
+            report["不正行の例"] += bad_rows[:10 - len(report["不正行の例"])].tolist()
+
+        keep = ~missing
+        src  = src.to_numpy(dtype=object)[keep]
+        dst  = dst.to_numpy(dtype=object)[keep]
+        cost = cost[keep]
+        report["取り込み行数"] += int(keep.sum())
+
+        if compact:
+            interleaved = np.empty(2 * len(src), dtype=object)
+            interleaved[0::2], interleaved[1::2] = src, dst
+            codes, uniques = pd.factorize(interleaved)
+            ids = np.fromiter((index.setdefault(u, len(index)) for u in uniques),
+                              dtype=np.int64, count=len(uniques))[codes]
+            tails.append(ids[0::2])
+            heads.append(ids[1::2])
+            weights.append(cost)
+        elif capacity is not None:
+            G.add_edges_from(
+                (u, v, {"weight": w, "capacity": c})
+                for u, v, w, c in zip(src.tolist(), dst.tolist(), cost.tolist(), capacity[keep].tolist())
+            )
+        else:
+            G.add_weighted_edges_from(zip(src.tolist(), dst.tolist(), cost.tolist()))
+
+    if report["取り込み行数"] == 0:
+        return None, "有効なルートが1行もありません。", report
+
+    if compact:
+        from compact_graph import CompactGraph
+
+        cat = lambda parts, dt: np.concatenate(parts) if parts else np.empty(0, dtype=dt)
+        graph = CompactGraph(list(index), cat(tails, np.int64), cat(heads, np.int64),
+                             cat(weights, np.float64))
+        return graph, None, report
+    return G, None, report
+
+
+@instrumented()
+def load_graph_from_file(
+    source,
+    fmt: str | None = None,
+    chunksize: int = INGEST_CHUNKSIZE,
+    compact: bool = False,
+) -> tuple:
+    """
+    CSV / Parquet ファイル（パスまたはファイルオブジェクト）をチャンク単位で読み込む。
+    fmt を省略するとパスの拡張子から判定する。返り値は ingest_edge_chunks と同じ。
+    """
+    fmt = fmt or _detect_format(getattr(source, "name", source))
+    label = "Parquet" if fmt == "parquet" else "CSV"
+    try:
+        return ingest_edge_chunks(iter_edge_chunks(source, fmt, chunksize), compact=compact)
+    except ImportError as e:
+        return None, f"{label}読み込みエラー: pyarrow が必要です（{e}）", None
+    except Exception as e:
+        return None, f"{label}読み込みエラー: {e}", None
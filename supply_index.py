@@ -0,0 +1,215 @@
+from collections import deque
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+
+from algorithms import (
+    _bridges_from_dominators,
+    _dominator_intervals,
+    _dominator_tree,
+    _natural_key,
+)
+from instrumentation import instrumented
+
+# ---------------------------------------------------------------------------
+# 設定
+# ---------------------------------------------------------------------------
+SUPPLY_ROOT  = 0            # 仮想の総供給元（全供給拠点へ辺を張る）の整数ID
+RANKING_COLUMNS = ["対象", "種別", "途絶する拠点数", "割合"]
+DEPENDENCY_COLUMNS = ["拠点", "依存する上流拠点", "上流拠点数", "代替のないルート数"]
+
+
+# ---------------------------------------------------------------------------
+# 供給依存インデックス
+# ---------------------------------------------------------------------------
+class SupplyDependencyIndex:
+    """
+    指定した供給拠点（1つ以上）からの供給経路の支配木。
+
+    仮想の総供給元 S から各供給拠点へ辺を張ったフローグラフで Lengauer–Tarjan を1回実行する
+    （algorithms._dominator_tree、O(E log V)）。拠点 x が拠点 y を支配する
+    ⇔ どの供給拠点から y への経路も x を通る ⇔ x が止まると y への供給が途絶える。
+    支配木の行きがけ・帰りがけ番号で「x が y を支配するか」は O(1)、
+    「x が止まると途絶える拠点」は行きがけ順に並べた配列の連続区間として O(部分木) で取り出せる。
+    ルートについては、フローグラフの橋 (u, v) が止まると v の部分木が途絶える。
+
+    インデックスは構築時のネットワークに対するもので、停止状態は含まない。
+    単一の拠点・ルート停止による途絶は部分木そのもの（厳密）。複数同時停止は supply_loss を使う。
+    """
+
+    @instrumented("SupplyDependencyIndex")
+    def __init__(self, G: nx.DiGraph, hubs):
+        hubs = list(dict.fromkeys(h for h in hubs if h in G))
+        if not hubs:
+            raise ValueError("供給拠点を1つ以上指定してください（ネットワークに存在する拠点）。")
+        self.G = G
+        self.hubs = hubs
+        self.nodes = [None] + list(G.nodes())          # ID 0 は仮想の総供給元
+        self.index = {n: i for i, n in enumerate(self.nodes) if i != SUPPLY_ROOT}
+
+        n = len(self.nodes)
+        succ: list = [[] for _ in range(n)]
+        pred: list = [[] for _ in range(n)]
+        for h in hubs:
+            succ[SUPPLY_ROOT].append(self.index[h])
+            pred[self.index[h]].append(SUPPLY_ROOT)
+        for u, v in G.edges():
+            if u != v:
+                iu, iv = self.index[u], self.index[v]
+                succ[iu].append(iv)
+                pred[iv].append(iu)
+
+        idom = _dominator_tree(succ, pred, SUPPLY_ROOT)
+        pre, post = _dominator_intervals(idom, SUPPLY_ROOT)
+        self.idom = idom
+        self.pre, self.post = pre, post
+
+        # 行きがけ順の並び（部分木 = pre[x] 以上 post[x] 未満の連続区間）と部分木の大きさ
+        reached = [i for i in range(n) if pre[i] != -1]
+        self._order = np.array(sorted(reached, key=lambda i: pre[i]), dtype=np.int64)
+        self._order_pre = np.array([pre[i] for i in self._order], dtype=np.int64)
+        size = [1 if pre[i] != -1 else 0 for i in range(n)]
+        for i in self._order[::-1].tolist():
+            if i != SUPPLY_ROOT:
+                size[idom[i]] += size[i]
+        self._size = size
+
+        # 代替経路のないルート: 橋 (u, v) の v → u。総供給元から供給拠点への仮想の辺は除く
+        self._bridge_parent = {
+            v: u for u, v in _bridges_from_dominators(pred, idom, pre, post, SUPPLY_ROOT)
+            if u != SUPPLY_ROOT
+        }
+
+    # -- 内部 ---------------------------------------------------------------------
+    def _id(self, node) -> int | None:
+        i = self.index.get(node)
+        return i if i is not None and self.pre[i] != -1 else None
+
+    def _subtree(self, i: int) -> list:
+        lo = np.searchsorted(self._order_pre, self.pre[i], side="left")
+        hi = np.searchsorted(self._order_pre, self.post[i], side="left")
+        return [self.nodes[j] for j in self._order[lo:hi].tolist()]
+
+    # -- 問い合わせ ---------------------------------------------------------------
+    @property
+    def supplied(self) -> set:
+        """障害なしで供給拠点から届く拠点（供給拠点自身を含む）。"""
+        return {self.nodes[i] for i in self._order.tolist() if i != SUPPLY_ROOT}
+
+    def unsupplied(self) -> list:
+        """障害がなくても供給拠点から届かない拠点。"""
+        return sorted((n for n, i in self.index.items() if self.pre[i] == -1), key=_natural_key)
+
+    def depends_on(self, y, x) -> bool:
+        """y への供給が x（拠点）を必ず通るか。O(1)。"""
+        iy, ix = self._id(y), self._id(x)
+        if iy is None or ix is None or iy == ix:
+            return False
+        return self.pre[ix] <= self.pre[iy] and self.post[iy] <= self.post[ix]
+
+    def dependencies(self, y) -> list:
+        """y が依存する上流の拠点（y 自身は除く）を供給拠点側から順に返す。O(支配木の深さ)。"""
+        i = self._id(y)
+        if i is None:
+            return []
+        chain = []
+        i = self.idom[i]
+        while i != SUPPLY_ROOT:
+            chain.append(self.nodes[i])
+            i = self.idom[i]
+        return chain[::-1]
+
+    def critical_routes(self, y) -> list:
+        """y への供給がすべて通るルート（代替経路のないルート）を供給拠点側から順に返す。"""
+        i = self._id(y)
+        routes = []
+        while i is not None and i != SUPPLY_ROOT:
+            if i in self._bridge_parent:
+                routes.append((self.nodes[self._bridge_parent[i]], self.nodes[i]))
+            i = self.idom[i]
+        return routes[::-1]
+
+    def dependents(self, x) -> list:
+        """拠点 x が止まると供給が途絶える拠点（x 自身は除く）。O(部分木)。"""
+        i = self._id(x)
+        return [] if i is None else self._subtree(i)[1:]
+
+    def dependent_count(self, x) -> int:
+        """dependents(x) の件数。O(1)。"""
+        i = self._id(x)
+        return 0 if i is None else self._size[i] - 1
+
+    def route_dependents(self, u, v) -> list:
+        """ルート u → v が止まると供給が途絶える拠点（代替経路があれば空）。"""
+        i = self._id(v)
+        if i is None or self.nodes[self._bridge_parent.get(i, SUPPLY_ROOT)] != u:
+            return []
+        return self._subtree(i)
+
+    # -- 表 -----------------------------------------------------------------------
+    def ranking(self) -> pd.DataFrame:
+        """停止すると供給が途絶える拠点・ルートを、途絶する拠点数の多い順に並べる。"""
+        total = max(len(self._order) - 1, 1)
+        rows = []
+        for i in self._order.tolist():
+            if i == SUPPLY_ROOT:
+                continue
+            if self._size[i] > 1:
+                rows.append((str(self.nodes[i]), "拠点", self._size[i] - 1))
+            if i in self._bridge_parent:
+                rows.append((f"{self.nodes[self._bridge_parent[i]]} → {self.nodes[i]}", "ルート", self._size[i]))
+        rows.sort(key=lambda r: (-r[2], _natural_key(r[0])))
+        df = pd.DataFrame(rows, columns=RANKING_COLUMNS[:3])
+        df["割合"] = df["途絶する拠点数"] / total
+        return df
+
+    def dependency_table(self) -> pd.DataFrame:
+        """拠点ごとの依存先（上流の単一障害点）の一覧。"""
+        rows = []
+        for n in sorted(self.supplied, key=_natural_key):
+            chain = self.dependencies(n)
+            rows.append((n, " → ".join(map(str, chain)), len(chain), len(self.critical_routes(n))))
+        return pd.DataFrame(rows, columns=DEPENDENCY_COLUMNS)
+
+    # -- 停止時の途絶 -------------------------------------------------------------
+    def supply_loss(self, failed_nodes=None, failed_edges=None) -> dict:
+        """
+        停止によって供給が途絶える拠点と、その原因を返す（停止拠点自身は含めない）。
+
+        停止1件なら支配木の部分木だけで求まり、原因はその拠点・ルート。
+        複数同時停止では、どれか1つの停止に支配される拠点（原因 = 最も近い停止拠点・ルート）に加え、
+        迂回経路がすべて断たれた拠点を供給拠点からの探索で求める（原因 = "複合"）。
+
+        Returns:
+          {拠点: 原因}  原因は拠点名、ルート (u, v)、または "複合"
+        """
+        failed_nodes = [n for n in (failed_nodes or []) if self._id(n) is not None]
+        failed_edges = [tuple(e) for e in (failed_edges or []) if self.G.has_edge(*e)]
+        down = set(failed_nodes)
+
+        # 単一停止の影響（支配木の部分木）。深い停止対象ほど後に上書きして「最も近い原因」にする
+        causes: dict = {}
+        sources = [(self.pre[self.index[n]], n, self.dependents(n)) for n in failed_nodes]
+        sources += [(self.pre[self.index[v]], (u, v), self.route_dependents(u, v)) for u, v in failed_edges]
+        for _, cause, lost in sorted(sources, key=lambda t: t[0]):
+            for m in lost:
+                if m not in down:
+                    causes[m] = cause
+        if len(failed_nodes) + len(failed_edges) <= 1:
+            return causes
+
+        # 複数停止: 停止を除いたネットワークで供給拠点から探索し、届かない拠点を加える
+        edge_down = set(failed_edges)
+        seen = {h for h in self.hubs if h not in down}
+        queue = deque(seen)
+        while queue:
+            u = queue.popleft()
+            for v in self.G.successors(u):
+                if v not in seen and v not in down and (u, v) not in edge_down:
+                    seen.add(v)
+                    queue.append(v)
+        for m in self.supplied:
+            if m not in seen and m not in down:
+                causes.setdefault(m, "複合")
+        return causes
@@ -0,0 +1,359 @@
+"""
+物流ネットワークらしい合成ネットワークの生成（負荷試験・動作確認用）。
+
+  python synthetic.py hub 100000 -o routes.parquet
+  python synthetic.py corridor 20000 --seed 3 -o routes.csv
+
+拠点の座標（km）を先に決め、ルートのコストは座標間の距離 × 迂回率で決める。
+辺は NumPy の配列のまま作るので、百万ルート規模でも生成は数秒で終わる
+（nx.DiGraph への変換はルート数に比例して時間がかかるため、アルゴリズムの計測には CompactGraph を使う）。
+同じ種類・拠点数・シードからは常に同じネットワークができる。
+"""
+import argparse
+import sys
+
+import networkx as nx
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_array
+from scipy.sparse.csgraph import connected_components
+from scipy.spatial import cKDTree
+
+from instrumentation import instrumented
+
+# ---------------------------------------------------------------------------
+# 設定
+# ---------------------------------------------------------------------------
+NODE_SPACING_KM = 10.0          # 拠点の平均間隔（地域の一辺 = 間隔 × √拠点数）
+CIRCUITY        = (1.15, 1.45)  # 道路距離 / 直線距離 の範囲（ルートごとに一様乱数）
+ONE_WAY_SHARE   = 0.05          # 片方向だけのルートにする割合（一方通行・片道の定期便）
+
+
+# ---------------------------------------------------------------------------
+# 生成結果
+# ---------------------------------------------------------------------------
+class SyntheticNetwork:
+    """
+    合成ネットワーク（拠点名・座標・辺の配列）。
+
+    属性:
+      nodes : ID → 拠点名のリスト
+      xy    : 拠点の座標（km、拠点数 × 2）
+      tails, heads : 辺の始点・終点ID（int64）
+      weights      : 辺のコスト（km、float64）
+    """
+
+    def __init__(self, nodes: list, xy: np.ndarray, tails: np.ndarray, heads: np.ndarray,
+                 weights: np.ndarray):
+        self.nodes   = nodes
+        self.xy      = xy
+        self.tails   = tails
+        self.heads   = heads
+        self.weights = weights
+
+    def number_of_nodes(self) -> int:
+        return len(self.nodes)
+
+    def number_of_edges(self) -> int:
+        return len(self.tails)
+
+    def to_networkx(self) -> nx.DiGraph:
+        """座標を x / y 属性に持つ nx.DiGraph（配置・距離ルールの冗長化プランが座標を使う）。"""
+        G = nx.DiGraph()
+        names = self.nodes
+        G.add_nodes_from(
+            (n, {"x": x, "y": y}) for n, (x, y) in zip(names, self.xy.tolist())
+        )
+        G.add_weighted_edges_from(zip(
+            (names[i] for i in self.tails.tolist()),
+            (names[i] for i in self.heads.tolist()),
+            self.weights.tolist(),
+        ))
+        return G
+
+    def to_compact(self):
+        from compact_graph import CompactGraph
+
+        return CompactGraph(self.nodes, self.tails, self.heads, self.weights)
+
+    def to_frame(self) -> pd.DataFrame:
+        """取り込み形式（from / to / cost）のルート表。"""
+        names = np.asarray(self.nodes, dtype=object)
+        return pd.DataFrame({"from": names[self.tails], "to": names[self.heads], "cost": self.weights})
+
+
+# ---------------------------------------------------------------------------
+# 部品（すべて配列演算）
+# ---------------------------------------------------------------------------
+def _region_side(n_nodes: int) -> float:
+    return NODE_SPACING_KM * np.sqrt(max(n_nodes, 1))
+
+
+def _clustered_points(rng, n: int, side: float, n_clusters: int, spread: float,
+                      background: float = 0.2) -> np.ndarray:
+    """都市（クラスタ）の周りに集まる拠点と、地域全体に散らばる拠点（background の割合）。"""
+    centers = rng.uniform(0, side, (max(n_clusters, 1), 2))
+    weights = rng.pareto(1.5, len(centers)) + 1.0           # 都市の大きさのばらつき
+    which = rng.choice(len(centers), n, p=weights / weights.sum())
+    xy = centers[which] + rng.normal(0, spread, (n, 2))
+    rural = rng.random(n) < background
+    xy[rural] = rng.uniform(0, side, (int(rural.sum()), 2))
+    return np.clip(xy, 0, side)
+
+
+def _knn_pairs(xy: np.ndarray, k: int) -> tuple:
+    """各拠点と近傍 k 拠点を結ぶ無向ペア（重複を除いた (小さいID, 大きいID)）。"""
+    k = min(k, len(xy) - 1)
+    if k < 1:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    _, nbr = cKDTree(xy).query(xy, k + 1)
+    u = np.repeat(np.arange(len(xy)), k)
+    v = nbr[:, 1:].ravel()
+    return _unique_pairs(u, v)
+
+
+def _unique_pairs(u: np.ndarray, v: np.ndarray) -> tuple:
+    lo, hi = np.minimum(u, v).astype(np.int64), np.maximum(u, v).astype(np.int64)
+    n = int(hi.max(initial=0)) + 1
+    keep = lo != hi
+    key = np.unique(lo[keep] * n + hi[keep])
+    return key // n, key % n
+
+
+def _connect(xy: np.ndarray, u: np.ndarray, v: np.ndarray) -> tuple:
+    """
+    無向ペアでつながらない拠点群があれば、各群の代表拠点を最大の群の最寄り拠点と結ぶ
+    （生成したネットワークが地理的に分断されないようにする）。
+    """
+    n = len(xy)
+    graph = coo_array((np.ones(len(u)), (u, v)), shape=(n, n))
+    n_comp, labels = connected_components(graph, directed=False)
+    if n_comp <= 1:
+        return u, v
+    giant = np.bincount(labels).argmax()
+    members = np.flatnonzero(labels == giant)
+    _, reps = np.unique(labels, return_index=True)
+    reps = reps[labels[reps] != giant]
+    _, nearest = cKDTree(xy[members]).query(xy[reps])
+    return np.concatenate([u, reps]), np.concatenate([v, members[nearest]])
+
+
+def _road_edges(rng, xy: np.ndarray, u: np.ndarray, v: np.ndarray, one_way: float = ONE_WAY_SHARE) -> tuple:
+    """
+    無向ペアを有向辺にする。コストは直線距離 × 迂回率（往復で同じ）、
+    one_way の割合は片方向（向きは無作為）だけにする。
+    """
+    dist = np.hypot(*(xy[u] - xy[v]).T) * rng.uniform(*CIRCUITY, len(u))
+    dist = np.maximum(np.round(dist, 1), 0.1)
+    single = rng.random(len(u)) < one_way
+    flip = rng.random(len(u)) < 0.5
+    both = ~single
+    tails = np.concatenate([u[both], v[both], np.where(flip, v, u)[single]])
+    heads = np.concatenate([v[both], u[both], np.where(flip, u, v)[single]])
+    weights = np.concatenate([dist[both], dist[both], dist[single]])
+    return tails, heads, weights
+
+
+def _check_size(n_nodes: int, minimum: int, label: str) -> int:
+    n_nodes = int(n_nodes)
+    if n_nodes < minimum:
+        raise ValueError(f"{label}の拠点数は {minimum} 以上にしてください: {n_nodes}")
+    return n_nodes
+
+
+def _names(prefix: str, n: int) -> list:
+    return [f"{prefix}{i}" for i in range(n)]
+
+
+# ---------------------------------------------------------------------------
+# ネットワークの種類
+# ---------------------------------------------------------------------------
+def hub_and_spoke(n_nodes: int, seed: int = 0, n_hubs: int | None = None,
+                  dual_homing: float = 0.1) -> SyntheticNetwork:
+    """
+    ハブ＆スポーク型。ハブ（拠点数の平方根の半分程度）は近傍3ハブと双方向の幹線で結び、
+    各スポークは最寄りのハブと双方向に1本ずつ結ぶ（末端依存の強橋になる）。
+    dual_homing の割合のスポークは2番目に近いハブとも結ぶ（冗長化済みの拠点）。
+    """
+    n_nodes = _check_size(n_nodes, min_nodes("hub"), "ハブ＆スポーク型")
+    rng = np.random.default_rng(seed)
+    n_hubs = min(max(3, n_hubs or round(np.sqrt(n_nodes) / 2)), n_nodes - 1)
+    side = _region_side(n_nodes)
+    hub_xy = rng.uniform(0, side, (n_hubs, 2))
+    spoke_xy = _clustered_points(rng, n_nodes - n_hubs, side, n_hubs, side / np.sqrt(n_hubs) / 3,
+                                 background=0.1)
+    xy = np.vstack([hub_xy, spoke_xy])
+
+    hu, hv = _connect(hub_xy, *_knn_pairs(hub_xy, 3))
+    spokes = n_hubs + np.arange(n_nodes - n_hubs)
+    _, nearest = cKDTree(hub_xy).query(spoke_xy, min(2, n_hubs))
+    dual = rng.random(len(spokes)) < dual_homing
+    u = np.concatenate([hu, spokes, spokes[dual]])
+    v = np.concatenate([hv, nearest[:, 0], nearest[dual, 1]])
+    tails, heads, weights = _road_edges(rng, xy, u, v, one_way=0.0)
+    return SyntheticNetwork(_names("H", n_hubs) + _names("S", len(spokes)), xy, tails, heads, weights)
+
+
+def geographic_knn(n_nodes: int, seed: int = 0, k: int = 3,
+                   one_way: float = ONE_WAY_SHARE) -> SyntheticNetwork:
+    """
+    地理的近傍型（道路網に近い）。都市の周りに集まる拠点を近傍 k 拠点と結び、
+    分断された拠点群は最寄りの拠点とつなぐ。one_way の割合のルートは片方向だけ。
+    """
+    n_nodes = _check_size(n_nodes, min_nodes("knn"), "地理的近傍型")
+    rng = np.random.default_rng(seed)
+    side = _region_side(n_nodes)
+    n_cities = max(1, round(np.sqrt(n_nodes) / 3))
+    xy = _clustered_points(rng, n_nodes, side, n_cities, side / np.sqrt(n_cities) / 4)
+    u, v = _connect(xy, *_knn_pairs(xy, k))
+    tails, heads, weights = _road_edges(rng, xy, u, v, one_way=one_way)
+    return SyntheticNetwork(_names("N", n_nodes), xy, tails, heads, weights)
+
+
+def corridor(n_nodes: int, seed: int = 0, n_corridors: int = 6, trunk_share: float = 0.05,
+             ring_every: int = 3, one_way: float = ONE_WAY_SHARE) -> SyntheticNetwork:
+    """
+    幹線回廊型。地域に散らばる都市圏ごとに、中心から n_corridors 本の幹線が放射状に延び
+    （幹線拠点の間隔は NODE_SPACING_KM の2倍）、中心付近と ring_every 拠点ごとに隣の幹線と
+    環状線で結ぶ。幹線の先端は最寄りの別の都市圏の先端と結ぶ（都市圏間の幹線）。
+    拠点の trunk_share の割合が幹線拠点で、残りは幹線沿いに散らばる支線拠点として
+    最寄りの幹線拠点と、近くの支線拠点1つと結ぶ（one_way の割合は片方向だけ）。
+    幹線の途中の拠点やルートが止まると先の区間全体が迂回を強いられる構造になる。
+    """
+    n_nodes = _check_size(n_nodes, min_nodes("corridor", n_corridors=n_corridors), "幹線回廊型")
+    rng = np.random.default_rng(seed)
+    side = _region_side(n_nodes)
+    step = 2 * NODE_SPACING_KM
+    n_trunk = max(2 * n_corridors, int(n_nodes * trunk_share))
+
+    # 都市圏数 m: 都市圏の半径 × m の平方根 ≒ 地域の一辺 / 2 となるように幹線の長さと釣り合わせる
+    n_metros = int(np.clip(round((2 * step * n_trunk / (n_corridors * side)) ** 2),
+                           1, n_trunk // (2 * n_corridors)))
+    per = max(2, n_trunk // (n_metros * n_corridors))
+    n_trunk = n_metros * n_corridors * per
+    centers = rng.uniform(0, side, (n_metros, 1, 1, 2))
+    angle = ((np.arange(n_corridors) / n_corridors * 2 * np.pi)[None, :]
+             + rng.uniform(0, 2 * np.pi, (n_metros, 1)) + rng.uniform(-0.2, 0.2, (n_metros, n_corridors)))
+    radius = step * (np.arange(per) + 1)
+    direction = np.stack([np.cos(angle), np.sin(angle)], axis=-1)[:, :, None, :]
+    trunk_xy = (centers + direction * radius[None, None, :, None]
+                + rng.normal(0, step * 0.15, (n_metros, n_corridors, per, 2))).reshape(-1, 2)
+
+    ids = np.arange(n_trunk).reshape(n_metros, n_corridors, per)
+    tu = [ids[:, :, :-1].ravel(), ids[:, :, 0].ravel()]
+    tv = [ids[:, :, 1:].ravel(), np.roll(ids[:, :, 0], -1, axis=1).ravel()]    # 中心付近の環状線
+    ring = ids[:, :, ring_every - 1::ring_every]
+    if ring.size:
+        tu.append(ring.ravel())
+        tv.append(np.roll(ring, -1, axis=1).ravel())
+    if n_metros > 1:                            # 先端どうし: 最寄りの別の都市圏の先端と結ぶ
+        tips = ids[:, :, -1].ravel()
+        metro_of = np.repeat(np.arange(n_metros), n_corridors)
+        k = min(n_corridors + 1, len(tips))
+        _, nbr = cKDTree(trunk_xy[tips]).query(trunk_xy[tips], k)
+        other = metro_of[nbr] != metro_of[:, None]
+        tu.append(tips)
+        tv.append(tips[nbr[np.arange(len(tips)), other.argmax(axis=1)]])
+    trunk_u, trunk_v = _connect(trunk_xy, *_unique_pairs(np.concatenate(tu), np.concatenate(tv)))
+
+    # 支線: 幹線拠点の周りに散らばる拠点
+    n_feeder = n_nodes - n_trunk
+    anchor = rng.integers(0, n_trunk, n_feeder)
+    feeder_xy = trunk_xy[anchor] + rng.normal(0, step, (n_feeder, 2))
+    xy = np.vstack([trunk_xy, feeder_xy])
+    feeders = n_trunk + np.arange(n_feeder)
+    fu, fv = [feeders], [cKDTree(trunk_xy).query(feeder_xy)[1].astype(np.int64)]
+    if n_feeder > 1:
+        _, nbr = cKDTree(feeder_xy).query(feeder_xy, 2)
+        fu.append(feeders)
+        fv.append(n_trunk + nbr[:, 1])
+
+    trunk_t, trunk_h, trunk_w = _road_edges(rng, xy, trunk_u, trunk_v, one_way=0.0)
+    feed_t, feed_h, feed_w = _road_edges(rng, xy, *_unique_pairs(np.concatenate(fu), np.concatenate(fv)),
+                                         one_way=one_way)
+    names = ([f"M{m}C{c}_{j}" for m in range(n_metros) for c in range(n_corridors) for j in range(per)]
+             + _names("F", n_feeder))
+    return SyntheticNetwork(names, xy, np.concatenate([trunk_t, feed_t]),
+                            np.concatenate([trunk_h, feed_h]), np.concatenate([trunk_w, feed_w]))
+
+
+def uniform_random(n_nodes: int, seed: int = 0, edge_prob: float = 0.15) -> SyntheticNetwork:
+    """
+    一様ランダム（有向 G(n, p)）。拠点の組を重複なしで抽出して辺にする。
+    座標は円周上に並べ、コストは従来のランダム生成と同じ 1〜5 の整数。
+    """
+    n_nodes = _check_size(n_nodes, min_nodes("random"), "一様ランダム")
+    rng = np.random.default_rng(seed)
+    total = n_nodes * (n_nodes - 1)
+    m = rng.binomial(total, min(max(edge_prob, 0.0), 1.0))
+    if total <= 5_000_000:
+        code = rng.choice(total, m, replace=False)
+    else:                                                   # 疎なら重複は稀なので引き直さず除く
+        code = np.unique(rng.integers(0, total, m))
+    tails = code // (n_nodes - 1)
+    rest = code % (n_nodes - 1)
+    heads = rest + (rest >= tails)
+    theta = np.arange(n_nodes) / n_nodes * 2 * np.pi
+    xy = _region_side(n_nodes) / 2 * (1 + np.column_stack([np.cos(theta), np.sin(theta)]))
+    return SyntheticNetwork(_names("N", n_nodes), xy, tails.astype(np.int64), heads.astype(np.int64),
+                            rng.integers(1, 6, len(tails)).astype(np.float64))
+
+
+# 種類 → (生成関数, 拠点あたりのルート数の目安)
+TOPOLOGIES = {
+    "hub":      (hub_and_spoke,  2.2),
+    "knn":      (geographic_knn, 3.6),
+    "corridor": (corridor,       3.3),
+    "random":   (uniform_random, None),
+}
+
+
+def min_nodes(kind: str, n_corridors: int = 6, **_params) -> int:
+    """種類ごとに作れる最小の拠点数（ハブ＆スポークはハブ3つ＋スポーク、幹線回廊は幹線ごとに2拠点＋支線）。"""
+    if kind == "hub":
+        return 4
+    if kind == "corridor":
+        return 2 * n_corridors + 1
+    return 2
+
+
+@instrumented()
+def generate_network(kind: str, n_nodes: int, seed: int = 0, **params) -> SyntheticNetwork:
+    """種類名（TOPOLOGIES のキー）で合成ネットワークを作る。params は各生成関数の引数。"""
+    if kind not in TOPOLOGIES:
+        raise ValueError(f"ネットワークの種類は {', '.join(TOPOLOGIES)} のいずれかです: {kind}")
+    return TOPOLOGIES[kind][0](n_nodes, seed=seed, **params)
+
+
+def nodes_for_edges(kind: str, n_edges: int) -> int:
+    """ルート数の目標から拠点数を決める（ベンチマーク用。random は平均出次数 4 とする）。"""
+    ratio = TOPOLOGIES[kind][1] or 4.0
+    return max(int(n_edges / ratio), 10)
+
+
+# ---------------------------------------------------------------------------
+# コマンドライン: ルート表を書き出す
+# ---------------------------------------------------------------------------
+def main(argv: list | None = None) -> int:
+    p = argparse.ArgumentParser(prog="synthetic.py", description="合成物流ネットワークのルート表を書き出す")
+    p.add_argument("kind", choices=list(TOPOLOGIES), help="ネットワークの種類")
+    p.add_argument("nodes", type=int, help="拠点数")
+    p.add_argument("--seed", type=int, default=0, help="乱数シード")
+    p.add_argument("-o", "--output", help="出力先（.parquet なら Parquet、それ以外は CSV。省略時は標準出力に CSV）")
+    args = p.parse_args(argv)
+
+    try:
+        net = generate_network(args.kind, args.nodes, seed=args.seed)
+    except ValueError as e:
+        p.error(str(e))
+    table = net.to_frame()
+    if args.output and args.output.lower().endswith((".parquet", ".pq")):
+        table.to_parquet(args.output, index=False)
+    else:
+        table.to_csv(args.output or sys.stdout, index=False)
+    print(f"{net.number_of_nodes():,} 拠点 / {net.number_of_edges():,} ルート", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,12 @@
+import hashlib
 import re
 import networkx as nx
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.figure import Figure
+import numpy as np
 import streamlit as st
 import pandas as pd
 import io
@@ -18,8 +23,12 @@ from algorithms import (
     build_stable_scc_map,
     simulate_failure,
     analyze_rerouting_cost,
+    condense_network,
     _natural_key  # もし _natural_key も algorithms.py に移動している場合
 )
+from analysis_cache import cache_key, get_cache
+from instrumentation import instrumented, span
+from layout import get_layout
 from scenarios import DEMO_SCENARIOS
 
 # ---------------------------------------------------------------------------
@@ -29,6 +38,16 @@ import matplotlib
 
 
 def setup_japanese_font():
+    """日本語フォントを設定する。フォント探索は重いので描画の直前に1回だけ行う（import 時には行わない）。"""
+    global _font_status
+    if _font_status is not None:
+        return _font_status
+    _font_status = _find_japanese_font()
+    matplotlib.rcParams["axes.unicode_minus"] = False
+    return _font_status
+
+
+def _find_japanese_font():
     try:
         import japanize_matplotlib  # noqa: F401
         return "japanize-matplotlib"
@@ -59,89 +78,244 @@ def setup_japanese_font():
     return "fallback"
 
 
-_font_status = setup_japanese_font()
-matplotlib.rcParams["axes.unicode_minus"] = False
+_font_status = None
 
 
 # ---------------------------------------------------------------------------
-# ページ設定
+# 描画: Matplotlib（静止画・一括描画）
 # ---------------------------------------------------------------------------
-st.set_page_config(page_title="物流ネットワーク障害シミュレーター", layout="wide")
+STATIC_LABEL_LIMIT = 120   # これを超える拠点数ではラベルを省略する
 
+NODE_STYLES = {
+    # 種別: (塗り, 形, 枠色, 枠幅, 大きさ倍率, 重なり順)
+    "failed":       ("#e74c3c", "o", "white",   1.0, 1.0,  3),
+    "isolated":     ("#aaaaaa", "x", "none",    2.0, 1.0,  3),
+    "cascade":      ("#f39c12", "d", "white",   1.0, 1.0,  3),
+    "articulation": ("none",    "o", "#e74c3c", 3.0, 1.25, 4),
+}
+EDGE_STYLES = {
+    # 種別: (色, 線幅, 線種, 矢じり倍率, 重なり順)
+    "normal": ("#555555", 1.0, "solid",  1.0, 1),
+    "bridge": ("#e74c3c", 2.5, "solid",  1.2, 2),
+    "failed": ("#e74c3c", 2.0, "dashed", 1.0, 2),
+    # キャッシュした基本層に焼き込まれた停止ルートを背景色で消す（点線の下に敷く）
+    "mask":   ("white",   3.5, "solid",  1.4, 0.5),
+}
 
-# ---------------------------------------------------------------------------
-# 描画: Matplotlib（<=80ノード向け静止画）
-# ---------------------------------------------------------------------------
+
+def _node_size(n: int) -> float:
+    """拠点数が増えるほど小さくする（80拠点までは従来どおり 600）。"""
+    return 600.0 if n <= 80 else max(30.0, 600.0 * 80 / n)
+
+
+def _limits(pos: dict) -> tuple:
+    xy = np.array(list(pos.values())) if pos else np.zeros((1, 2))
+    lo, hi = xy.min(axis=0), xy.max(axis=0)
+    pad = np.maximum((hi - lo) * 0.08, 0.1)
+    return lo[0] - pad[0], hi[0] + pad[0], lo[1] - pad[1], hi[1] + pad[1]
+
+
+def _classify(G, bridge_edges, failed_nodes, failed_edges,
+              isolated_nodes, cascade_nodes, articulation_nodes) -> tuple:
+    """拠点・ルートを1回ずつ走査して描画種別ごとに振り分ける。"""
+    nodes = {"normal": [], "failed": [], "isolated": [], "cascade": [], "articulation": []}
+    for n in G.nodes():
+        if   n in failed_nodes:   nodes["failed"].append(n)
+        elif n in isolated_nodes: nodes["isolated"].append(n)
+        elif n in cascade_nodes:  nodes["cascade"].append(n)
+        else:
+            nodes["normal"].append(n)
+            if n in articulation_nodes:
+                nodes["articulation"].append(n)
+
+    edges = {"normal": [], "bridge": [], "failed": []}
+    for e in G.edges():
+        if   e in failed_edges: edges["failed"].append(e)
+        elif e in bridge_edges: edges["bridge"].append(e)
+        else:                   edges["normal"].append(e)
+    return nodes, edges
+
+
+def _scatter(ax, pos, nodes, size, color, marker="o", edgecolor="white", linewidth=1.0, zorder=2):
+    if not nodes:
+        return
+    xy = np.array([pos[n] for n in nodes])
+    ax.scatter(xy[:, 0], xy[:, 1], s=size, c=color, marker=marker,
+               edgecolors=edgecolor, linewidths=linewidth, zorder=zorder)
+
+
+def _edge_collection(ax, pos, edges, style, node_size, data_per_point):
+    """
+    ルート群を LineCollection 1つ、矢じりを PolyCollection 1つにまとめて描く。
+    線分の端は拠点の円の半径だけ縮め、矢じりの三角形は NumPy で一括計算する。
+    幾何計算はポイント単位で行い、最後にデータ座標へ戻す（縦横の縮尺が違っても形が崩れない）。
+    """
+    if not edges:
+        return
+    color, width, linestyle, head_scale, zorder = EDGE_STYLES[style]
+    scale = np.asarray(data_per_point, dtype=float)
+    src = np.array([pos[u] for u, _ in edges], dtype=float) / scale
+    dst = np.array([pos[v] for _, v in edges], dtype=float) / scale
+    vec = dst - src
+    length = np.hypot(vec[:, 0], vec[:, 1])
+    keep = length > 1e-12
+    src, dst, vec, length = src[keep], dst[keep], vec[keep], length[keep]
+    unit = vec / length[:, None]
+    perp = np.column_stack([-unit[:, 1], unit[:, 0]])
+
+    radius = np.sqrt(node_size) / 2
+    head   = 8.0 * head_scale
+    tip    = dst - unit * radius
+    base   = tip - unit * head
+    start  = src + unit * radius
+
+    ax.add_collection(LineCollection(
+        np.stack([start, base], axis=1) * scale, colors=color, linewidths=width,
+        linestyles=linestyle, zorder=zorder,
+    ))
+    heads = np.stack([tip, base + perp * head * 0.3, base - perp * head * 0.3], axis=1) * scale
+    ax.add_collection(PolyCollection(heads, facecolors=color, edgecolors="none", zorder=zorder))
+
+
+def _data_per_point(ax, limits) -> tuple:
+    """1ポイントあたりのデータ座標の長さ（x, y）。"""
+    bbox = ax.get_position()
+    fig_w, fig_h = ax.figure.get_size_inches()
+    width_pt  = max(bbox.width * fig_w * 72, 1.0)
+    height_pt = max(bbox.height * fig_h * 72, 1.0)
+    x0, x1, y0, y1 = limits
+    return (x1 - x0) / width_pt, (y1 - y0) / height_pt
+
+
+def _draw_base(ax, G, pos, nodes, edges, scc_map, node_size, limits) -> None:
+    """障害に依存しない層（通常拠点・通常ルート・強橋・ラベル）を描く。"""
+    dpp = _data_per_point(ax, limits)
+    _edge_collection(ax, pos, edges["normal"], "normal", node_size, dpp)
+    _edge_collection(ax, pos, edges["bridge"], "bridge", node_size, dpp)
+
+    cmap = plt.colormaps["tab10"]
+    if scc_map:
+        colors = [
+            cmap(scc_map.get(n, -1) % 10) if scc_map.get(n, -1) != -1 else "#cccccc"
+            for n in nodes
+        ]
+    else:
+        colors = ["#4A90D9"] * len(nodes)
+    _scatter(ax, pos, nodes, node_size, colors, zorder=2)
+    _draw_labels(ax, G, pos, list(G.nodes()))
+
+
+def _draw_labels(ax, G, pos, nodes) -> None:
+    if len(G) > STATIC_LABEL_LIMIT or not nodes:
+        return
+    # NetworkXはrcParamsを無視する場合があるため、明示的にfont_familyを指定
+    current_font = matplotlib.rcParams.get('font.family', ['sans-serif'])
+    if isinstance(current_font, list):
+        current_font = current_font[0]
+    texts = nx.draw_networkx_labels(G, pos, labels={n: str(n) for n in nodes},
+                                    font_color="white", font_weight="bold", font_size=8,
+                                    font_family=current_font, ax=ax)
+    for text in texts.values():
+        text.set_zorder(5)
+
+
+def _cached_base_image(G, pos, nodes, edges, scc_map, node_size, limits, size_in, dpi) -> np.ndarray:
+    """
+    基本層をラスタ画像（PNG）にしてキャッシュし、RGBA 配列で返す。
+    キーはグラフのハッシュ・配置・色分け・強橋・画像サイズで、障害の選択には依存しないので
+    停止対象を変えても「障害前」の図は描き直さない。
+    """
+    digest = hashlib.sha256()
+    digest.update(np.array([pos[n] for n in G.nodes()], dtype=float).tobytes())
+    digest.update(repr(sorted(map(str, edges["bridge"]))).encode())
+    digest.update(repr(sorted((str(n), scc_map.get(n, -1)) for n in nodes) if scc_map else None).encode())
+    key = cache_key("base_layer", G, (digest.hexdigest(), tuple(np.round(size_in, 2)), dpi))
+
+    def _render():
+        fig = Figure(figsize=size_in, dpi=dpi)
+        FigureCanvasAgg(fig)
+        ax = fig.add_axes([0, 0, 1, 1])
+        ax.set_xlim(limits[0], limits[1])
+        ax.set_ylim(limits[2], limits[3])
+        ax.axis("off")
+        _draw_base(ax, G, pos, nodes, edges, scc_map, node_size, limits)
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", dpi=dpi)
+        return buf.getvalue()
+
+    return plt.imread(io.BytesIO(get_cache().get_or_compute(key, _render)), format="png")
+
+
+@instrumented()
 def draw_network_matplotlib(
     G: nx.DiGraph, pos: dict, ax,
     bridge_edges=None, failed_nodes=None, failed_edges=None,
     isolated_nodes=None, cascade_nodes=None, scc_map=None, title="",
+    articulation_nodes=None, cached_base=False,
 ) -> None:
+    """
+    ネットワークの静止画を描く。拠点・ルートは1回の走査で種別に分け、
+    種別ごとに scatter（PathCollection）/ LineCollection 1つずつで一括描画する。
+
+    cached_base=True のときは、障害に依存しない層（通常拠点・ルート・強橋・ラベル）を
+    ラスタ画像としてキャッシュから貼り付け、停止・孤立・カスケードなどの強調表示だけを上に重ねる。
+    """
+    setup_japanese_font()
     bridge_edges   = set(map(tuple, bridge_edges   or []))
     failed_nodes   = set(failed_nodes  or [])
     failed_edges   = set(map(tuple, failed_edges   or []))
     isolated_nodes = set(isolated_nodes or [])
     cascade_nodes  = set(cascade_nodes  or [])
+    articulation_nodes = set(articulation_nodes or [])
 
-    normal_nodes  = [n for n in G.nodes()
-                     if n not in failed_nodes and n not in isolated_nodes
-                     and n not in cascade_nodes]
-    isolated_draw = [n for n in G.nodes() if n in isolated_nodes]
-    cascade_draw  = [n for n in G.nodes() if n in cascade_nodes]
+    limits    = _limits(pos)
+    node_size = _node_size(len(G))
+    ax.set_xlim(limits[0], limits[1])
+    ax.set_ylim(limits[2], limits[3])
 
-    cmap = plt.colormaps["tab10"]
-    if scc_map:
-        node_colors = [
-            cmap(scc_map.get(n, -1) % 10) if scc_map.get(n, -1) != -1 else "#cccccc"
-            for n in normal_nodes
-        ]
+    if cached_base:
+        # 基本層は全拠点・全ルートで作り、障害の強調表示は上から重ねる
+        nodes, edges = _classify(G, bridge_edges, set(), set(), set(), set(), set())
+        bbox = ax.get_position()
+        size_in = (bbox.width * ax.figure.get_figwidth(), bbox.height * ax.figure.get_figheight())
+        image = _cached_base_image(G, pos, nodes["normal"], edges, scc_map, node_size,
+                                   limits, size_in, ax.figure.dpi)
+        ax.imshow(image, extent=limits, aspect="auto", zorder=0, interpolation="antialiased")
+        nodes, edges = _classify(G, bridge_edges, failed_nodes, failed_edges,
+                                 isolated_nodes, cascade_nodes, articulation_nodes)
+        highlighted = nodes["failed"] + nodes["isolated"] + nodes["cascade"]
+        _scatter(ax, pos, highlighted, node_size * 1.1, "white", edgecolor="none", zorder=3)
     else:
-        node_colors = ["#4A90D9"] * len(normal_nodes)
-
-    nx.draw_networkx_nodes(G, pos, nodelist=normal_nodes,
-                           node_color=node_colors, node_size=600, ax=ax)
-    if isolated_draw:
-        nx.draw_networkx_nodes(G, pos, nodelist=isolated_draw,
-                               node_color="#aaaaaa", node_size=600, node_shape="x", ax=ax)
-    if cascade_draw:
-        nx.draw_networkx_nodes(G, pos, nodelist=cascade_draw,
-                               node_color="#f39c12", node_size=600, node_shape="d", ax=ax)
-
-    # ノードラベルの描画（日本語フォント対応）
-    # NetworkXはrcParamsを無視する場合があるため、明示的にfont_familyを指定
-    current_font = matplotlib.rcParams.get('font.family', ['sans-serif'])
-    if isinstance(current_font, list):
-        current_font = current_font[0]
-    
-    nx.draw_networkx_labels(G, pos, labels={n: str(n) for n in G.nodes()},
-                            font_color="white", font_weight="bold", font_size=8,
-                            font_family=current_font, ax=ax)
-
-    normal_edges = [e for e in G.edges() if e not in bridge_edges and e not in failed_edges]
-    bridge_draw  = [e for e in G.edges() if e in bridge_edges]
-    failed_draw  = [e for e in G.edges() if e in failed_edges]
-
-    nx.draw_networkx_edges(G, pos, edgelist=normal_edges,
-                           edge_color="#555555", arrowsize=12, arrowstyle="->", ax=ax)
-    if bridge_draw:
-        nx.draw_networkx_edges(G, pos, edgelist=bridge_draw,
-                               edge_color="#e74c3c", width=2.5, arrowsize=14,
-                               arrowstyle="->", ax=ax)
-    if failed_draw:
-        nx.draw_networkx_edges(G, pos, edgelist=failed_draw,
-                               edge_color="#e74c3c", width=2, style="dashed",
-                               arrowsize=12, arrowstyle="->", ax=ax)
+        nodes, edges = _classify(G, bridge_edges, failed_nodes, failed_edges,
+                                 isolated_nodes, cascade_nodes, articulation_nodes)
+        _draw_base(ax, G, pos, nodes["normal"], edges, scc_map, node_size, limits)
+
+    if cached_base:
+        # 停止ルートを消した跡に、同じ区間を逆向きに走る稼働中のルートを描き直す
+        _edge_collection(ax, pos, edges["failed"], "mask", node_size, _data_per_point(ax, limits))
+        reverse = {(v, u) for u, v in edges["failed"]}
+        for style in ("normal", "bridge"):
+            _edge_collection(ax, pos, [e for e in edges[style] if e in reverse], style, node_size,
+                             _data_per_point(ax, limits))
+    _edge_collection(ax, pos, edges["failed"], "failed", node_size, _data_per_point(ax, limits))
+    for kind, (color, marker, edgecolor, linewidth, scale, zorder) in NODE_STYLES.items():
+        _scatter(ax, pos, nodes[kind], node_size * scale, color, marker=marker,
+                 edgecolor=edgecolor, linewidth=linewidth, zorder=zorder)
+    if cached_base:
+        _draw_labels(ax, G, pos, nodes["failed"] + nodes["isolated"] + nodes["cascade"])
 
     ax.set_title(title, fontsize=11, pad=10)
     ax.axis("off")
 
 
 # ---------------------------------------------------------------------------
-# 描画: PyVis（81〜200ノード向けインタラクティブ）
+# 描画: PyVis（〜200ノード向けインタラクティブ）
 # ---------------------------------------------------------------------------
+@instrumented()
 def draw_network_pyvis(
     G: nx.DiGraph, bridge_edges=None, failed_nodes=None,
     isolated_nodes=None, cascade_nodes=None, height="600px",
+    articulation_nodes=None,
 ) -> None:
     try:
         from pyvis.network import Network
@@ -154,6 +328,7 @@ def draw_network_pyvis(
     failed_nodes   = set(str(n) for n in (failed_nodes   or []))
     isolated_nodes = set(str(n) for n in (isolated_nodes or []))
     cascade_nodes  = set(str(n) for n in (cascade_nodes  or []))
+    articulation_nodes = set(str(n) for n in (articulation_nodes or []))
 
     net = Network(height=height, width="100%", directed=True,
                   bgcolor="#1a1a2e", font_color="white")
@@ -164,6 +339,7 @@ def draw_network_pyvis(
         if   ns in failed_nodes:   color, shape, tip = "#e74c3c", "diamond",  "停止中の拠点"
         elif ns in isolated_nodes: color, shape, tip = "#aaaaaa", "square",   "孤立拠点（障害影響）"
         elif ns in cascade_nodes:  color, shape, tip = "#f39c12", "triangle", "カスケード故障拠点"
+        elif ns in articulation_nodes: color, shape, tip = "#e74c3c", "star", "強連結切断点（重要拠点）"
         else:                      color, shape, tip = "#4A90D9", "dot",      "正常拠点"
         net.add_node(ns, label=ns, color=color, shape=shape, size=15, title=tip)
 
@@ -173,5 +349,122 @@ def draw_network_pyvis(
         else:
             net.add_edge(str(u), str(v), color="#888888", width=1)
 
-    components.html(net.generate_html(), height=int(height.replace("px", "")))
+    with span("pyvis.generate_html"):
+        html = net.generate_html()
+    components.html(html, height=int(height.replace("px", "")))
 
+
+# ---------------------------------------------------------------------------
+# 描画: 強連結成分の縮約表示（静止画の上限を超える場合）
+# ---------------------------------------------------------------------------
+def draw_condensed_matplotlib(C: nx.DiGraph, pos: dict, ax, title="") -> None:
+    """
+    condense_network の縮約グラフを描く。
+    ノードの大きさは拠点数、赤枠は強橋または停止拠点を含む成分、橙の塗りは影響拠点を含む成分、
+    赤点線の辺は停止ルートを含む成分間ルート。
+    """
+    setup_japanese_font()
+    cmap  = plt.colormaps["tab10"]
+    nodes = list(C.nodes())
+    sizes = [C.nodes[g]["拠点数"] for g in nodes]
+    scale = max(sizes) if sizes else 1
+    node_size = [200 + 2400 * (s / scale) ** 0.5 for s in sizes]
+
+    colors, borders = [], []
+    for g in nodes:
+        d = C.nodes[g]
+        if d["影響拠点数"]:
+            colors.append("#f39c12")
+        elif d["種別"] == "強連結成分":
+            colors.append(cmap(g % 10))
+        else:
+            colors.append("#cccccc")
+        borders.append("#e74c3c" if d["強橋数"] or d["停止拠点数"] or d["停止ルート数"] else "white")
+
+    nx.draw_networkx_nodes(C, pos, nodelist=nodes, node_size=node_size, node_color=colors,
+                           edgecolors=borders, linewidths=2.5, ax=ax)
+
+    current_font = matplotlib.rcParams.get('font.family', ['sans-serif'])
+    if isinstance(current_font, list):
+        current_font = current_font[0]
+    labels = {}
+    for g in nodes:
+        d = C.nodes[g]
+        labels[g] = d["label"] + (f"\n強橋 {d['強橋数']}" if d["強橋数"] else "")
+    nx.draw_networkx_labels(C, pos, labels=labels, font_size=7, font_family=current_font, ax=ax)
+
+    failed_draw = [e for e in C.edges() if C.edges[e]["停止ルート数"]]
+    normal_draw = [e for e in C.edges() if not C.edges[e]["停止ルート数"]]
+    widths      = [0.8 + np.log1p(C.edges[e]["ルート数"]) for e in normal_draw]
+    nx.draw_networkx_edges(C, pos, edgelist=normal_draw, width=widths, edge_color="#555555",
+                           node_size=node_size, nodelist=nodes,
+                           arrowsize=10, arrowstyle="->", ax=ax)
+    if failed_draw:
+        nx.draw_networkx_edges(C, pos, edgelist=failed_draw, width=2, edge_color="#e74c3c",
+                               style="dashed", node_size=node_size, nodelist=nodes,
+                               arrowsize=12, arrowstyle="->", ax=ax)
+
+    ax.set_title(title, fontsize=11, pad=10)
+    ax.axis("off")
+
+
+@instrumented()
+def show_condensed_network(
+    G: nx.DiGraph, scc_index: tuple, key: str,
+    bridge_edges=None, failed_nodes=None, failed_edges=None,
+    isolated_nodes=None, cascade_nodes=None, articulation_nodes=None,
+    static_limit: int = 80, interactive_limit: int = 200,
+) -> None:
+    """
+    大規模ネットワークを強連結成分単位に縮約して表示し、選択した成分だけを拠点単位で描く。
+    描画コストは成分数（最大 CONDENSED_NODE_LIMIT）と選択した成分の大きさだけで決まる。
+    """
+    affected = list(isolated_nodes or []) + list(cascade_nodes or [])
+    C, members = condense_network(
+        G, scc_index, bridges=bridge_edges, failed_nodes=failed_nodes,
+        failed_edges=failed_edges, affected_nodes=affected,
+    )
+    st.info(
+        f"💡 拠点数が多いため、強連結成分ごとに1つの円にまとめた縮約表示にしています"
+        f"（{G.number_of_nodes()}拠点 → {C.number_of_nodes()}成分）。"
+    )
+    fig, ax = plt.subplots(figsize=(12, 7))
+    draw_condensed_matplotlib(
+        C, get_layout(C), ax,
+        title="縮約ネットワーク — 円の大きさ: 拠点数 / 赤枠: 強橋・停止を含む / 橙: 影響拠点を含む / 赤点線: 停止ルート",
+    )
+    with span("st.pyplot"):
+        st.pyplot(fig)
+
+    choices = [g for g in C.nodes() if C.nodes[g]["拠点数"] > 1 or C.nodes[g]["種別"] == "単独拠点"]
+    choices.sort(key=lambda g: -C.nodes[g]["拠点数"])
+    selected = st.selectbox(
+        "拠点単位で表示する成分",
+        [None] + choices,
+        format_func=lambda g: "（選択しない）" if g is None else
+            f"{C.nodes[g]['label'].splitlines()[0]}（{C.nodes[g]['拠点数']}拠点）",
+        key=f"condensed_{key}",
+    )
+    if selected is None:
+        return
+
+    sub = G.subgraph(members[selected])
+    if len(sub) <= static_limit:
+        fig, ax = plt.subplots(figsize=(12, 7))
+        draw_network_matplotlib(
+            sub, get_layout(sub), ax,
+            bridge_edges=bridge_edges, failed_nodes=failed_nodes, failed_edges=failed_edges,
+            isolated_nodes=isolated_nodes, cascade_nodes=cascade_nodes,
+            articulation_nodes=articulation_nodes,
+            title=f"{C.nodes[selected]['label'].splitlines()[0]} の拠点とルート",
+        )
+        with span("st.pyplot"):
+            st.pyplot(fig)
+    elif len(sub) <= interactive_limit:
+        draw_network_pyvis(
+            sub, bridge_edges=bridge_edges, failed_nodes=failed_nodes,
+            isolated_nodes=isolated_nodes, cascade_nodes=cascade_nodes,
+            articulation_nodes=articulation_nodes,
+        )
+    else:
+        st.info(f"選択した成分の拠点数が {max(static_limit, interactive_limit)} を超えているため描画をスキップしました（{len(sub)}拠点）。")
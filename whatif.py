@@ -0,0 +1,342 @@
+import time
+from collections import OrderedDict, deque
+
+import networkx as nx
+import numpy as np
+
+from algorithms import build_stable_scc_map, failure_view
+from compact_graph import CompactGraph, scc_labels
+
+# ---------------------------------------------------------------------------
+# 設定
+# ---------------------------------------------------------------------------
+WHATIF_MEMO_ENTRIES  = 256    # SCC 分裂結果を覚えておく件数（停止の解除はここから巻き戻す）
+WHATIF_DETOUR_LIMIT  = 1_000  # ルート停止時の迂回探索で調べる拠点数の上限（超えたら再分解する）
+ISOLATION_LABELS = {"complete": "完全孤立", "no_input": "補給不能", "no_output": "配送不能"}
+
+
+# ---------------------------------------------------------------------------
+# 差分更新型の障害シミュレーション
+# ---------------------------------------------------------------------------
+class WhatIfSession:
+    """
+    停止拠点・停止ルートを1つずつ追加・解除しながら simulate_failure と同じ結果を返すセッション。
+
+    入出次数・孤立区分・カスケード故障・SCC の分裂状態をセッション内に保持し、
+    停止対象を1つ切り替えるたびに影響する範囲だけを更新する。
+
+      - 孤立区分      : 切り替えた要素の両端（拠点なら隣接拠点）の次数だけを増減する。O(次数)
+      - カスケード故障: 祖先がすべて孤立 ⇔ 自分以外の先行拠点がすべて入次数0 の孤立拠点、
+                        という局所条件なので、次数が変わった拠点とその後続だけを再判定する。
+      - SCC の分裂    : 停止を追加したときは、その要素を含む障害後の成分だけを再分解する
+                        （ルート停止は始点から終点へ迂回できれば分裂しないので、先に探索で確かめる）。
+                        再分解は CompactGraph 上の生存マスクと scipy の SCC で行う。
+                        解除したときは元SCC内の停止の組をキーに記憶した分解結果へ巻き戻し、
+                        記憶になければ元SCCだけを分解し直す。
+
+    返り値の形・内容は simulate_failure と同じ（分裂後グループの並び順だけは異なることがある）。
+    セッションは G を参照し続けるので、G は変更しないこと。
+    """
+
+    def __init__(self, G: nx.DiGraph, scc_index: tuple | None = None):
+        self.G = G
+        self.scc_map, self.large_sccs = scc_index if scc_index is not None else build_stable_scc_map(G)
+        self.scc_before = {frozenset(s): i for i, s in enumerate(self.large_sccs)}
+
+        self.failed_nodes: set = set()
+        self.failed_edges: set = set()
+        self.last_elapsed = 0.0    # 直前の set_failures の所要秒数
+        self.last_changes = 0      # 直前の set_failures で切り替えた要素数
+
+        self._order = {n: i for i, n in enumerate(G.nodes())}
+        self._in    = dict(G.in_degree())
+        self._out   = dict(G.out_degree())
+        self._iso: dict     = {}   # 拠点 → "complete" / "no_input" / "no_output"
+        self._cascade: dict = {}   # カスケード故障拠点 → 原因となった上流の孤立拠点
+        self._scc_failures: dict = {}   # 元SCC番号 → (停止拠点の集合, SCC内の停止ルートの集合)
+        self._parts: dict = {}          # 元SCC番号 → 障害後のグループ（拠点ID配列、停止を含む元SCCのみ）
+        self._memo: OrderedDict = OrderedDict()
+        self._dirty: set      = set()   # 前回の pop_changes 以降に状態を再判定した拠点
+        self._dirty_sccs: set = set()   # 同じく分裂状態を更新した元SCC番号
+
+        self._cg      = CompactGraph.from_networkx(G)
+        self._node_ok = np.ones(self._cg.number_of_nodes(), dtype=bool)
+        self._edge_ok = np.ones(self._cg.number_of_edges(), dtype=bool)
+        self._scc_ids = [self._cg.ids(s) for s in self.large_sccs]
+        self._gid     = np.zeros(self._cg.number_of_nodes(), dtype=np.int64)   # 元SCC内のグループ番号
+
+        for n in G.nodes():
+            self._classify(n)
+        for n in G.nodes():
+            self._check_cascade(n)
+
+    # -----------------------------------------------------------------------
+    # 停止対象の切り替え
+    # -----------------------------------------------------------------------
+    def set_failures(self, failed_nodes=None, failed_edges=None) -> tuple:
+        """停止対象を指定の集合に合わせ（差分だけ反映し）、simulate_failure と同じ形の結果を返す。"""
+        start = time.perf_counter()
+        nodes = {n for n in (failed_nodes or []) if n in self.G}
+        edges = {tuple(e) for e in (failed_edges or []) if self.G.has_edge(*e)}
+
+        # 解除を先に反映する（巻き戻しの記憶が使えるように）
+        removed_nodes = self.failed_nodes - nodes
+        removed_edges = self.failed_edges - edges
+        added_nodes   = nodes - self.failed_nodes
+        added_edges   = edges - self.failed_edges
+        for e in sorted(removed_edges, key=str):
+            self.restore_edge(*e)
+        for n in sorted(removed_nodes, key=str):
+            self.restore_node(n)
+        for n in sorted(added_nodes, key=str):
+            self.fail_node(n)
+        for e in sorted(added_edges, key=str):
+            self.fail_edge(*e)
+
+        self.last_changes = (len(removed_nodes) + len(removed_edges)
+                             + len(added_nodes) + len(added_edges))
+        result = self.result()
+        self.last_elapsed = time.perf_counter() - start
+        return result
+
+    def fail_node(self, n) -> None:
+        if n not in self.G or n in self.failed_nodes:
+            return
+        changed = {n}
+        for w in self.G.successors(n):
+            if w != n and self._edge_live(n, w):
+                self._in[w] -= 1
+                changed.add(w)
+        for p in self.G.predecessors(n):
+            if p != n and self._edge_live(p, n):
+                self._out[p] -= 1
+                changed.add(p)
+        self.failed_nodes.add(n)
+        self._node_ok[self._cg.index[n]] = False
+        self._refresh(changed)
+
+        i = self.scc_map[n]
+        if i != -1:
+            self._scc_failures.setdefault(i, (set(), set()))[0].add(n)
+            groups = self._parts.get(i, [self._scc_ids[i]])
+            self._set_parts(i, lambda: self._split_group(groups, self._cg.index[n]))
+
+    def restore_node(self, n) -> None:
+        if n not in self.failed_nodes:
+            return
+        self.failed_nodes.discard(n)
+        self._node_ok[self._cg.index[n]] = True
+        self._in[n]  = sum(1 for p in self.G.predecessors(n) if self._edge_live(p, n))
+        self._out[n] = sum(1 for w in self.G.successors(n) if self._edge_live(n, w))
+        changed = {n}
+        for w in self.G.successors(n):
+            if w != n and self._edge_live(n, w):
+                self._in[w] += 1
+                changed.add(w)
+        for p in self.G.predecessors(n):
+            if p != n and self._edge_live(p, n):
+                self._out[p] += 1
+                changed.add(p)
+        self._refresh(changed)
+
+        i = self.scc_map[n]
+        if i != -1:
+            self._scc_failures[i][0].discard(n)
+            self._set_parts(i, lambda: self._decompose(self._scc_ids[i]))
+
+    def fail_edge(self, u, v) -> None:
+        if not self.G.has_edge(u, v) or (u, v) in self.failed_edges:
+            return
+        live = self._edge_live(u, v)
+        self.failed_edges.add((u, v))
+        self._edge_ok[self._cg.edge_ids([(u, v)])] = False
+        if live:
+            self._out[u] -= 1
+            self._in[v]  -= 1
+            self._refresh({u, v})
+
+        i = self.scc_map[u]
+        if i != -1 and i == self.scc_map[v]:
+            self._scc_failures.setdefault(i, (set(), set()))[1].add((u, v))
+            groups = self._parts.get(i, [self._scc_ids[i]])
+            self._set_parts(i, lambda: self._split_by_edge(i, groups, u, v) if live else groups)
+
+    def restore_edge(self, u, v) -> None:
+        if (u, v) not in self.failed_edges:
+            return
+        self.failed_edges.discard((u, v))
+        self._edge_ok[self._cg.edge_ids([(u, v)])] = True
+        if self._edge_live(u, v):
+            self._out[u] += 1
+            self._in[v]  += 1
+            self._refresh({u, v})
+
+        i = self.scc_map[u]
+        if i != -1 and i == self.scc_map[v]:
+            self._scc_failures[i][1].discard((u, v))
+            self._set_parts(i, lambda: self._decompose(self._scc_ids[i]))
+
+    # -----------------------------------------------------------------------
+    # 結果
+    # -----------------------------------------------------------------------
+    def result(self) -> tuple:
+        """現在の停止状態について simulate_failure と同じ9要素のタプルを返す。"""
+        G_after = failure_view(self.G, self.failed_nodes, self.failed_edges)
+
+        by_kind: dict = {"complete": [], "no_input": [], "no_output": []}
+        for n in sorted(self._iso, key=self._order.__getitem__):
+            by_kind[self._iso[n]].append(n)
+        isolated_complete  = by_kind["complete"]
+        isolated_no_input  = by_kind["no_input"]
+        isolated_no_output = by_kind["no_output"]
+        isolated_all = isolated_complete + isolated_no_input + isolated_no_output
+        cascade_failures = {
+            n: self._cascade[n] for n in sorted(self._cascade, key=self._order.__getitem__)
+        }
+
+        touched = sorted(self._parts)
+        scc_after = {
+            frozenset(s): i for i, s in enumerate(self.large_sccs) if i not in self._parts
+        }
+        broken_sccs = []
+        names = self._cg.nodes
+        for i in touched:
+            if sum(len(g) for g in self._parts[i]) < 2:
+                continue
+            groups = [frozenset(names[j] for j in g.tolist()) for g in self._parts[i]]
+            for s in groups:
+                if len(s) > 1:
+                    scc_after[s] = len(scc_after)
+            if len(groups) > 1:
+                broken_sccs.append({"original": frozenset(self.large_sccs[i]), "after": groups})
+
+        return (
+            G_after, isolated_all, isolated_complete,
+            isolated_no_input, isolated_no_output,
+            cascade_failures, self.scc_before, scc_after, broken_sccs,
+        )
+
+    def node_status(self, n) -> str | None:
+        """拠点の現在の状態（停止 / 完全孤立 / 補給不能 / 配送不能 / カスケード故障）。正常なら None。"""
+        if n in self.failed_nodes:
+            return "停止"
+        if n in self._iso:
+            return ISOLATION_LABELS[self._iso[n]]
+        if n in self._cascade:
+            return "カスケード故障"
+        return None
+
+    def cascade_causes(self, n) -> list:
+        return self._cascade.get(n, [])
+
+    def split_count(self, i: int) -> int:
+        """元SCC i が分裂していれば障害後のグループ数、分裂していなければ 0。"""
+        groups = self._parts.get(i)
+        if not groups or len(groups) < 2:
+            return 0
+        return len(groups)
+
+    def pop_changes(self) -> tuple:
+        """
+        前回の呼び出し以降に状態が変わった可能性のある (拠点の集合, 元SCC番号の集合) を返して空にする。
+        実際に変わったかは node_status / split_count を前回の値と比べて判断する。
+        """
+        nodes, sccs = self._dirty, self._dirty_sccs
+        self._dirty, self._dirty_sccs = set(), set()
+        return nodes, sccs
+
+    # -----------------------------------------------------------------------
+    # 孤立区分・カスケード故障の局所更新
+    # -----------------------------------------------------------------------
+    def _edge_live(self, u, v) -> bool:
+        return (u not in self.failed_nodes and v not in self.failed_nodes
+                and (u, v) not in self.failed_edges)
+
+    def _classify(self, n) -> None:
+        self._iso.pop(n, None)
+        if n in self.failed_nodes:
+            return
+        in_deg, out_deg = self._in[n], self._out[n]
+        if   in_deg == 0 and out_deg == 0: self._iso[n] = "complete"
+        elif in_deg == 0:                  self._iso[n] = "no_input"
+        elif out_deg == 0:                 self._iso[n] = "no_output"
+
+    def _check_cascade(self, v) -> None:
+        self._cascade.pop(v, None)
+        if v in self.failed_nodes or v in self._iso:
+            return
+        upstream = [p for p in self.G.predecessors(v) if p != v and self._edge_live(p, v)]
+        if upstream and all(p in self._iso for p in upstream):
+            self._cascade[v] = upstream
+
+    def _refresh(self, changed: set) -> None:
+        """次数が変わった拠点の孤立区分と、それらとその後続のカスケード判定を更新する。"""
+        for n in changed:
+            self._classify(n)
+        recheck = set(changed)
+        for n in changed:
+            recheck.update(self.G.successors(n))
+        for v in recheck:
+            self._check_cascade(v)
+        self._dirty |= recheck
+
+    # -----------------------------------------------------------------------
+    # SCC の分裂（停止の追加は該当成分だけ再分解、解除は記憶から巻き戻し）
+    # -----------------------------------------------------------------------
+    def _set_parts(self, i: int, compute) -> None:
+        self._dirty_sccs.add(i)
+        failed_nodes, failed_edges = self._scc_failures[i]
+        if not failed_nodes and not failed_edges:
+            del self._scc_failures[i]
+            self._parts.pop(i, None)
+            self._gid[self._scc_ids[i]] = 0
+            return
+        key = (i, frozenset(failed_nodes), frozenset(failed_edges))
+        parts = self._memo.get(key)
+        if parts is None:
+            parts = compute()
+            self._memo[key] = parts
+            while len(self._memo) > WHATIF_MEMO_ENTRIES:
+                self._memo.popitem(last=False)
+        else:
+            self._memo.move_to_end(key)
+        self._parts[i] = parts
+        for j, group in enumerate(parts):
+            self._gid[group] = j
+
+    def _decompose(self, ids: np.ndarray) -> list:
+        """拠点ID配列のうち生存拠点を、生存ルートだけで強連結成分に分ける。O(V+E)（NumPy / scipy）"""
+        cg = self._cg
+        member = np.zeros(cg.number_of_nodes(), dtype=bool)
+        member[ids] = True
+        member &= self._node_ok
+        edge_alive = self._edge_ok & member[cg.tails] & member[cg.indices]
+        labels = scc_labels(cg, edge_alive)
+
+        ids = np.flatnonzero(member)
+        ids = ids[np.argsort(labels[ids], kind="stable")]
+        bounds = np.flatnonzero(np.diff(labels[ids])) + 1
+        return [chunk for chunk in np.split(ids, bounds) if len(chunk)]
+
+    def _split_group(self, groups: list, member: int) -> list:
+        """拠点ID member を含むグループだけを再分解する（停止した拠点は除かれる）。"""
+        j = self._gid[member]
+        return groups[:j] + groups[j + 1:] + self._decompose(groups[j])
+
+    def _split_by_edge(self, i: int, groups: list, u, v) -> list:
+        """u→v の停止後も同じグループ内で u から v へ届くなら分裂しない（探索は上限つき）。"""
+        index, gid = self._cg.index, self._gid
+        if u == v or gid[index[u]] != gid[index[v]]:
+            return groups
+        g = gid[index[u]]
+        seen, queue = {u}, deque([u])
+        while queue and len(seen) <= WHATIF_DETOUR_LIMIT:
+            x = queue.popleft()
+            for w in self.G.successors(x):
+                if (w not in seen and self.scc_map[w] == i and gid[index[w]] == g
+                        and self._edge_live(x, w)):
+                    if w == v:
+                        return groups
+                    seen.add(w)
+                    queue.append(w)
+        return self._split_group(groups, index[u])